@@ -0,0 +1,112 @@
+# Análisis de inventario agregado en SQL: totales, top/bottom N por stock o
+# valor, agrupaciones por proveedor y ubicación, y la serie de stock de un
+# producto reducida a un número fijo de puntos. Ninguna consulta devuelve una
+# fila por producto del catálogo.
+from archive import kardex_sources
+
+TOP_N = 10
+SERIES_POINTS = 200  # puntos máximos de una serie de stock en el gráfico
+
+_ORDER_COLUMNS = {'stock': 'ia.stock_actual', 'valor': 'valor'}
+_GROUP_COLUMNS = {'proveedor': 'p.proveedor', 'ubicacion': 'p.ubicacion'}
+
+_STOCK_ROWS = """
+    FROM inventario_actual ia
+    JOIN productos p ON p.id_producto = ia.id_producto
+"""
+
+
+def inventory_totals(cache):
+    # Productos, productos con stock, unidades y valor del inventario actual
+    return cache.read_sql(f"""
+        SELECT COUNT(*) AS productos,
+               COALESCE(SUM(ia.stock_actual > 0), 0) AS con_stock,
+               COALESCE(SUM(ia.stock_actual), 0) AS stock,
+               COALESCE(SUM(ia.stock_actual * COALESCE(p.precio_unitario, 0)), 0) AS valor
+        {_STOCK_ROWS}
+    """, tables=('inventario_actual', 'productos')).iloc[0]
+
+
+def stock_ranking(cache, by='stock', n=TOP_N, ascending=False):
+    """Los ``n`` productos con más (o menos, con ``ascending``) stock o valor.
+
+    ``by`` es 'stock' (unidades) o 'valor' (stock_actual * precio_unitario).
+    """
+    if by not in _ORDER_COLUMNS:
+        raise ValueError(f"Orden no soportado: {by}")
+    return cache.read_sql(f"""
+        SELECT p.nombre_producto, ia.stock_actual AS stock,
+               ia.stock_actual * COALESCE(p.precio_unitario, 0) AS valor
+        {_STOCK_ROWS}
+        ORDER BY {_ORDER_COLUMNS[by]} {'ASC' if ascending else 'DESC'}, p.nombre_producto
+        LIMIT ?
+    """, (n,), tables=('inventario_actual', 'productos'))
+
+
+def stock_rollup(cache, by='proveedor'):
+    # Productos, unidades y valor por proveedor o ubicación, de mayor a menor valor
+    if by not in _GROUP_COLUMNS:
+        raise ValueError(f"Agrupación no soportada: {by}")
+    return cache.read_sql(f"""
+        SELECT COALESCE(NULLIF({_GROUP_COLUMNS[by]}, ''), '(sin {by})') AS {by},
+               COUNT(*) AS productos,
+               SUM(ia.stock_actual) AS stock,
+               SUM(ia.stock_actual * COALESCE(p.precio_unitario, 0)) AS valor
+        {_STOCK_ROWS}
+        GROUP BY 1
+        ORDER BY valor DESC, stock DESC
+    """, tables=('inventario_actual', 'productos'))
+
+
+def stock_series(cache, id_producto, desde=None, points=SERIES_POINTS):
+    """Saldo de ``id_producto`` a lo largo del tiempo, reducido a ``points`` tramos.
+
+    El saldo diario sale de una suma acumulada (función de ventana) sobre los
+    movimientos del producto. Los días desde ``desde`` se reparten en tramos
+    consecutivos; cada tramo aporta su última fecha y su saldo a esa fecha,
+    más el mínimo y el máximo dentro del tramo para no perder picos. Si
+    ``desde`` cae en un periodo cerrado, la suma recorre también los archivos.
+    """
+    with cache.manager.connection() as conn:
+        sources = kardex_sources(conn, desde)
+        if len(sources) > 1:
+            # La suma acumulada necesita toda la historia, no solo desde `desde`
+            sources = kardex_sources(conn)
+    # Cada parte se agrupa por día sobre su propio índice; luego se suman las
+    # filas diarias, que son pocas
+    partes = " UNION ALL ".join(f"""
+        SELECT fecha_movimiento AS fecha,
+               SUM(CASE tipo_movimiento WHEN 'ENTRADA' THEN cantidad ELSE -cantidad END) AS delta
+        FROM {schema}.kardex k
+        WHERE {' AND '.join(['k.id_producto = ?'] + where)}
+        GROUP BY fecha_movimiento""" for schema, where, _ in sources)
+    params = [p for _, _, source_params in sources for p in [id_producto] + source_params]
+    desde = str(desde) if desde else None
+    return cache.read_sql(f"""
+        WITH diario AS (
+            SELECT fecha, SUM(delta) AS delta
+            FROM ({partes})
+            GROUP BY fecha
+        ),
+        saldo AS (
+            SELECT fecha, SUM(delta) OVER (ORDER BY fecha) AS stock
+            FROM diario
+        ),
+        rango AS (
+            SELECT fecha, stock,
+                   (ROW_NUMBER() OVER (ORDER BY fecha) - 1) * ? / COUNT(*) OVER () AS tramo
+            FROM saldo
+            WHERE ? IS NULL OR fecha >= ?
+        ),
+        tramos AS (
+            SELECT fecha, stock,
+                   MIN(stock) OVER (PARTITION BY tramo) AS minimo,
+                   MAX(stock) OVER (PARTITION BY tramo) AS maximo,
+                   ROW_NUMBER() OVER (PARTITION BY tramo ORDER BY fecha DESC) AS orden
+            FROM rango
+        )
+        SELECT fecha, stock, minimo, maximo
+        FROM tramos
+        WHERE orden = 1
+        ORDER BY fecha
+    """, params + [points, desde, desde], tables=('kardex',))
@@ -1,146 +1,201 @@
+import os
+import tempfile
+import time
+import pandas as pd
 import streamlit as st
 import sqlite3
-import pandas as pd
-from datetime import datetime
-
-# --- Configuración de la Base de Datos ---
-DB_NAME = 'dashboard_control.db'
-
-def init_db():
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    
-    # Crear tabla productos
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS productos (
-            id_producto INTEGER PRIMARY KEY,
-            nombre_producto TEXT NOT NULL UNIQUE,
-            unidad_medida TEXT,
-            stock_minimo INTEGER DEFAULT 0,
-            precio_unitario REAL DEFAULT 0.0,
-            proveedor TEXT,
-            ubicacion TEXT
-        )
-    ''')
-    
-    # Crear tabla kardex
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS kardex (
-            id_movimiento INTEGER PRIMARY KEY AUTOINCREMENT,
-            id_producto INTEGER,
-            tipo_movimiento TEXT NOT NULL, -- 'ENTRADA' o 'SALIDA'
-            cantidad INTEGER NOT NULL,
-            fecha_movimiento DATE NOT NULL,
-            referencia TEXT,
-            FOREIGN KEY (id_producto) REFERENCES productos(id_producto)
-        )
-    ''')
-    
-    # Crear tabla inventario_actual (trigger podría mantenerla actualizada)
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS inventario_actual (
-            id_producto INTEGER PRIMARY KEY,
-            stock_actual INTEGER DEFAULT 0,
-            FOREIGN KEY (id_producto) REFERENCES productos(id_producto)
-        )
-    ''')
-
-    # Crear tabla presupuestos
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS presupuestos (
-            id_presupuesto INTEGER PRIMARY KEY AUTOINCREMENT,
-            mes_anio TEXT NOT NULL UNIQUE, -- Formato YYYY-MM
-            monto_total_presupuesto REAL NOT NULL
-        )
-    ''')
-    
-    # Crear tabla detalle_presupuesto (para spliteado)
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS detalle_presupuesto (
-            id_detalle INTEGER PRIMARY KEY AUTOINCREMENT,
-            id_presupuesto INTEGER,
-            categoria_gasto TEXT NOT NULL,
-            monto_asignado REAL NOT NULL,
-            FOREIGN KEY (id_presupuesto) REFERENCES presupuestos(id_presupuesto)
-        )
-    ''')
-
-    # Crear tabla gastos_reales
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS gastos_reales (
-            id_gasto INTEGER PRIMARY KEY AUTOINCREMENT,
-            mes_anio TEXT NOT NULL, -- Formato YYYY-MM
-            categoria_gasto TEXT NOT NULL,
-            fecha_gasto DATE NOT NULL,
-            monto_gasto REAL NOT NULL,
-            descripcion TEXT
-        )
-    ''')
-    
-    conn.commit()
-    conn.close()
+from datetime import datetime, timedelta
+
+from archive import MIN_RETENTION_DAYS, close_period, compact, get_closed_periods
+from analytics import TOP_N, inventory_totals, stock_ranking, stock_rollup, stock_series
+from budget import apply_budget_split, copy_budget_split, get_budget_split, get_budget_summary, get_summary_months, insert_expense, save_budget
+from cache import get_cache
+from db import DB_NAME, get_manager, init_db
+from exporter import FORMATOS, MIME, export_budget, export_expenses, export_frame, export_kardex, export_stock
+from importer import import_movements
+from inventory import rebuild_inventory, stock_as_of, take_snapshot
+from kardex import StockInsuficienteError, get_kardex_page, insert_movement
+from products import search_products
+from profiler import get_profiler
+from reorder import COBERTURA_DIAS, LEAD_TIME_DIAS, NIVEL_SERVICIO_Z, VENTANA_SEMANAS, get_reorder_suggestions
+from shards import ShardSet, configured_warehouses, consolidated_budget, consolidated_months, consolidated_reorder, consolidated_stock
+from valuation import VALUATION_TABLES, cogs_by_month, rebuild_pending_valuation, rebuild_valuation, valuation_totals
+from writer import WriteQueue
+
+# --- Conexión compartida ---
+# El pool vive mientras el proceso de Streamlit; todas las sesiones lo comparten
+@st.cache_resource
+def get_single_db():
+    manager = get_manager(DB_NAME)
+    # Perfilado de consultas desde el arranque con DASHBOARD_PROFILE=1
+    if os.environ.get("DASHBOARD_PROFILE") == "1":
+        manager.profiler = get_profiler()
+    # Migraciones pendientes, una sola vez por proceso (no en cada rerun)
+    init_db(manager)
+    return manager
+
+# Modo multi-almacén (DASHBOARD_ALMACENES=norte,sur,...): un archivo por almacén
+@st.cache_resource
+def get_shards():
+    almacenes = configured_warehouses()
+    if not almacenes:
+        return None
+    shards = ShardSet(almacenes)
+    if os.environ.get("DASHBOARD_PROFILE") == "1":
+        for manager in shards.managers():
+            manager.profiler = get_profiler()
+    shards.init_db()
+    return shards
+
+def get_db():
+    # Con varios almacenes, lecturas y escrituras van al archivo del almacén
+    # elegido en la barra lateral
+    shards = get_shards()
+    if shards is not None:
+        return shards.manager(st.session_state.get("almacen", shards.almacenes[0]))
+    return get_single_db()
+
+def get_all_dbs():
+    shards = get_shards()
+    return shards.managers() if shards is not None else [get_single_db()]
+
+# plotly solo se importa la primera vez que se dibuja un gráfico de presupuesto
+@st.cache_resource
+def get_plotly():
+    import plotly.graph_objects as go
+    return go
+
+# Lecturas en caché hasta la próxima escritura sobre las tablas que consultan
+# (get_cache guarda una caché por archivo, compartida entre sesiones)
+def get_query_cache():
+    return get_cache(get_db())
+
+# Modo write-behind (DASHBOARD_WRITE_BEHIND=1): un hilo escritor agrupa los
+# movimientos, gastos y altas de productos de todas las sesiones en commits por lote
+@st.cache_resource
+def _write_queue(db_name):
+    return WriteQueue(get_manager(db_name))
+
+def get_write_queue():
+    # Un hilo escritor por archivo: cada almacén confirma sus lotes por separado
+    if os.environ.get("DASHBOARD_WRITE_BEHIND") == "1":
+        return _write_queue(get_db().db_name)
+    return None
+
+def run_write(fn):
+    # Ejecuta fn(conn) en la cola de escritura si está activa; si no, en su
+    # propia transacción. En ambos casos espera el resultado ya confirmado.
+    write_queue = get_write_queue()
+    if write_queue is not None:
+        return write_queue.submit(fn).result()
+    return get_db().run_transaction(fn)
+
+# Cierre de stock del día anterior: se guarda una vez por día, archivo y proceso
+@st.cache_data(show_spinner=False)
+def ensure_daily_snapshot(hoy, db_name):
+    manager = get_manager(db_name)
+    if take_snapshot(manager):
+        get_cache(manager).invalidate('stock_snapshot')
+    return hoy
 
 # --- Funciones de Base de Datos (Ejemplos) ---
 def get_products():
-    conn = sqlite3.connect(DB_NAME)
-    df = pd.read_sql_query("SELECT * FROM productos", conn)
-    conn.close()
-    return df
+    return get_query_cache().read_sql("SELECT * FROM productos", tables=('productos',))
 
 def add_product(nombre, unidad, stock_min, precio, proveedor, ubicacion):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
+    def write(conn):
+        cursor = conn.execute("INSERT INTO productos (nombre_producto, unidad_medida, stock_minimo, precio_unitario, proveedor, ubicacion) VALUES (?, ?, ?, ?, ?, ?)",
+                              (nombre, unidad, stock_min, precio, proveedor, ubicacion))
+        # Inicializar stock actual en 0 para el nuevo producto (misma transacción)
+        conn.execute("INSERT INTO inventario_actual (id_producto, stock_actual) VALUES (?, 0)", (cursor.lastrowid,))
+
     try:
-        cursor.execute("INSERT INTO productos (nombre_producto, unidad_medida, stock_minimo, precio_unitario, proveedor, ubicacion) VALUES (?, ?, ?, ?, ?, ?)",
-                       (nombre, unidad, stock_min, precio, proveedor, ubicacion))
-        conn.commit()
-        # Inicializar stock actual en 0 para el nuevo producto
-        cursor.execute("INSERT INTO inventario_actual (id_producto, stock_actual) VALUES (?, 0)", (cursor.lastrowid,))
-        conn.commit()
+        run_write(write)
+        get_query_cache().invalidate('productos', 'inventario_actual')
         st.success(f"Producto '{nombre}' agregado exitosamente.")
     except sqlite3.IntegrityError:
         st.error(f"Error: El producto '{nombre}' ya existe.")
-    finally:
-        conn.close()
 
-def add_kardex_movement(id_producto, tipo_movimiento, cantidad, referencia):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
+def add_kardex_movement(id_producto, tipo_movimiento, cantidad, referencia, costo_unitario=None):
     try:
-        if tipo_movimiento == 'SALIDA':
-            # Validar stock
-            cursor.execute("SELECT stock_actual FROM inventario_actual WHERE id_producto = ?", (id_producto,))
-            current_stock = cursor.fetchone()[0]
-            if current_stock < cantidad:
-                st.error(f"Error: No hay suficiente stock para la salida. Stock actual: {current_stock}")
-                return False
-        
-        cursor.execute("INSERT INTO kardex (id_producto, tipo_movimiento, cantidad, fecha_movimiento, referencia) VALUES (?, ?, ?, ?, ?)",
-                       (id_producto, tipo_movimiento, cantidad, datetime.now().strftime('%Y-%m-%d'), referencia))
-        
-        # Actualizar inventario_actual
-        if tipo_movimiento == 'ENTRADA':
-            cursor.execute("UPDATE inventario_actual SET stock_actual = stock_actual + ? WHERE id_producto = ?", (cantidad, id_producto))
-        else: # SALIDA
-            cursor.execute("UPDATE inventario_actual SET stock_actual = stock_actual - ? WHERE id_producto = ?", (cantidad, id_producto))
-        
-        conn.commit()
+        run_write(lambda conn: insert_movement(conn, id_producto, tipo_movimiento, cantidad, referencia, costo_unitario=costo_unitario))
+        get_query_cache().invalidate('kardex', 'inventario_actual', *VALUATION_TABLES)
         st.success("Movimiento de Kardex registrado y stock actualizado.")
         return True
+    except StockInsuficienteError as e:
+        st.error(f"Error: {e}")
+        return False
     except Exception as e:
         st.error(f"Error al registrar movimiento: {e}")
         return False
-    finally:
-        conn.close()
+
+def export_download(key, file_stem, export):
+    # La exportación se prepara a pedido, no en cada rerun: export(destino, formato)
+    # escribe por bloques a un archivo temporal y solo el archivo terminado
+    # pasa a la descarga
+    col_fmt, col_btn = st.columns([0.3, 0.7])
+    with col_fmt:
+        formato = st.selectbox("Formato", FORMATOS, key=f"{key}_formato")
+    with col_btn:
+        st.write("")
+        preparar = st.button("Preparar exportación", key=f"{key}_preparar")
+    if preparar:
+        with tempfile.TemporaryFile() as tmp:
+            with st.spinner("Exportando..."):
+                filas = export(tmp, formato)
+            tmp.seek(0)
+            data = tmp.read()
+        st.download_button(f"Descargar {filas:,} filas ({formato.upper()})", data, file_name=f"{file_stem}.{formato}",
+                           mime=MIME[formato], key=f"{key}_descargar", on_click="ignore")
+
+def product_picker(label, key, include_all=False):
+    # Selector con búsqueda por prefijo: solo se traen las mejores
+    # coincidencias del texto escrito, no el catálogo completo
+    texto = st.text_input(f"Buscar {label.lower()}", key=f"{key}_buscar", placeholder="Nombre, proveedor o ubicación")
+    matches = search_products(get_query_cache(), texto)
+    names = dict(zip(matches['id_producto'].tolist(), matches['nombre_producto']))
+    options = ([None] if include_all else []) + list(names)
+    return st.selectbox(label, options, format_func=lambda id_producto: "Todos" if id_producto is None else names[id_producto], key=key)
+
+def toggle_profiling():
+    # Solo la sesión que cambia la casilla activa o desactiva el perfilado del proceso
+    for manager in get_all_dbs():
+        manager.profiler = get_profiler() if st.session_state.debug_profile else None
 
 # --- Interfaz de Usuario de Streamlit ---
 st.set_page_config(layout="wide", page_title="Dashboard de Control")
-
-# Inicializar la base de datos si no existe
-init_db()
+script_start = time.perf_counter()
 
 st.sidebar.title("Navegación")
-selection = st.sidebar.radio("Ir a", ["Kardex", "Pedido Sugerido", "Control de Presupuestos", "Gestión de Productos"])
+pages = ["Kardex", "Pedido Sugerido", "Control de Presupuestos", "Gestión de Productos"]
+if get_shards() is not None:
+    st.sidebar.selectbox("Almacén", get_shards().almacenes, key="almacen")
+    pages.append("Consolidado")
+selection = st.sidebar.radio("Ir a", pages)
+
+if get_write_queue() is not None:
+    with st.sidebar.expander("Cola de escritura"):
+        write_stats = get_write_queue().stats()
+        st.metric("En cola", write_stats['en_cola'])
+        st.metric("Lote promedio", f"{write_stats['lote_promedio']:.1f}")
+        st.caption(f"{write_stats['escrituras']} escrituras en {write_stats['lotes']} lotes "
+                   f"(máximo {write_stats['lote_maximo']}, fallidas {write_stats['fallidas']})")
+
+with st.sidebar.expander("Depuración"):
+    st.checkbox("Perfilar consultas", value=get_db().profiler is not None, key="debug_profile", on_change=toggle_profiling)
+    profiler = get_db().profiler
+    if profiler is not None:
+        st.caption("Tiempo por página (ms)")
+        st.dataframe(profiler.pages()[['pagina', 'ultima_ms', 'promedio_ms', 'max_ms']], hide_index=True)
+        st.caption("Sentencias con más tiempo acumulado")
+        st.dataframe(profiler.statements().head(20)[['sql', 'llamadas', 'total_ms', 'max_ms', 'filas', 'dataframe_ms']], hide_index=True)
+        slow = profiler.slow_queries()
+        st.caption(f"Consultas lentas (≥ {profiler.slow_ms} ms): {len(slow)}")
+        for entry in reversed(slow[-5:]):
+            st.code(f"-- {entry['duracion_ms']} ms, {entry['filas']} filas\n{entry['sql']}\n-- plan:\n{entry['plan']}", language="sql")
+        st.download_button("Exportar estadísticas (JSON)", profiler.export(), file_name="perfil_consultas.json", mime="application/json")
+        if st.button("Reiniciar estadísticas"):
+            profiler.reset()
 
 # --- Módulo de Gestión de Productos (ejemplo, para añadir productos) ---
 if selection == "Gestión de Productos":
@@ -171,96 +226,240 @@ if selection == "Gestión de Productos":
 elif selection == "Kardex":
     st.title("Control de Kardex")
     
-    products = get_products()
-    product_options = {row['nombre_producto']: row['id_producto'] for index, row in products.iterrows()}
-    
     st.subheader("Registrar Movimiento")
+    # El buscador queda fuera del formulario para actualizar las coincidencias al escribir
+    selected_product_id = product_picker("Producto", key="kardex_prod")
     with st.form("kardex_form"):
         col1, col2 = st.columns(2)
         with col1:
-            selected_product_name = st.selectbox("Producto", list(product_options.keys()), key="kardex_prod")
             tipo_mov = st.radio("Tipo de Movimiento", ('ENTRADA', 'SALIDA'), key="kardex_tipo")
+            costo = st.number_input("Costo Unitario (solo ENTRADA)", min_value=0.0, value=None, format="%.2f",
+                                    placeholder="Precio del producto", key="kardex_costo")
         with col2:
             cantidad = st.number_input("Cantidad", min_value=1, value=1, key="kardex_cant")
             referencia = st.text_input("Referencia (Ej. Factura #)", key="kardex_ref")
         
         submitted = st.form_submit_button("Registrar Movimiento")
         if submitted:
-            if selected_product_name:
-                product_id = product_options[selected_product_name]
-                add_kardex_movement(product_id, tipo_mov, cantidad, referencia)
+            if selected_product_id is not None:
+                add_kardex_movement(selected_product_id, tipo_mov, cantidad, referencia, costo)
             else:
                 st.warning("Debe seleccionar un producto.")
 
+    with st.expander("Importar Movimientos (CSV / Parquet)"):
+        st.caption("Columnas: id_producto, tipo_movimiento (ENTRADA/SALIDA), cantidad, fecha_movimiento (opcional, YYYY-MM-DD), "
+                   "referencia (opcional), costo_unitario (opcional, de las ENTRADAS; vacío = precio del producto).")
+        archivo = st.file_uploader("Archivo de movimientos", type=["csv", "parquet"], key="kardex_import_file")
+        if archivo is not None and st.button("Importar", key="kardex_import_btn"):
+            try:
+                with st.spinner("Importando movimientos..."):
+                    resultado = import_movements(archivo, get_db())
+                get_query_cache().invalidate('kardex', 'inventario_actual', 'stock_snapshot', *VALUATION_TABLES)
+                st.success(f"{resultado['insertados']} movimientos importados; "
+                           f"{resultado['productos_actualizados']} productos actualizados.")
+                rechazados = resultado['rechazados']
+                if not rechazados.empty:
+                    st.warning(f"{len(rechazados)} filas rechazadas.")
+                    st.dataframe(rechazados, hide_index=True)
+                    st.download_button(
+                        label="Descargar Filas Rechazadas (CSV)",
+                        data=rechazados.to_csv(index=False).encode('utf-8'),
+                        file_name="movimientos_rechazados.csv",
+                        mime="text/csv",
+                    )
+            except Exception as e:
+                st.error(f"Error al importar movimientos: {e}")
+
     st.subheader("Historial de Movimientos de Kardex")
-    conn = sqlite3.connect(DB_NAME)
-    kardex_df = pd.read_sql_query("""
-        SELECT 
-            k.fecha_movimiento,
-            p.nombre_producto,
-            k.tipo_movimiento,
-            k.cantidad,
-            k.referencia
-        FROM kardex k
-        JOIN productos p ON k.id_producto = p.id_producto
-        ORDER BY k.fecha_movimiento DESC
-    """, conn)
-    conn.close()
-    st.dataframe(kardex_df)
-
-    # Añadir gráficos de Kardex (ejemplo)
+    col_f1, col_f2, col_f3, col_f4, col_f5 = st.columns([0.3, 0.15, 0.2, 0.2, 0.15])
+    with col_f1:
+        filtro_producto = product_picker("Filtrar por Producto", key="hist_prod", include_all=True)
+    with col_f2:
+        filtro_tipo = st.selectbox("Tipo", ["Todos", "ENTRADA", "SALIDA"], key="hist_tipo")
+    with col_f3:
+        filtro_desde = st.date_input("Desde", value=None, key="hist_desde")
+    with col_f4:
+        filtro_hasta = st.date_input("Hasta", value=None, key="hist_hasta")
+    with col_f5:
+        page_size = st.selectbox("Filas por página", [25, 50, 100, 250], index=1, key="hist_page_size")
+
+    # Pila de cursores: el último elemento es el inicio de la página visible.
+    # Al cambiar cualquier filtro se vuelve a la primera página.
+    filtros = (filtro_producto, filtro_tipo, filtro_desde, filtro_hasta, page_size)
+    if st.session_state.get('hist_filtros') != filtros:
+        st.session_state.hist_filtros = filtros
+        st.session_state.hist_cursors = [None]
+
+    kardex_df, next_cursor = get_kardex_page(
+        get_query_cache(),
+        page_size=page_size,
+        after=st.session_state.hist_cursors[-1],
+        id_producto=filtro_producto,
+        tipo_movimiento=None if filtro_tipo == "Todos" else filtro_tipo,
+        desde=filtro_desde,
+        hasta=filtro_hasta,
+    )
+    st.dataframe(kardex_df.drop(columns=['id_movimiento']), hide_index=True)
+
+    col_prev, col_page, col_next = st.columns([0.2, 0.6, 0.2])
+    with col_prev:
+        if st.button("← Anterior", disabled=len(st.session_state.hist_cursors) == 1, key="hist_prev"):
+            st.session_state.hist_cursors.pop()
+            st.rerun()
+    with col_page:
+        st.caption(f"Página {len(st.session_state.hist_cursors)}")
+    with col_next:
+        if st.button("Siguiente →", disabled=next_cursor is None, key="hist_next"):
+            st.session_state.hist_cursors.append(next_cursor)
+            st.rerun()
+
+    with st.expander("Exportar historial"):
+        st.caption("Exporta todos los movimientos que cumplen los filtros actuales, en orden cronológico.")
+        export_download("hist_export", "kardex", lambda destino, formato: export_kardex(
+            get_db(), destino, formato,
+            id_producto=filtro_producto,
+            tipo_movimiento=None if filtro_tipo == "Todos" else filtro_tipo,
+            desde=filtro_desde,
+            hasta=filtro_hasta,
+        ))
+
+    # Análisis agregado en SQL: ningún gráfico recibe una fila por producto del catálogo
     st.subheader("Análisis de Inventario")
-    conn = sqlite3.connect(DB_NAME)
-    current_stock_df = pd.read_sql_query("""
-        SELECT 
-            p.nombre_producto,
-            ia.stock_actual
-        FROM inventario_actual ia
-        JOIN productos p ON ia.id_producto = p.id_producto
-    """, conn)
-    conn.close()
-    
-    if not current_stock_df.empty:
-        total_stock = current_stock_df['stock_actual'].sum()
-        st.metric("Stock Total Actual", f"{total_stock} unidades")
-        
-        st.bar_chart(current_stock_df.set_index('nombre_producto'))
+    totales = inventory_totals(get_query_cache())
+    col_m1, col_m2, col_m3 = st.columns(3)
+    col_m1.metric("Stock Total Actual", f"{int(totales['stock'])} unidades")
+    col_m2.metric("Valor del Inventario", f"${totales['valor']:,.2f}")
+    col_m3.metric("Productos con Stock", f"{int(totales['con_stock'])} de {int(totales['productos'])}")
+
+    # Valor al costo desde el estado que mantienen los triggers de kardex
+    valuacion = valuation_totals(get_query_cache())
+    col_v1, col_v2 = st.columns(2)
+    col_v1.metric("Valor al Costo Promedio", f"${valuacion['valor_promedio']:,.2f}")
+    col_v2.metric("Valor al Costo FIFO", f"${valuacion['valor_fifo']:,.2f}")
+    if valuacion['pendientes']:
+        st.warning(f"{int(valuacion['pendientes'])} productos con movimientos corregidos o borrados tienen la valuación desactualizada.")
+        if st.button("Recalcular productos pendientes", key="valuacion_pendientes"):
+            rebuild_pending_valuation(get_db())
+            get_query_cache().invalidate(*VALUATION_TABLES)
+            st.rerun()
+
+    if totales['productos'] > 0:
+        col_orden, col_n = st.columns([0.5, 0.5])
+        with col_orden:
+            orden = st.radio("Ordenar por", ["stock", "valor"], format_func=lambda o: "Unidades" if o == "stock" else "Valor",
+                             horizontal=True, key="analisis_orden")
+        with col_n:
+            top_n = st.number_input("Productos por gráfico", min_value=5, max_value=50, value=TOP_N, key="analisis_n")
+        col_top, col_bottom = st.columns(2)
+        with col_top:
+            st.caption(f"Top {top_n}")
+            st.bar_chart(stock_ranking(get_query_cache(), orden, int(top_n)).set_index('nombre_producto')[orden], horizontal=True)
+        with col_bottom:
+            st.caption(f"Últimos {top_n}")
+            st.bar_chart(stock_ranking(get_query_cache(), orden, int(top_n), ascending=True).set_index('nombre_producto')[orden], horizontal=True)
+
+        agrupacion = st.radio("Agrupar por", ["proveedor", "ubicacion"], format_func=lambda a: "Proveedor" if a == "proveedor" else "Ubicación",
+                              horizontal=True, key="analisis_agrupacion")
+        rollup_df = stock_rollup(get_query_cache(), agrupacion)
+        # Barras dentro de la tabla: una sola tabla en lugar de un gráfico más
+        st.dataframe(rollup_df, hide_index=True, column_config={
+            orden: st.column_config.ProgressColumn(
+                "Unidades" if orden == "stock" else "Valor", format="%d" if orden == "stock" else "$%.2f",
+                min_value=0, max_value=float(rollup_df[orden].max()) if not rollup_df.empty else 1.0),
+        })
+
+        st.caption("Evolución del stock de un producto")
+        col_serie, col_serie_desde = st.columns([0.7, 0.3])
+        with col_serie:
+            serie_producto = product_picker("Producto", key="serie_prod")
+        with col_serie_desde:
+            serie_desde = st.date_input("Desde", value=None, key="serie_desde")
+        if serie_producto is not None:
+            serie_df = stock_series(get_query_cache(), serie_producto, desde=serie_desde)
+            if not serie_df.empty:
+                serie_df['fecha'] = pd.to_datetime(serie_df['fecha'])
+                st.line_chart(serie_df.set_index('fecha')[['stock', 'minimo', 'maximo']])
+            else:
+                st.info("El producto no tiene movimientos en ese periodo.")
     else:
         st.info("No hay productos en inventario.")
 
+    st.subheader("Stock a una Fecha")
+    ensure_daily_snapshot(datetime.now().strftime('%Y-%m-%d'), get_db().db_name)
+    fecha_corte = st.date_input("Fecha de corte", value=datetime.now(), key="stock_fecha_corte")
+    stock_fecha_df = stock_as_of(get_query_cache(), fecha_corte)
+    if not stock_fecha_df.empty:
+        st.metric(f"Stock Total al {fecha_corte}", f"{stock_fecha_df['stock'].sum()} unidades")
+        st.dataframe(stock_fecha_df, hide_index=True)
+        export_download("stock_export", f"stock_{fecha_corte}",
+                        lambda destino, formato: export_stock(get_db(), destino, formato, fecha=fecha_corte))
+    else:
+        st.info("No había stock registrado a esa fecha.")
+
+    with st.expander("Reconciliar Inventario"):
+        st.caption("Recalcula el stock actual de cada producto a partir del historial de Kardex.")
+        if st.button("Reconciliar", key="reconciliar_inventario"):
+            corregidos = rebuild_inventory(get_db())
+            get_query_cache().invalidate('inventario_actual')
+            st.success(f"Inventario reconciliado: {corregidos} productos corregidos.")
+
+    with st.expander("Recalcular Valuación"):
+        st.caption("Recalcula el costo promedio, las capas FIFO y el costo de ventas de todos los productos "
+                   "a partir del historial de Kardex, incluidos los periodos cerrados.")
+        if st.button("Recalcular", key="recalcular_valuacion"):
+            with st.spinner("Recalculando valuación..."):
+                productos_valuados = rebuild_valuation(get_db())
+            get_query_cache().invalidate(*VALUATION_TABLES)
+            st.success(f"Valuación recalculada para {productos_valuados} productos.")
+
+    with st.expander("Cierre de Periodo"):
+        st.caption("Mueve los movimientos anteriores al corte y los gastos de los meses anteriores a archivos "
+                   "anuales y deja un saldo de apertura por producto. Las consultas que llegan a fechas "
+                   f"cerradas leen los archivos. El corte debe dejar al menos {MIN_RETENTION_DAYS} días en la base activa.")
+        cierres_df = get_closed_periods(get_query_cache())
+        if not cierres_df.empty:
+            st.dataframe(cierres_df, hide_index=True)
+        corte = st.date_input("Primer día que queda en la base activa",
+                              value=datetime.now().date() - timedelta(days=MIN_RETENTION_DAYS), key="cierre_corte")
+        compactar = st.checkbox("Compactar la base al terminar (VACUUM)", key="cierre_compactar")
+        if st.button("Cerrar Periodo", key="cierre_btn"):
+            try:
+                with st.spinner("Archivando periodo..."):
+                    resultado = close_period(get_db(), corte)
+                    if compactar:
+                        compact(get_db())
+                get_query_cache().invalidate('kardex', 'gastos_reales', 'stock_snapshot', 'resumen_mensual', 'cierres_periodo')
+                st.success(f"Periodo cerrado: {resultado['movimientos']} movimientos y {resultado['gastos']} gastos "
+                           f"archivados; {resultado['saldos_apertura']} saldos de apertura.")
+            except ValueError as e:
+                st.error(f"Error: {e}")
+
 # --- Módulo Pedido Sugerido ---
 elif selection == "Pedido Sugerido":
     st.title("Pedido Sugerido")
-    st.write("Genera una lista de productos que necesitan ser reabastecidos.")
-    
-    conn = sqlite3.connect(DB_NAME)
-    sug_df = pd.read_sql_query("""
-        SELECT 
-            p.nombre_producto,
-            ia.stock_actual,
-            p.stock_minimo,
-            (p.stock_minimo - ia.stock_actual) AS cantidad_sugerida
-        FROM inventario_actual ia
-        JOIN productos p ON ia.id_producto = p.id_producto
-        WHERE ia.stock_actual < p.stock_minimo
-    """, conn)
-    conn.close()
-    
+    st.write("Genera una lista de productos que necesitan ser reabastecidos según su consumo real.")
+
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        lead_time = st.number_input("Lead time (días)", min_value=0, value=LEAD_TIME_DIAS, key="sug_lead_time")
+    with col2:
+        cobertura = st.number_input("Cobertura (días)", min_value=1, value=COBERTURA_DIAS, key="sug_cobertura")
+    with col3:
+        ventana = st.number_input("Ventana de consumo (semanas)", min_value=1, value=VENTANA_SEMANAS, key="sug_ventana")
+    with col4:
+        nivel_z = st.number_input("Nivel de servicio (z)", min_value=0.0, value=NIVEL_SERVICIO_Z, step=0.05, key="sug_z")
+    estacional = st.checkbox("Ajustar por estacionalidad (mismo periodo del año anterior)", value=True, key="sug_estacional")
+
+    sug_df = get_reorder_suggestions(get_query_cache(), lead_time_dias=int(lead_time), cobertura_dias=int(cobertura),
+                                     ventana_semanas=int(ventana), nivel_servicio_z=float(nivel_z), estacional=estacional)
+
     if not sug_df.empty:
-        # Filtrar para mostrar solo sugerencias válidas (cantidad_sugerida > 0)
-        sug_df = sug_df[sug_df['cantidad_sugerida'] > 0]
         st.dataframe(sug_df)
-        
-        # Botón para exportar
-        csv_export = sug_df.to_csv(index=False).encode('utf-8')
-        st.download_button(
-            label="Descargar Pedido Sugerido (CSV)",
-            data=csv_export,
-            file_name="pedido_sugerido.csv",
-            mime="text/csv",
-        )
+
+        # Exportar en el formato elegido
+        export_download("sug_export", "pedido_sugerido", lambda destino, formato: export_frame(sug_df, destino, formato))
     else:
-        st.info("No hay productos por debajo del stock mínimo. ¡Todo en orden!")
+        st.info("No hay productos por debajo de su punto de reorden. ¡Todo en orden!")
 
 # --- Módulo Control de Presupuestos ---
 elif selection == "Control de Presupuestos":
@@ -274,81 +473,83 @@ elif selection == "Control de Presupuestos":
         submitted_pres = st.form_submit_button("Guardar Presupuesto Total")
         if submitted_pres:
             if mes_anio_presupuesto and monto_total > 0:
-                conn = sqlite3.connect(DB_NAME)
-                cursor = conn.cursor()
                 try:
-                    cursor.execute("INSERT OR REPLACE INTO presupuestos (mes_anio, monto_total_presupuesto) VALUES (?, ?)",
-                                   (mes_anio_presupuesto, monto_total))
-                    conn.commit()
+                    save_budget(get_db(), mes_anio_presupuesto, monto_total)
+                    get_query_cache().invalidate('presupuestos')
                     st.success(f"Presupuesto total para {mes_anio_presupuesto} guardado.")
                 except Exception as e:
                     st.error(f"Error al guardar presupuesto: {e}")
-                finally:
-                    conn.close()
             else:
                 st.warning("Debe ingresar un mes/año y un monto válido.")
 
     st.subheader("Dividir Presupuesto por Categoría")
-    conn = sqlite3.connect(DB_NAME)
-    presupuestos_disponibles = pd.read_sql_query("SELECT mes_anio, monto_total_presupuesto FROM presupuestos", conn)
-    conn.close()
+    presupuestos_disponibles = get_query_cache().read_sql("SELECT mes_anio, monto_total_presupuesto FROM presupuestos", tables=('presupuestos',))
 
     if not presupuestos_disponibles.empty:
         selected_pres_mes_anio = st.selectbox("Seleccione Mes y Año del Presupuesto a Dividir", 
                                                 presupuestos_disponibles['mes_anio'].tolist(), key="select_split_pres")
         
-        conn = sqlite3.connect(DB_NAME)
         total_pres_for_month = presupuestos_disponibles[presupuestos_disponibles['mes_anio'] == selected_pres_mes_anio]['monto_total_presupuesto'].iloc[0]
         
         st.info(f"Monto Total Presupuestado para {selected_pres_mes_anio}: ${total_pres_for_month:,.2f}")
         
-        st.session_state.categories = st.session_state.get('categories', [])
-        
-        def add_category():
-            st.session_state.categories.append({"categoria": "", "monto": 0.0})
-
-        if st.button("Añadir Nueva Categoría"):
-            add_category()
-
-        current_allocated = 0.0
-        temp_categories = [] # Usar una lista temporal para las categorías editadas
-        
-        for i, cat_data in enumerate(st.session_state.categories):
-            col_cat, col_monto = st.columns([0.6, 0.4])
-            with col_cat:
-                cat_data["categoria"] = st.text_input(f"Categoría {i+1}", value=cat_data["categoria"], key=f"cat_name_{i}")
-            with col_monto:
-                cat_data["monto"] = st.number_input(f"Monto Asignado {i+1}", min_value=0.0, value=cat_data["monto"], format="%.2f", key=f"cat_monto_{i}")
-            current_allocated += cat_data["monto"]
-            temp_categories.append(cat_data) # Actualizar la lista temporal
-
-        st.session_state.categories = temp_categories # Reemplazar con la lista temporal actualizada
-
+        split_df = get_budget_split(get_query_cache(), selected_pres_mes_anio)
+        # El editor parte de la división guardada o de la copia de otro mes;
+        # la versión en su clave lo reinicia al cambiar de mes, copiar o guardar
+        if st.session_state.get('split_mes') != selected_pres_mes_anio:
+            st.session_state.split_mes = selected_pres_mes_anio
+            st.session_state.split_copia = None
+            st.session_state.split_version = st.session_state.get('split_version', 0) + 1
+
+        otros_meses = sorted((m for m in presupuestos_disponibles['mes_anio'] if m != selected_pres_mes_anio), reverse=True)
+        if otros_meses:
+            col_origen, col_copiar = st.columns([0.6, 0.4], vertical_alignment="bottom")
+            with col_origen:
+                mes_origen = st.selectbox("Copiar la división de", otros_meses, key="split_origen")
+            with col_copiar:
+                if st.button("Copiar al Editor", key="split_copiar"):
+                    origen_df = get_budget_split(get_query_cache(), mes_origen)
+                    if origen_df.empty:
+                        st.warning(f"{mes_origen} no tiene división por categoría.")
+                    else:
+                        st.session_state.split_copia = copy_budget_split(origen_df, split_df)
+                        st.session_state.split_version += 1
+            if st.session_state.split_copia is not None:
+                st.caption("La copia se aplica al guardar; las categorías que no estén en ella se eliminan.")
+
+        # Dentro del formulario, las ediciones quedan en el navegador hasta guardar
+        with st.form("split_form"):
+            edited_df = st.data_editor(
+                split_df if st.session_state.split_copia is None else st.session_state.split_copia,
+                key=f"split_editor_{st.session_state.split_version}",
+                num_rows="dynamic",
+                hide_index=True,
+                use_container_width=True,
+                column_config={
+                    'id_detalle': None,
+                    'categoria_gasto': st.column_config.TextColumn("Categoría", required=True),
+                    'monto_asignado': st.column_config.NumberColumn("Monto Asignado", min_value=0.0, format="%.2f", required=True),
+                },
+            )
+            guardar_division = st.form_submit_button("Guardar División de Presupuesto")
+
+        current_allocated = float(pd.to_numeric(edited_df['monto_asignado'], errors='coerce').fillna(0).sum())
         remaining_budget = total_pres_for_month - current_allocated
         st.write(f"Monto Asignado: ${current_allocated:,.2f} | Presupuesto Restante: ${remaining_budget:,.2f}")
 
-        if st.button("Guardar División de Presupuesto"):
+        if guardar_division:
             if remaining_budget >= 0: # Puede ser 0 si se asignó todo
-                conn = sqlite3.connect(DB_NAME)
-                cursor = conn.cursor()
                 try:
-                    # Obtener id_presupuesto
-                    cursor.execute("SELECT id_presupuesto FROM presupuestos WHERE mes_anio = ?", (selected_pres_mes_anio,))
-                    pres_id = cursor.fetchone()[0]
-                    
-                    # Eliminar divisiones anteriores para este mes/año
-                    cursor.execute("DELETE FROM detalle_presupuesto WHERE id_presupuesto = ?", (pres_id,))
-
-                    for cat_data in st.session_state.categories:
-                        if cat_data["categoria"] and cat_data["monto"] >= 0:
-                            cursor.execute("INSERT INTO detalle_presupuesto (id_presupuesto, categoria_gasto, monto_asignado) VALUES (?, ?, ?)",
-                                           (pres_id, cat_data["categoria"], cat_data["monto"]))
-                    conn.commit()
-                    st.success("División de presupuesto guardada exitosamente.")
+                    cambios = run_write(lambda conn: apply_budget_split(conn, selected_pres_mes_anio, edited_df))
+                    get_query_cache().invalidate('detalle_presupuesto', 'resumen_mensual')
+                    st.session_state.split_copia = None
+                    st.session_state.split_version += 1
+                    st.success(f"División de presupuesto guardada: {cambios['altas']} altas, "
+                               f"{cambios['cambios']} cambios y {cambios['bajas']} bajas.")
+                except ValueError as e:
+                    st.error(f"Error: {e}")
                 except Exception as e:
                     st.error(f"Error al guardar división de presupuesto: {e}")
-                finally:
-                    conn.close()
             else:
                 st.error("El monto asignado excede el presupuesto total. Por favor, ajuste las categorías.")
     else:
@@ -362,15 +563,11 @@ elif selection == "Control de Presupuestos":
             gasto_fecha = st.date_input("Fecha del Gasto", value=datetime.now(), key="gasto_fecha")
             
             # Obtener categorías de presupuesto para el mes seleccionado
-            conn = sqlite3.connect(DB_NAME)
-            cursor = conn.cursor()
-            cursor.execute("""
+            categorias_gasto = get_query_cache().read_sql("""
                 SELECT dp.categoria_gasto FROM detalle_presupuesto dp
                 JOIN presupuestos p ON dp.id_presupuesto = p.id_presupuesto
                 WHERE p.mes_anio = ?
-            """, (gasto_mes_anio,))
-            categorias_gasto = [row[0] for row in cursor.fetchall()]
-            conn.close()
+            """, (gasto_mes_anio,), tables=('detalle_presupuesto', 'presupuestos'))['categoria_gasto'].tolist()
             
             if categorias_gasto:
                 gasto_categoria = st.selectbox("Categoría del Gasto", categorias_gasto, key="gasto_categoria")
@@ -385,62 +582,37 @@ elif selection == "Control de Presupuestos":
         submitted_gasto = st.form_submit_button("Registrar Gasto")
         if submitted_gasto:
             if gasto_mes_anio and gasto_fecha and gasto_categoria and gasto_monto > 0:
-                conn = sqlite3.connect(DB_NAME)
-                cursor = conn.cursor()
                 try:
-                    cursor.execute("INSERT INTO gastos_reales (mes_anio, categoria_gasto, fecha_gasto, monto_gasto, descripcion) VALUES (?, ?, ?, ?, ?)",
-                                   (gasto_mes_anio, gasto_categoria, gasto_fecha.strftime('%Y-%m-%d'), gasto_monto, gasto_descripcion))
-                    conn.commit()
+                    run_write(lambda conn: insert_expense(conn, gasto_mes_anio, gasto_categoria, gasto_fecha.strftime('%Y-%m-%d'), gasto_monto, gasto_descripcion))
+                    get_query_cache().invalidate('gastos_reales', 'resumen_mensual')
                     st.success("Gasto registrado exitosamente.")
                 except Exception as e:
                     st.error(f"Error al registrar gasto: {e}")
-                finally:
-                    conn.close()
             else:
                 st.warning("Todos los campos de gasto son obligatorios.")
 
     st.subheader("Resumen de Presupuesto vs. Gasto")
     
     # Selector de mes y año para la visualización
-    conn = sqlite3.connect(DB_NAME)
-    available_months = pd.read_sql_query("SELECT DISTINCT mes_anio FROM presupuestos UNION SELECT DISTINCT mes_anio FROM gastos_reales ORDER BY mes_anio DESC", conn)
-    conn.close()
+    available_months = get_summary_months(get_query_cache())
     
-    if not available_months.empty:
-        selected_view_month = st.selectbox("Seleccione Mes para Visualizar", available_months['mes_anio'].tolist(), key="select_view_month")
+    if available_months:
+        selected_view_month = st.selectbox("Seleccione Mes para Visualizar", available_months, key="select_view_month")
         
-        conn = sqlite3.connect(DB_NAME)
-        # Obtener presupuesto total y detalle
-        presupuesto_df = pd.read_sql_query(f"""
-            SELECT p.monto_total_presupuesto, dp.categoria_gasto, dp.monto_asignado
-            FROM presupuestos p
-            LEFT JOIN detalle_presupuesto dp ON p.id_presupuesto = dp.id_presupuesto
-            WHERE p.mes_anio = '{selected_view_month}'
-        """, conn)
-        
-        # Obtener gastos reales
-        gastos_df = pd.read_sql_query(f"""
-            SELECT categoria_gasto, SUM(monto_gasto) AS gasto_real
-            FROM gastos_reales
-            WHERE mes_anio = '{selected_view_month}'
-            GROUP BY categoria_gasto
-        """, conn)
-        conn.close()
-
-        if not presupuesto_df.empty:
-            total_presupuesto = presupuesto_df['monto_total_presupuesto'].iloc[0] if 'monto_total_presupuesto' in presupuesto_df.columns else 0.0
+        # Presupuesto total, asignado y gasto por categoría desde resumen_mensual
+        total_presupuesto, merged_df, total_gasto_mes = get_budget_summary(get_query_cache(), selected_view_month)
+
+        if total_presupuesto is not None:
             st.metric("Presupuesto Total del Mes", f"${total_presupuesto:,.2f}")
 
-            # Combinar datos para visualización
-            if not presupuesto_df.empty and 'categoria_gasto' in presupuesto_df.columns:
-                merged_df = pd.merge(presupuesto_df, gastos_df, on='categoria_gasto', how='left').fillna(0)
+            if not merged_df.empty:
                 merged_df['gasto_real'] = merged_df['gasto_real'].round(2) # Redondear para evitar problemas de flotantes
                 
                 st.subheader("Comparativa por Categoría")
                 st.dataframe(merged_df[['categoria_gasto', 'monto_asignado', 'gasto_real']])
                 
                 # Gráfico de barras apiladas
-                import plotly.graph_objects as go
+                go = get_plotly()
                 fig = go.Figure()
                 fig.add_trace(go.Bar(
                     x=merged_df['categoria_gasto'],
@@ -458,7 +630,6 @@ elif selection == "Control de Presupuestos":
                 st.plotly_chart(fig, use_container_width=True)
 
                 # KPIs de presupuesto restante
-                total_gasto_mes = gastos_df['gasto_real'].sum() if not gastos_df.empty else 0.0
                 presupuesto_restante = total_presupuesto - total_gasto_mes
                 
                 col_kpi1, col_kpi2 = st.columns(2)
@@ -470,9 +641,74 @@ elif selection == "Control de Presupuestos":
                 st.info("No hay categorías de presupuesto definidas para este mes o aún no se han registrado gastos.")
         else:
             st.info(f"No hay presupuesto configurado para {selected_view_month}.")
+
+        # Costo de ventas (SALIDAS al costo) junto al gasto registrado, desde
+        # costo_ventas_mensual y resumen_mensual: sin recorrer kardex
+        st.subheader("Costo de Ventas vs. Gasto Real")
+        costo_ventas_df = cogs_by_month(get_query_cache(), desde=available_months[min(11, len(available_months) - 1)],
+                                        hasta=available_months[0])
+        del_mes = costo_ventas_df[costo_ventas_df['mes_anio'] == selected_view_month]
+        col_cv1, col_cv2 = st.columns(2)
+        col_cv1.metric(f"Costo de Ventas {selected_view_month} (promedio)",
+                       f"${del_mes['costo_ventas_promedio'].sum():,.2f}")
+        col_cv2.metric(f"Costo de Ventas {selected_view_month} (FIFO)",
+                       f"${del_mes['costo_ventas_fifo'].sum():,.2f}")
+        if not costo_ventas_df.empty:
+            st.line_chart(costo_ventas_df.set_index('mes_anio')[['costo_ventas_promedio', 'costo_ventas_fifo', 'gasto_real']])
+
+        with st.expander("Exportar presupuestos y gastos"):
+            col_desde, col_hasta, col_conjunto = st.columns(3)
+            with col_desde:
+                export_desde = st.selectbox("Desde", available_months, index=len(available_months) - 1, key="pres_export_desde")
+            with col_hasta:
+                export_hasta = st.selectbox("Hasta", available_months, key="pres_export_hasta")
+            with col_conjunto:
+                conjunto = st.selectbox("Datos", ["Resumen por categoría", "Gastos registrados"], key="pres_export_conjunto")
+            export_fn = export_budget if conjunto == "Resumen por categoría" else export_expenses
+            export_download("pres_export", f"{'presupuesto' if export_fn is export_budget else 'gastos'}_{export_desde}_{export_hasta}",
+                            lambda destino, formato: export_fn(get_db(), destino, formato, desde=export_desde, hasta=export_hasta))
     else:
         st.info("No hay datos de presupuesto o gastos para mostrar. Configure un presupuesto primero.")
 
+# --- Módulo Consolidado (modo multi-almacén) ---
+elif selection == "Consolidado":
+    st.title("Consolidado de Almacenes")
+    st.write("Cada almacén se consulta en paralelo sobre su propio archivo y los resultados se combinan.")
+    shards = get_shards()
+
+    st.subheader("Stock por Almacén")
+    stock_almacenes = consolidated_stock(shards)
+    col_c1, col_c2 = st.columns(2)
+    col_c1.metric("Stock Total", f"{stock_almacenes['stock'].sum()} unidades")
+    col_c2.metric("Valor Total", f"${stock_almacenes['valor'].sum():,.2f}")
+    st.dataframe(stock_almacenes, hide_index=True)
+
+    st.subheader("Pedido Sugerido de Todos los Almacenes")
+    sug_total_df = consolidated_reorder(shards)
+    if not sug_total_df.empty:
+        st.dataframe(sug_total_df, hide_index=True)
+        export_download("cons_sug_export", "pedido_sugerido_almacenes", lambda destino, formato: export_frame(sug_total_df, destino, formato))
+    else:
+        st.info("Ningún almacén tiene productos por debajo de su punto de reorden.")
+
+    st.subheader("Presupuesto vs. Gasto Consolidado")
+    meses_consolidados = consolidated_months(shards)
+    if meses_consolidados:
+        mes_consolidado = st.selectbox("Mes", meses_consolidados, key="cons_mes")
+        total_consolidado, categorias_df, gasto_consolidado = consolidated_budget(shards, mes_consolidado)
+        col_p1, col_p2, col_p3 = st.columns(3)
+        col_p1.metric("Presupuesto Total", "-" if total_consolidado is None else f"${total_consolidado:,.2f}")
+        col_p2.metric("Gasto Total", f"${gasto_consolidado:,.2f}")
+        if total_consolidado is not None:
+            col_p3.metric("Presupuesto Restante", f"${total_consolidado - gasto_consolidado:,.2f}", delta_color="inverse")
+        st.dataframe(categorias_df[['categoria_gasto', 'monto_asignado', 'gasto_real']].round(2), hide_index=True)
+    else:
+        st.info("Ningún almacén tiene presupuestos ni gastos registrados.")
+
+# Tiempo total de esta ejecución del script para la página elegida
+if get_db().profiler is not None:
+    get_db().profiler.record_page(selection, time.perf_counter() - script_start)
+
 # --- Ejecución del dashboard ---
 # Para ejecutar esto, guarda el código como un archivo .py (ej. app.py) y corre en la terminal:
-# streamlit run app.py
\ No newline at end of file
+# streamlit run app.py
@@ -0,0 +1,449 @@
+# Cierre de periodo: los movimientos de kardex anteriores a una fecha de corte
+# y los gastos de los meses anteriores pasan a un archivo SQLite por año
+# (dashboard_control_archivo_2023.db) y la base activa recibe un saldo de
+# apertura por producto, así inventario_actual, los cierres de stock y los
+# reportes siguen cuadrando. Los archivos se adjuntan (ATTACH) a cada conexión
+# del pool y solo las consultas que llegan a antes del corte los leen.
+# Solo se crean archivos para los años con datos: el archivo de un año guarda
+# también los años sin datos que lo preceden, y los años más viejos se juntan
+# en uno solo si no alcanzan los ATTACH que permite SQLite.
+# Uso: python -m archive cerrar 2024-01-01 [--compactar] [--db dashboard_control.db]
+#      python -m archive estado
+import argparse
+import os
+import sqlite3
+import sys
+from datetime import date, datetime, timedelta
+
+from db import ARCHIVE_PREFIX, DB_NAME, archive_path, get_manager, init_db
+from inventory import balance_params, balance_sql, inventory_sync_suspended
+
+# El Pedido Sugerido estacional lee 56 semanas hacia atrás: un corte más
+# reciente le quitaría historia, salvo que se fuerce
+MIN_RETENTION_DAYS = 400
+OPENING_REFERENCE = 'Saldo de apertura'
+
+# ATTACH que un cierre deja libres para los siguientes cuando tiene que juntar
+# años en un mismo archivo (SQLite admite 10 bases adjuntas por defecto)
+ARCHIVE_ATTACH_RESERVE = 2
+
+# Mismas tablas e índices de lectura que la base activa, sin triggers
+_ARCHIVE_TABLES = [
+    '''
+        CREATE TABLE IF NOT EXISTS {s}.kardex (
+            id_movimiento INTEGER PRIMARY KEY,
+            id_producto INTEGER,
+            tipo_movimiento TEXT NOT NULL,
+            cantidad INTEGER NOT NULL,
+            fecha_movimiento DATE NOT NULL,
+            referencia TEXT,
+            costo_unitario REAL
+        )
+    ''',
+    "CREATE INDEX IF NOT EXISTS {s}.idx_kardex_fecha ON kardex (fecha_movimiento, id_movimiento)",
+    '''
+        CREATE INDEX IF NOT EXISTS {s}.idx_kardex_producto_saldo
+        ON kardex (id_producto, fecha_movimiento, id_movimiento, tipo_movimiento, cantidad)
+    ''',
+    '''
+        CREATE TABLE IF NOT EXISTS {s}.gastos_reales (
+            id_gasto INTEGER PRIMARY KEY,
+            mes_anio TEXT NOT NULL,
+            categoria_gasto TEXT NOT NULL,
+            fecha_gasto DATE NOT NULL,
+            monto_gasto REAL NOT NULL,
+            descripcion TEXT
+        )
+    ''',
+    "CREATE INDEX IF NOT EXISTS {s}.idx_gastos_mes_categoria ON gastos_reales (mes_anio, categoria_gasto)",
+    "CREATE TABLE IF NOT EXISTS {s}.stock_snapshot_fechas (fecha DATE PRIMARY KEY, creado TEXT NOT NULL)",
+    '''
+        CREATE TABLE IF NOT EXISTS {s}.stock_snapshot (
+            fecha DATE NOT NULL,
+            id_producto INTEGER NOT NULL,
+            stock INTEGER NOT NULL,
+            PRIMARY KEY (fecha, id_producto)
+        ) WITHOUT ROWID
+    ''',
+]
+
+
+def upgrade_archive(conn, schema):
+    # Un archivo creado antes de que kardex guardara el costo recibe la
+    # columna, con el precio actual del producto en sus ENTRADAS como la base activa
+    columnas = {row[1] for row in conn.execute(f"PRAGMA {schema}.table_info(kardex)")}
+    if columnas and 'costo_unitario' not in columnas:
+        conn.execute(f"ALTER TABLE {schema}.kardex ADD COLUMN costo_unitario REAL")
+        conn.execute(f"""
+            UPDATE {schema}.kardex
+            SET costo_unitario = COALESCE((SELECT precio_unitario FROM main.productos p WHERE p.id_producto = kardex.id_producto), 0)
+            WHERE tipo_movimiento = 'ENTRADA'
+        """)
+        conn.commit()
+
+
+def last_close(conn):
+    # (corte, id_apertura_desde, id_apertura_hasta) del último cierre, o None
+    return conn.execute("""
+        SELECT corte, id_apertura_desde, id_apertura_hasta
+        FROM cierres_periodo
+        ORDER BY corte DESC
+        LIMIT 1
+    """).fetchone()
+
+
+def attached_archives(conn):
+    # {año: esquema} de los archivos adjuntos a la conexión
+    return {int(name[len(ARCHIVE_PREFIX):]): name for _, name, _ in conn.execute("PRAGMA database_list")
+            if name.startswith(ARCHIVE_PREFIX)}
+
+
+def _day_before(fecha):
+    return str(date.fromisoformat(str(fecha)) - timedelta(days=1))
+
+
+def _archive_for_year(archivos, anio):
+    # Archivo que guarda el año `anio`: el primero desde ese año en adelante.
+    # Después del último archivo no hubo datos y el saldo es el de su final.
+    posteriores = [a for a in archivos if a >= anio]
+    return archivos[min(posteriores) if posteriores else max(archivos)]
+
+
+def balance_schema(conn, fecha):
+    """Esquema desde el que balance_sql responde el saldo al cierre de ``fecha``.
+
+    La base activa alcanza desde el día de los saldos de apertura (corte - 1
+    día); una fecha anterior se responde desde el archivo que guarda su año,
+    cuyo cierre de stock base es el saldo al 31/12 del año del archivo anterior.
+    """
+    fecha = str(fecha)
+    cierre = last_close(conn)
+    if cierre is None or fecha >= _day_before(cierre[0]):
+        return 'main'
+    archivos = attached_archives(conn)
+    if not archivos:
+        raise ValueError(f"El {fecha} pertenece a un periodo cerrado y no hay archivos adjuntos")
+    return _archive_for_year(archivos, int(fecha[:4]))
+
+
+def _archives_in_range(conn, limite, desde, hasta):
+    # Archivos con datos dentro de [desde, hasta] anteriores a `limite`, del más
+    # nuevo al más viejo. Cada uno cubre desde el año siguiente al del archivo
+    # anterior hasta el suyo.
+    if limite is None or (desde and str(desde) >= limite):
+        return []
+    archivos = attached_archives(conn)
+    primero = int(str(desde)[:4]) if desde else 0
+    ultimo = int(str(hasta)[:4]) if hasta else 9999
+    anios = sorted(archivos)
+    return [archivos[anio] for anio, previo in reversed(list(zip(anios, [None] + anios[:-1])))
+            if anio >= primero and (previo is None or previo < ultimo)]
+
+
+def kardex_sources(conn, desde=None, hasta=None):
+    """Partes de kardex que cubren las fechas [desde, hasta], de la más nueva a la más vieja.
+
+    Cada parte es (esquema, condiciones, parámetros) sobre el alias k. Si el
+    rango no llega a un periodo cerrado es solo la base activa. Si llega, se
+    agregan los archivos de esos años y se omiten los saldos de apertura,
+    porque los movimientos que resumen ya salen del archivo.
+    """
+    cierre = last_close(conn)
+    archivos = _archives_in_range(conn, cierre and cierre[0], desde, hasta)
+    if not archivos:
+        return [('main', [], [])]
+    corte, id_desde, id_hasta = cierre
+    activa = ('main', ["k.id_movimiento NOT BETWEEN ? AND ?"], [id_desde, id_hasta]) if id_desde is not None else ('main', [], [])
+    return [activa] + [(schema, ["k.fecha_movimiento < ?"], [corte]) for schema in archivos]
+
+
+def expense_sources(conn, desde=None, hasta=None):
+    # Igual que kardex_sources para gastos_reales y un rango de meses AAAA-MM
+    cierre = last_close(conn)
+    mes = cierre[0][:7] if cierre else None
+    return [('main', [], [])] + [(schema, ["mes_anio < ?"], [mes])
+                                 for schema in _archives_in_range(conn, mes, desde, hasta)]
+
+
+def _bounds(anio, previo, limite, sufijo):
+    # [desde, hasta) del archivo de `anio` antes de `limite`; sufijo '-01-01'
+    # para fechas y '-01' para meses. Empieza después del año del archivo
+    # anterior, o desde el principio si es el primero.
+    return (f"{previo + 1}{sufijo}" if previo is not None else '', min(limite, f"{anio + 1}{sufijo}"))
+
+
+def _years_with_rows(conn, corte, cierre):
+    # Años con movimientos, gastos o cierres de stock que el cierre va a sacar de la base activa
+    apertura_previa = cierre[1:] if cierre and cierre[1] is not None else (0, -1)
+    return [int(anio) for anio, in conn.execute("""
+        SELECT substr(fecha_movimiento, 1, 4) FROM kardex
+        WHERE fecha_movimiento < ? AND id_movimiento NOT BETWEEN ? AND ?
+        UNION SELECT substr(mes_anio, 1, 4) FROM gastos_reales WHERE mes_anio < ?
+        UNION SELECT substr(fecha, 1, 4) FROM stock_snapshot_fechas WHERE fecha < ?
+        ORDER BY 1
+    """, (corte, *apertura_previa, corte[:7], corte))]
+
+
+def _plan_archives(conn, corte, cierre):
+    """Archivos que recibe el cierre: lista de (año, año del archivo anterior).
+
+    Se usan los archivos ya adjuntos y se crea uno por cada año posterior con
+    datos. Si los nuevos no entran en los ATTACH libres de la conexión menos
+    ARCHIVE_ATTACH_RESERVE, los años más viejos se juntan en el primero que sí
+    entra, que cubre todo lo anterior a él. Sin ningún ATTACH libre se rechaza
+    antes de escribir.
+    """
+    existentes = sorted(attached_archives(conn))
+    anios = _years_with_rows(conn, corte, cierre)
+    nuevos = [anio for anio in anios if not existentes or anio > existentes[-1]]
+    limite = conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+    libres = limite - sum(1 for _, name, _ in conn.execute("PRAGMA database_list") if name not in ('main', 'temp'))
+    if nuevos and libres < 1:
+        raise ValueError(f"No se pueden adjuntar más archivos: SQLite admite {limite} bases adjuntas por conexión")
+    if len(nuevos) > libres - ARCHIVE_ATTACH_RESERVE:
+        nuevos = nuevos[-max(libres - ARCHIVE_ATTACH_RESERVE, 1):]
+    todos = existentes + nuevos
+    previos = dict(zip(todos, [None] + todos[:-1]))
+    # Cada año con datos va al primer archivo desde ese año en adelante
+    destinos = sorted({min(a for a in todos if a >= anio) for anio in anios})
+    return [(anio, previos[anio]) for anio in destinos], nuevos
+
+
+def _archive_year(conn, schema, anio, previo, corte, cierre):
+    # Copia al archivo del año lo que el cierre va a sacar de la base activa.
+    # INSERT OR IGNORE: repetir un cierre interrumpido no duplica filas.
+    for ddl in _ARCHIVE_TABLES:
+        conn.execute(ddl.format(s=schema))
+    desde, hasta = _bounds(anio, previo, corte, '-01-01')
+    mes_desde, mes_hasta = _bounds(anio, previo, corte[:7], '-01')
+    apertura_previa = cierre[1:] if cierre and cierre[1] is not None else (0, -1)
+    conn.execute(f"""
+        INSERT OR IGNORE INTO {schema}.kardex
+        SELECT id_movimiento, id_producto, tipo_movimiento, cantidad, fecha_movimiento, referencia, costo_unitario
+        FROM main.kardex
+        WHERE fecha_movimiento >= ? AND fecha_movimiento < ? AND id_movimiento NOT BETWEEN ? AND ?
+    """, (desde, hasta, *apertura_previa))
+    conn.execute(f"""
+        INSERT OR IGNORE INTO {schema}.gastos_reales
+        SELECT id_gasto, mes_anio, categoria_gasto, fecha_gasto, monto_gasto, descripcion
+        FROM main.gastos_reales
+        WHERE mes_anio >= ? AND mes_anio < ?
+    """, (mes_desde, mes_hasta))
+    conn.execute(f"""
+        INSERT OR IGNORE INTO {schema}.stock_snapshot_fechas
+        SELECT fecha, creado FROM main.stock_snapshot_fechas WHERE fecha >= ? AND fecha < ?
+    """, (desde, hasta))
+    conn.execute(f"""
+        INSERT OR IGNORE INTO {schema}.stock_snapshot
+        SELECT fecha, id_producto, stock FROM main.stock_snapshot WHERE fecha >= ? AND fecha < ?
+    """, (desde, hasta))
+
+    # Saldo al 31/12 del año del archivo anterior: la base de balance_sql
+    # dentro del archivo. El primero parte de cero. Si un cierre previo ya
+    # archivó parte del año, ya está guardado.
+    if previo is None:
+        return
+    inicio = f"{previo}-12-31"
+    existe = conn.execute(f"SELECT 1 FROM {schema}.stock_snapshot_fechas WHERE fecha = ?", (inicio,)).fetchone()
+    if not existe and (cierre is None or inicio >= _day_before(cierre[0])):
+        conn.execute(f"""
+            INSERT INTO {schema}.stock_snapshot (fecha, id_producto, stock)
+            SELECT :fecha, id_producto, stock FROM ({balance_sql()}) WHERE stock != 0
+        """, balance_params(conn, inicio))
+        conn.execute(f"INSERT INTO {schema}.stock_snapshot_fechas (fecha, creado) VALUES (?, ?)",
+                     (inicio, datetime.now().isoformat(timespec='seconds')))
+
+
+def _missing_rows(conn, destinos, corte, cierre):
+    # Filas a borrar de la base activa que no están en su archivo (p. ej. un
+    # movimiento con fecha atrasada registrado entre la copia y el borrado)
+    apertura_previa = cierre[1:] if cierre and cierre[1] is not None else (0, -1)
+    faltan = 0
+    for anio, previo in destinos:
+        schema = f"{ARCHIVE_PREFIX}{anio}"
+        desde, hasta = _bounds(anio, previo, corte, '-01-01')
+        faltan += conn.execute(f"""
+            SELECT COUNT(*) FROM main.kardex k
+            WHERE k.fecha_movimiento >= ? AND k.fecha_movimiento < ? AND k.id_movimiento NOT BETWEEN ? AND ?
+                AND NOT EXISTS (SELECT 1 FROM {schema}.kardex a WHERE a.id_movimiento = k.id_movimiento)
+        """, (desde, hasta, *apertura_previa)).fetchone()[0]
+        mes_desde, mes_hasta = _bounds(anio, previo, corte[:7], '-01')
+        faltan += conn.execute(f"""
+            SELECT COUNT(*) FROM main.gastos_reales g
+            WHERE g.mes_anio >= ? AND g.mes_anio < ?
+                AND NOT EXISTS (SELECT 1 FROM {schema}.gastos_reales a WHERE a.id_gasto = g.id_gasto)
+        """, (mes_desde, mes_hasta)).fetchone()[0]
+    return faltan
+
+
+def _write_close(conn, corte, cierre):
+    # Transacción sobre la base activa una vez copiados los archivos
+    apertura = _day_before(corte)
+    mes = corte[:7]
+    with inventory_sync_suspended(conn):
+        conn.execute(f"""
+            CREATE TEMP TABLE saldos_apertura AS
+            SELECT id_producto, stock FROM ({balance_sql()}) WHERE stock != 0
+        """, balance_params(conn, apertura))
+        if cierre and cierre[1] is not None:
+            conn.execute("DELETE FROM kardex WHERE id_movimiento BETWEEN ? AND ?", cierre[1:])
+        movimientos = conn.execute("DELETE FROM kardex WHERE fecha_movimiento < ?", (corte,)).rowcount
+        # La apertura entra al costo promedio del producto; valuacion_producto
+        # y capas_fifo no cambian, porque los triggers de kardex están apagados
+        cursor = conn.execute("""
+            INSERT INTO kardex (id_producto, tipo_movimiento, cantidad, fecha_movimiento, referencia, costo_unitario)
+            SELECT s.id_producto, CASE WHEN s.stock > 0 THEN 'ENTRADA' ELSE 'SALIDA' END, ABS(s.stock), ?, ?,
+                   CASE WHEN s.stock > 0 THEN COALESCE(v.costo_promedio, p.precio_unitario, 0) END
+            FROM saldos_apertura s
+            LEFT JOIN valuacion_producto v ON v.id_producto = s.id_producto
+            LEFT JOIN productos p ON p.id_producto = s.id_producto
+            ORDER BY s.id_producto
+        """, (apertura, OPENING_REFERENCE))
+        saldos = cursor.rowcount
+        # Un solo INSERT con AUTOINCREMENT: los ids de apertura son consecutivos
+        ids = (cursor.lastrowid - saldos + 1, cursor.lastrowid) if saldos else (None, None)
+
+        # El cierre de stock del día de apertura queda como base de balance_sql
+        conn.execute("DELETE FROM stock_snapshot WHERE fecha < ?", (apertura,))
+        conn.execute("DELETE FROM stock_snapshot_fechas WHERE fecha < ?", (apertura,))
+        if not conn.execute("SELECT 1 FROM stock_snapshot_fechas WHERE fecha = ?", (apertura,)).fetchone():
+            conn.execute("INSERT INTO stock_snapshot (fecha, id_producto, stock) SELECT ?, id_producto, stock FROM saldos_apertura",
+                         (apertura,))
+            conn.execute("INSERT INTO stock_snapshot_fechas (fecha, creado) VALUES (?, ?)",
+                         (apertura, datetime.now().isoformat(timespec='seconds')))
+        conn.execute("DROP TABLE temp.saldos_apertura")
+
+    # Los triggers de gastos restan del resumen al borrar: se guarda el
+    # resumen de los meses cerrados y se repone tal cual
+    conn.execute("CREATE TEMP TABLE resumen_cerrado AS SELECT * FROM resumen_mensual WHERE mes_anio < ?", (mes,))
+    gastos = conn.execute("DELETE FROM gastos_reales WHERE mes_anio < ?", (mes,)).rowcount
+    conn.execute("DELETE FROM resumen_mensual WHERE mes_anio < ?", (mes,))
+    conn.execute("INSERT INTO resumen_mensual SELECT * FROM temp.resumen_cerrado")
+    conn.execute("DROP TABLE temp.resumen_cerrado")
+
+    conn.execute("INSERT INTO cierres_periodo VALUES (?, ?, ?, ?, ?, ?)",
+                 (corte, datetime.now().isoformat(timespec='seconds'), movimientos, gastos, *ids))
+    return {'movimientos': movimientos, 'gastos': gastos, 'saldos_apertura': saldos}
+
+
+def close_period(manager=None, corte=None, hoy=None, forzar=False):
+    """Cierra el periodo anterior a ``corte`` (fecha YYYY-MM-DD).
+
+    Primero copia a los archivos anuales los movimientos con fecha anterior al
+    corte, los gastos de los meses anteriores al del corte y los cierres de
+    stock, y confirma cada archivo. Después, en una transacción sobre la base
+    activa, comprueba que no falte nada, borra lo archivado y escribe un
+    movimiento de saldo de apertura por producto con fecha corte - 1 día,
+    junto con el cierre de stock de ese día. resumen_mensual conserva los
+    meses cerrados. Si se interrumpe, se puede repetir con el mismo corte.
+
+    Los archivos nuevos se adjuntan solo a la conexión del cierre y pasan al
+    pool cuando el cierre se confirma; si falla, se quitan y se borran.
+
+    Devuelve un dict con los movimientos y gastos archivados, los saldos de
+    apertura escritos y las rutas de los archivos.
+    """
+    manager = manager or get_manager()
+    corte = date.fromisoformat(str(corte))
+    hoy = date.fromisoformat(str(hoy)) if hoy else date.today()
+    if not forzar and corte > hoy - timedelta(days=MIN_RETENTION_DAYS):
+        raise ValueError(f"El corte debe dejar al menos {MIN_RETENTION_DAYS} días en la base activa "
+                         f"(a más tardar {hoy - timedelta(days=MIN_RETENTION_DAYS)})")
+    corte = str(corte)
+
+    with manager.connection() as conn:
+        cierre = last_close(conn)
+        if cierre and corte <= cierre[0]:
+            raise ValueError(f"El periodo anterior a {cierre[0]} ya está cerrado")
+        destinos, nuevos = _plan_archives(conn, corte, cierre)
+
+        creados = []
+        try:
+            for anio in nuevos:
+                path = archive_path(anio, manager.db_name)
+                if not os.path.exists(path):
+                    creados.append(path)
+                conn.execute(f"ATTACH DATABASE ? AS {ARCHIVE_PREFIX}{anio}", (path,))
+                conn.execute(f"PRAGMA {ARCHIVE_PREFIX}{anio}.journal_mode = WAL")
+            for anio, previo in destinos:
+                manager.run_transaction(lambda conn: _archive_year(conn, f"{ARCHIVE_PREFIX}{anio}", anio, previo, corte, cierre))
+
+            def write(conn):
+                if _missing_rows(conn, destinos, corte, cierre):
+                    raise RuntimeError("Se registraron movimientos o gastos del periodo durante el cierre; vuelva a ejecutarlo")
+                return _write_close(conn, corte, cierre)
+
+            resultado = manager.run_transaction(write)
+        except BaseException:
+            adjuntas = {name for _, name, _ in conn.execute("PRAGMA database_list")}
+            for anio in nuevos:
+                if f"{ARCHIVE_PREFIX}{anio}" in adjuntas:
+                    conn.execute(f"DETACH DATABASE {ARCHIVE_PREFIX}{anio}")
+            for path in creados:
+                for sufijo in ('', '-wal', '-shm'):
+                    if os.path.exists(path + sufijo):
+                        os.remove(path + sufijo)
+            raise
+
+    for anio in nuevos:
+        manager.attach(f"{ARCHIVE_PREFIX}{anio}", archive_path(anio, manager.db_name))
+    resultado['archivos'] = [archive_path(anio, manager.db_name) for anio, _ in destinos]
+    return resultado
+
+
+def compact(manager=None):
+    # VACUUM de la base activa: devuelve al disco las páginas que dejó el cierre
+    manager = manager or get_manager()
+    with manager.connection() as conn:
+        conn.execute("VACUUM main")
+
+
+def get_closed_periods(cache):
+    return cache.read_sql("""
+        SELECT corte, creado, movimientos, gastos
+        FROM cierres_periodo
+        ORDER BY corte DESC
+    """, tables=('cierres_periodo',))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cierre de periodo y archivos anuales")
+    parser.add_argument("--db", default=DB_NAME)
+    sub = parser.add_subparsers(dest="comando", required=True)
+    cerrar = sub.add_parser("cerrar", help="Archiva lo anterior al corte y escribe los saldos de apertura")
+    cerrar.add_argument("corte", help="YYYY-MM-DD: primer día que queda en la base activa")
+    cerrar.add_argument("--forzar", action="store_true", help=f"Permite un corte con menos de {MIN_RETENTION_DAYS} días de historia")
+    cerrar.add_argument("--compactar", action="store_true", help="VACUUM de la base activa al terminar")
+    sub.add_parser("estado", help="Cierres registrados y archivos adjuntos")
+    args = parser.parse_args(argv)
+
+    manager = get_manager(args.db)
+    init_db(manager)
+    if args.comando == "cerrar":
+        try:
+            resultado = close_period(manager, args.corte, forzar=args.forzar)
+        except ValueError as e:
+            parser.error(str(e))
+        print(f"{resultado['movimientos']:,} movimientos y {resultado['gastos']:,} gastos archivados; "
+              f"{resultado['saldos_apertura']:,} saldos de apertura.")
+        for path in resultado['archivos']:
+            print(f"  {path}")
+        if args.compactar:
+            compact(manager)
+        print(f"Base activa: {os.path.getsize(manager.db_name) / 2**20:,.1f} MB")
+    else:
+        with manager.connection() as conn:
+            cierres = conn.execute("SELECT corte, creado, movimientos, gastos FROM cierres_periodo ORDER BY corte").fetchall()
+            archivos = attached_archives(conn)
+        for corte, creado, movimientos, gastos in cierres:
+            print(f"Corte {corte} ({creado}): {movimientos:,} movimientos, {gastos:,} gastos")
+        for anio in sorted(archivos):
+            path = archive_path(anio, args.db)
+            print(f"  {path}: {os.path.getsize(path) / 2**20:,.1f} MB")
+        if not cierres:
+            print("No hay periodos cerrados.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+# Cierre de periodo: tamaño de la base activa y tiempos de las lecturas del
+# dashboard antes y después de archivar, y comprobación de que los saldos, el
+# presupuesto, el historial, el Pedido Sugerido y la valuación dan lo mismo.
+# Uso: python -m bench.archive --productos 10000 --movimientos 1000000 --meses 24
+import argparse
+import os
+import sys
+import tempfile
+from datetime import date, timedelta
+
+import pandas as pd
+
+from analytics import inventory_totals, stock_series
+from archive import MIN_RETENTION_DAYS, close_period, compact
+from bench.generate import generate
+from bench.suite import REPETICIONES, _measure, _read_cases
+from budget import get_budget_summary, get_summary_months
+from cache import QueryCache
+from db import ConnectionManager, init_db
+from inventory import stock_as_of
+from kardex import get_kardex_page
+from reorder import get_reorder_suggestions
+from valuation import cogs_by_month, valuation_totals
+
+
+def _results(cache, hoy, corte):
+    # Resultados que el cierre no debe cambiar; las fechas anteriores al corte
+    # salen de los archivos una vez cerrado el periodo
+    return {
+        'inventario_actual': inventory_totals(cache),
+        'stock_antes_del_corte': stock_as_of(cache, corte - timedelta(days=45)),
+        'stock_reciente': stock_as_of(cache, hoy - timedelta(days=15)),
+        'presupuesto': [get_budget_summary(cache, mes) for mes in get_summary_months(cache)],
+        'historial_producto': get_kardex_page(cache, 500, id_producto=1)[0],
+        'historial_corte': get_kardex_page(cache, 100, desde=corte - timedelta(days=3), hasta=corte + timedelta(days=3))[0],
+        'serie_stock': stock_series(cache, 1),
+        'pedido_sugerido': get_reorder_suggestions(cache, hoy=hoy),
+        'valuacion': valuation_totals(cache),
+        'costo_ventas': cogs_by_month(cache),
+    }
+
+
+def _same(a, b):
+    if isinstance(a, (pd.DataFrame, pd.Series)):
+        return a.reset_index(drop=True).equals(b.reset_index(drop=True))
+    if isinstance(a, (list, tuple)):
+        return len(a) == len(b) and all(_same(x, y) for x, y in zip(a, b))
+    return a == b
+
+
+def _size_mb(path):
+    return os.path.getsize(path) / 2 ** 20
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Base activa antes y después del cierre de periodo")
+    parser.add_argument("--productos", type=int, default=10_000)
+    parser.add_argument("--movimientos", type=int, default=1_000_000)
+    parser.add_argument("--meses", type=int, default=24, help="Historia generada; se archiva lo anterior a la retención mínima")
+    parser.add_argument("--gastos", type=int, default=200_000)
+    parser.add_argument("--repeticiones", type=int, default=REPETICIONES)
+    args = parser.parse_args(argv)
+
+    hoy = date.today()
+    corte = hoy - timedelta(days=MIN_RETENTION_DAYS)
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "archivo.db")
+        generate(db_path, args.productos, args.movimientos, args.meses, args.gastos, log=lambda *_: None)
+        manager = ConnectionManager(db_path)
+        init_db(manager)
+        cache = QueryCache(manager)
+
+        def medir():
+            tiempos = {}
+            for nombre, fn in _read_cases(cache, hoy).items():
+                fn()
+                tiempos[nombre] = _measure(fn, args.repeticiones, before=cache.clear)['mediana_ms']
+            return tiempos
+
+        tamano_antes = _size_mb(db_path)
+        antes, resultados_antes = medir(), _results(cache, hoy, corte)
+
+        resultado = close_period(manager, corte, hoy=hoy)
+        compact(manager)
+        cache.clear()
+        despues, resultados_despues = medir(), _results(cache, hoy, corte)
+        archivos = sum(_size_mb(path) for path in resultado['archivos'])
+
+        print(f"Corte {corte}: {resultado['movimientos']:,} movimientos y {resultado['gastos']:,} gastos archivados, "
+              f"{resultado['saldos_apertura']:,} saldos de apertura")
+        print(f"Base activa: {tamano_antes:,.1f} MB -> {_size_mb(db_path):,.1f} MB (archivos: {archivos:,.1f} MB)")
+        print(f"{'caso':30} {'antes':>10} {'después':>10}")
+        for nombre in antes:
+            print(f"{nombre:30} {antes[nombre]:8.2f} ms {despues[nombre]:8.2f} ms")
+        distintos = [nombre for nombre in resultados_antes if not _same(resultados_antes[nombre], resultados_despues[nombre])]
+        manager.close_all()
+
+    for nombre in distintos:
+        print(f"ERROR: {nombre} cambió con el cierre")
+    return 1 if distintos else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+# Prueba de concurrencia del pool de conexiones.
+# N hilos lectores y M hilos escritores trabajan sobre el mismo archivo SQLite.
+# Uso: python -m bench.concurrency --readers 8 --writers 4 --ops 200
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+from db import ConnectionManager, init_db
+
+
+def run(db_path, readers, writers, ops):
+    manager = ConnectionManager(db_path)
+    init_db(manager)
+    with manager.transaction() as conn:
+        conn.execute("INSERT INTO productos (id_producto, nombre_producto) VALUES (1, 'Producto prueba')")
+        conn.execute("INSERT INTO inventario_actual (id_producto, stock_actual) VALUES (1, 0)")
+
+    errors = []
+    start = threading.Barrier(readers + writers)
+
+    def writer(n):
+        start.wait()
+        for i in range(ops):
+            try:
+                with manager.transaction() as conn:
+                    conn.execute("INSERT INTO kardex (id_producto, tipo_movimiento, cantidad, fecha_movimiento, referencia) VALUES (1, 'ENTRADA', 1, date('now'), ?)",
+                                 (f"w{n}-{i}",))
+            except sqlite3.Error as e:
+                errors.append(f"escritor {n}: {e}")
+
+    def reader(n):
+        start.wait()
+        for _ in range(ops):
+            try:
+                with manager.connection() as conn:
+                    conn.execute("SELECT COUNT(*), COALESCE(SUM(cantidad), 0) FROM kardex").fetchone()
+                    conn.execute("SELECT stock_actual FROM inventario_actual WHERE id_producto = 1").fetchone()
+            except sqlite3.Error as e:
+                errors.append(f"lector {n}: {e}")
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+    threads += [threading.Thread(target=reader, args=(n,)) for n in range(readers)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+
+    with manager.connection() as conn:
+        movimientos = conn.execute("SELECT COUNT(*) FROM kardex").fetchone()[0]
+        stock = conn.execute("SELECT stock_actual FROM inventario_actual WHERE id_producto = 1").fetchone()[0]
+    manager.close_all()
+
+    expected = writers * ops
+    if movimientos != expected or stock != expected:
+        errors.append(f"esperados {expected} movimientos, hay {movimientos} (stock {stock})")
+    return elapsed, errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prueba de concurrencia lectores/escritores sobre SQLite")
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--ops", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        elapsed, errors = run(os.path.join(tmp, "concurrency.db"), args.readers, args.writers, args.ops)
+
+    total = (args.readers + args.writers) * args.ops
+    print(f"{total} operaciones en {elapsed:.2f} s ({total / elapsed:,.0f} op/s)")
+    for e in errors:
+        print(f"ERROR: {e}")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
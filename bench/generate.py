@@ -0,0 +1,234 @@
+# Generador de datos sintéticos con el esquema de init_db.
+# Uso: python -m bench.generate datos.db --tamano grande
+#      python -m bench.generate datos.db --productos 50000 --movimientos 5000000 --meses 36 --gastos 1000000
+import argparse
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from budget import rebuild_resumen_mensual
+from db import ConnectionManager, init_db
+from inventory import rebuild_inventory, take_snapshot
+from valuation import rebuild_valuation
+
+# Volúmenes predefinidos; "grande" es el tamaño de producción de referencia
+TAMANOS = {
+    'pequeno': {'productos': 1_000, 'movimientos': 100_000, 'meses': 12, 'gastos': 20_000},
+    'mediano': {'productos': 10_000, 'movimientos': 1_000_000, 'meses': 24, 'gastos': 200_000},
+    'grande': {'productos': 50_000, 'movimientos': 5_000_000, 'meses': 36, 'gastos': 1_000_000},
+}
+
+CATEGORIAS = ['Compras', 'Operaciones', 'Marketing', 'Personal', 'Logística', 'Servicios', 'Mantenimiento', 'Otros']
+UNIDADES = ['unidad', 'caja', 'kg', 'litro', 'paquete']
+PROVEEDORES = [f"Proveedor {i}" for i in range(1, 41)]
+BLOQUE = 200_000  # filas por executemany
+
+
+def _insert_chunked(conn, sql, columns):
+    # executemany por bloques para no materializar millones de tuplas a la vez
+    n = len(columns[0])
+    for start in range(0, n, BLOQUE):
+        conn.executemany(sql, zip(*(c[start:start + BLOQUE].tolist() for c in columns)))
+
+
+def _drop_derived(conn, tablas):
+    # Carga masiva sin índices ni triggers sobre las tablas cargadas. Devuelve
+    # su DDL para recrearlos al final; los derivados se recalculan de una vez
+    marks = ", ".join("?" * len(tablas))
+    objetos = conn.execute(f"SELECT name, type, sql FROM sqlite_master WHERE type IN ('index', 'trigger') "
+                           f"AND sql IS NOT NULL AND tbl_name IN ({marks})", tablas).fetchall()
+    for nombre, tipo, _ in objetos:
+        conn.execute(f"DROP {tipo.upper()} {nombre}")
+    return [sql for _, _, sql in objetos]
+
+
+def _recreate(conn, ddl):
+    for sql in ddl:
+        conn.execute(sql)
+
+
+def _months(hasta, meses):
+    fin = pd.Period(hasta, freq='M')
+    return [str(fin - i) for i in range(meses - 1, -1, -1)]
+
+
+def _productos(rng, n):
+    ids = np.arange(1, n + 1)
+    nombres = np.array([f"Producto {i:06d}" for i in ids], dtype=object)
+    return {
+        'id_producto': ids,
+        'nombre_producto': nombres,
+        'unidad_medida': np.array(UNIDADES, dtype=object)[rng.integers(0, len(UNIDADES), n)],
+        'stock_minimo': rng.integers(0, 50, n),
+        'precio_unitario': np.round(rng.lognormal(3, 1, n), 2),
+        'proveedor': np.array(PROVEEDORES, dtype=object)[rng.integers(0, len(PROVEEDORES), n)],
+        'ubicacion': np.array([f"Pasillo {i % 30 + 1}" for i in ids], dtype=object),
+    }
+
+
+def _kardex(rng, productos, movimientos, dias, hasta):
+    # Popularidad tipo Zipf: pocos productos concentran la mayoría de los movimientos
+    peso = 1 / np.arange(1, productos + 1) ** 0.8
+    ids = rng.choice(np.arange(1, productos + 1), size=movimientos, p=peso / peso.sum())
+    # Estacionalidad anual suave en la fecha de los movimientos
+    offsets = np.arange(dias)
+    dia_peso = 1 + 0.3 * np.sin(2 * np.pi * offsets / 365)
+    dia = rng.choice(offsets, size=movimientos, p=dia_peso / dia_peso.sum())
+    salida = rng.random(movimientos) < 0.6
+    cantidad = rng.integers(1, 20, movimientos)
+
+    # Saldo inicial por producto: lo justo para que el saldo corrido nunca sea
+    # negativo, más un colchón aleatorio
+    delta = np.where(salida, -cantidad, cantidad)
+    orden = np.lexsort((dia, ids))
+    corrido = pd.Series(delta[orden]).groupby(ids[orden]).cumsum()
+    minimo = corrido.groupby(ids[orden]).min().clip(upper=0)
+    inicial = (-minimo + rng.integers(0, 50, len(minimo))).astype(np.int64)
+    inicial = inicial[inicial > 0]
+
+    ids = np.concatenate([inicial.index.to_numpy(), ids])
+    dia = np.concatenate([np.zeros(len(inicial), dtype=dia.dtype), dia])
+    salida = np.concatenate([np.zeros(len(inicial), dtype=bool), salida])
+    cantidad = np.concatenate([inicial.to_numpy(), cantidad])
+    referencia = np.concatenate([np.full(len(inicial), 'Saldo inicial', dtype=object),
+                                 np.array([f"DOC-{i}" for i in range(movimientos)], dtype=object)])
+
+    # Orden cronológico, como se registrarían en la aplicación
+    orden = np.argsort(dia, kind='stable')
+    fechas = pd.to_datetime(hasta) - pd.to_timedelta(dias - 1 - dia[orden], unit='D')
+    return {
+        'id_producto': ids[orden],
+        'tipo_movimiento': np.where(salida[orden], 'SALIDA', 'ENTRADA').astype(object),
+        'cantidad': cantidad[orden],
+        'fecha_movimiento': fechas.strftime('%Y-%m-%d').to_numpy(dtype=object),
+        'referencia': referencia[orden],
+    }
+
+
+def _presupuestos(rng, meses):
+    totales = np.round(rng.uniform(50_000, 150_000, len(meses)), 2)
+    detalle = {'id_presupuesto': [], 'categoria_gasto': [], 'monto_asignado': []}
+    for i, total in enumerate(totales, start=1):
+        reparto = rng.dirichlet(np.ones(len(CATEGORIAS)))
+        detalle['id_presupuesto'] += [i] * len(CATEGORIAS)
+        detalle['categoria_gasto'] += CATEGORIAS
+        detalle['monto_asignado'] += np.round(reparto * total, 2).tolist()
+    return totales, {k: np.array(v, dtype=object) for k, v in detalle.items()}
+
+
+def _gastos(rng, meses, n):
+    mes = np.array(meses, dtype=object)[rng.integers(0, len(meses), n)]
+    dia = rng.integers(1, 29, n)
+    return {
+        'mes_anio': mes,
+        'categoria_gasto': np.array(CATEGORIAS, dtype=object)[rng.integers(0, len(CATEGORIAS), n)],
+        'fecha_gasto': np.array([f"{m}-{d:02d}" for m, d in zip(mes, dia)], dtype=object),
+        'monto_gasto': np.round(rng.lognormal(4, 1, n), 2),
+        'descripcion': np.array([f"Gasto {i}" for i in range(n)], dtype=object),
+    }
+
+
+def generate(db_path, productos, movimientos, meses, gastos, dias=None, hasta=None, seed=0, log=print):
+    """Llena una base nueva con datos sintéticos reproducibles.
+
+    Los movimientos cubren `dias` días (por defecto, los mismos `meses`)
+    hasta `hasta` (por defecto, ayer) y nunca dejan saldo negativo.
+    Devuelve un dict con los tiempos de cada etapa en segundos.
+    """
+    if os.path.exists(db_path):
+        raise FileExistsError(f"{db_path} ya existe")
+    rng = np.random.default_rng(seed)
+    hasta = date.fromisoformat(str(hasta)) if hasta else date.today() - timedelta(days=1)
+    dias = dias or meses * 30
+    lista_meses = _months(hasta, meses)
+    manager = ConnectionManager(db_path)
+    init_db(manager)
+    tiempos = {}
+
+    def etapa(nombre, fn):
+        t0 = time.perf_counter()
+        fn()
+        tiempos[nombre] = round(time.perf_counter() - t0, 3)
+        log(f"  {nombre}: {tiempos[nombre]:.2f} s")
+
+    def cargar_productos():
+        cols = _productos(rng, productos)
+        with manager.transaction() as conn:
+            _insert_chunked(conn, "INSERT INTO productos (id_producto, nombre_producto, unidad_medida, stock_minimo, "
+                                  "precio_unitario, proveedor, ubicacion) VALUES (?, ?, ?, ?, ?, ?, ?)", list(cols.values()))
+
+    def cargar_kardex():
+        cols = _kardex(rng, productos, movimientos, dias, hasta)
+        with manager.transaction() as conn:
+            precios = pd.read_sql_query("SELECT precio_unitario FROM productos ORDER BY id_producto", conn)['precio_unitario'].to_numpy()
+            # Costo de compra de las ENTRADAS: entre el 55 % y el 85 % del precio.
+            # Generador aparte para no alterar los datos de las etapas siguientes.
+            margen = np.random.default_rng([seed, 1]).uniform(0.55, 0.85, len(cols['id_producto']))
+            costo = np.round(precios[cols['id_producto'] - 1] * margen, 2).astype(object)
+            costo[cols['tipo_movimiento'] == 'SALIDA'] = None
+            cols['costo_unitario'] = costo
+            ddl = _drop_derived(conn, ('kardex',))
+            _insert_chunked(conn, "INSERT INTO kardex (id_producto, tipo_movimiento, cantidad, fecha_movimiento, referencia, "
+                                  "costo_unitario) VALUES (?, ?, ?, ?, ?, ?)", list(cols.values()))
+            _recreate(conn, ddl)
+        rebuild_inventory(manager)
+        rebuild_valuation(manager)
+
+    def cargar_presupuestos():
+        totales, detalle = _presupuestos(rng, lista_meses)
+        gasto = _gastos(rng, lista_meses, gastos)
+        with manager.transaction() as conn:
+            ddl = _drop_derived(conn, ('detalle_presupuesto', 'gastos_reales'))
+            conn.executemany("INSERT INTO presupuestos (id_presupuesto, mes_anio, monto_total_presupuesto) VALUES (?, ?, ?)",
+                             zip(range(1, len(lista_meses) + 1), lista_meses, totales.tolist()))
+            _insert_chunked(conn, "INSERT INTO detalle_presupuesto (id_presupuesto, categoria_gasto, monto_asignado) "
+                                  "VALUES (?, ?, ?)", list(detalle.values()))
+            _insert_chunked(conn, "INSERT INTO gastos_reales (mes_anio, categoria_gasto, fecha_gasto, monto_gasto, descripcion) "
+                                  "VALUES (?, ?, ?, ?, ?)", list(gasto.values()))
+            _recreate(conn, ddl)
+            rebuild_resumen_mensual(conn)
+
+    def cierres():
+        # Como en producción, donde el dashboard guarda un cierre por día: aquí
+        # uno por semana del último trimestre y uno por mes antes de eso
+        fechas = {str(p.end_time.date()) for p in pd.period_range(end=hasta, periods=meses, freq='M')}
+        fechas |= {str(hasta - timedelta(weeks=w)) for w in range(13)}
+        for fecha in sorted(f for f in fechas if f <= str(hasta)):
+            take_snapshot(manager, fecha)
+
+    etapa('productos', cargar_productos)
+    etapa('kardex', cargar_kardex)
+    etapa('presupuestos', cargar_presupuestos)
+    etapa('cierres', cierres)
+    with manager.connection() as conn:
+        conn.execute("ANALYZE")
+    manager.close_all()
+    return tiempos
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera una base SQLite con datos sintéticos")
+    parser.add_argument("destino")
+    parser.add_argument("--tamano", choices=sorted(TAMANOS), default='pequeno')
+    parser.add_argument("--productos", type=int)
+    parser.add_argument("--movimientos", type=int)
+    parser.add_argument("--meses", type=int)
+    parser.add_argument("--gastos", type=int)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    volumen = dict(TAMANOS[args.tamano])
+    volumen.update({k: getattr(args, k) for k in volumen if getattr(args, k) is not None})
+    print(f"Generando {args.destino}: " + ", ".join(f"{k}={v:,}" for k, v in volumen.items()))
+    t0 = time.perf_counter()
+    generate(args.destino, seed=args.seed, **volumen)
+    print(f"Listo en {time.perf_counter() - t0:.1f} s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
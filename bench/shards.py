@@ -0,0 +1,120 @@
+# Escritura con varios almacenes: los mismos escritores contra un solo archivo
+# y contra un archivo por almacén, y la lectura consolidada en serie y en paralelo.
+# Uso: python -m bench.shards --almacenes 4 --writers 8 --ops 200 --synchronous FULL
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+from bench.generate import generate
+from db import ConnectionManager, init_db
+from kardex import record_movement
+from reorder import get_reorder_suggestions
+from shards import ShardSet, consolidated_reorder, shard_path
+
+
+def _prepare(manager):
+    init_db(manager)
+    with manager.transaction() as conn:
+        conn.execute("INSERT INTO productos (id_producto, nombre_producto) VALUES (1, 'Producto prueba')")
+
+
+def run_writes(managers, writers, ops):
+    # El escritor n escribe siempre en managers[n % len(managers)], como un
+    # sitio que solo registra movimientos de su propio almacén
+    start = threading.Barrier(writers)
+    errors = []
+
+    def writer(n):
+        manager = managers[n % len(managers)]
+        start.wait()
+        for i in range(ops):
+            try:
+                record_movement(manager, 1, 'ENTRADA', 1, f"w{n}-{i}")
+            except Exception as e:
+                errors.append(f"escritor {n}: {e}")
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+
+    total = 0
+    for manager in managers:
+        with manager.connection() as conn:
+            total += conn.execute("SELECT COUNT(*) FROM kardex").fetchone()[0]
+    if total != writers * ops:
+        errors.append(f"esperados {writers * ops} movimientos, hay {total}")
+    return elapsed, errors
+
+
+def run_reads(tmp, almacenes, productos, movimientos, repeticiones=3):
+    # Pedido Sugerido consolidado: un almacén tras otro vs. todos a la vez
+    hoy = date.today() - timedelta(days=1)
+    db_name = os.path.join(tmp, "lectura.db")
+    nombres = [f"a{i}" for i in range(almacenes)]
+    for i, almacen in enumerate(nombres):
+        generate(shard_path(almacen, db_name), productos, movimientos, meses=12, gastos=1000, hasta=hoy, seed=i, log=lambda *_: None)
+    shards = ShardSet(nombres, db_name)
+    shards.init_db()
+
+    def medir(fn):
+        tiempos = []
+        for _ in range(repeticiones):
+            for almacen in nombres:
+                shards.cache(almacen).clear()
+            t0 = time.perf_counter()
+            fn()
+            tiempos.append(time.perf_counter() - t0)
+        return min(tiempos)
+
+    serie = medir(lambda: [get_reorder_suggestions(shards.cache(a), hoy=hoy) for a in nombres])
+    paralelo = medir(lambda: consolidated_reorder(shards, hoy=hoy))
+    shards.close()
+    return serie, paralelo
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Un archivo vs. un archivo por almacén")
+    parser.add_argument("--almacenes", type=int, default=4)
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--ops", type=int, default=200)
+    parser.add_argument("--synchronous", default="NORMAL", help="PRAGMA synchronous de la prueba de escritura")
+    parser.add_argument("--productos", type=int, default=2_000, help="Productos por almacén en la prueba de lectura")
+    parser.add_argument("--movimientos", type=int, default=200_000, help="Movimientos por almacén en la prueba de lectura")
+    args = parser.parse_args(argv)
+
+    pragmas = {'synchronous': args.synchronous}
+    with tempfile.TemporaryDirectory() as tmp:
+        unico = ConnectionManager(os.path.join(tmp, "unico.db"), pragmas=pragmas)
+        _prepare(unico)
+        por_almacen = [ConnectionManager(shard_path(f"a{i}", os.path.join(tmp, "escritura.db")), pragmas=pragmas)
+                       for i in range(args.almacenes)]
+        for manager in por_almacen:
+            _prepare(manager)
+
+        total = args.writers * args.ops
+        errores = []
+        for nombre, managers in (("un archivo", [unico]), (f"{args.almacenes} archivos", por_almacen)):
+            elapsed, errors = run_writes(managers, args.writers, args.ops)
+            errores += errors
+            print(f"{nombre:12} {total} movimientos en {elapsed:.2f} s ({total / elapsed:,.0f} escrituras/s)")
+        for manager in [unico] + por_almacen:
+            manager.close_all()
+
+        serie, paralelo = run_reads(tmp, args.almacenes, args.productos, args.movimientos)
+        print(f"Pedido Sugerido consolidado: {serie * 1000:.0f} ms en serie, {paralelo * 1000:.0f} ms en paralelo")
+
+    for e in errores:
+        print(f"ERROR: {e}")
+    return 1 if errores else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
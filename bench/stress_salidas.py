@@ -0,0 +1,119 @@
+# Estrés multiproceso de SALIDAS concurrentes sobre los mismos productos.
+# Mide movimientos por segundo y comprueba que el stock nunca queda negativo.
+# Uso: python -m bench.stress_salidas --procesos 8 --movimientos 500 --productos 4
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+from db import ConnectionManager, init_db
+from kardex import StockInsuficienteError, record_movement
+
+
+def worker(db_path, n_movements, n_products, seed, start_event, results):
+    manager = ConnectionManager(db_path)
+    rng = random.Random(seed)
+    ok = rejected = errors = 0
+    start_event.wait()
+    for _ in range(n_movements):
+        id_producto = rng.randint(1, n_products)
+        # Mayoría de salidas para forzar la contención sobre el stock
+        tipo = 'ENTRADA' if rng.random() < 0.3 else 'SALIDA'
+        try:
+            record_movement(manager, id_producto, tipo, rng.randint(1, 5), f"stress-{seed}")
+            ok += 1
+        except StockInsuficienteError:
+            rejected += 1
+        except Exception:
+            errors += 1
+    manager.close_all()
+    results.put((ok, rejected, errors))
+
+
+def run(db_path, processes, movements, products, initial_stock):
+    manager = ConnectionManager(db_path)
+    init_db(manager)
+    with manager.transaction() as conn:
+        conn.executemany("INSERT INTO productos (id_producto, nombre_producto) VALUES (?, ?)",
+                         [(i, f"Producto {i}") for i in range(1, products + 1)])
+        conn.executemany("INSERT INTO inventario_actual (id_producto, stock_actual) VALUES (?, ?)",
+                         [(i, initial_stock) for i in range(1, products + 1)])
+
+    # Un hilo vigila el stock mínimo observado mientras corren los procesos
+    min_seen = [initial_stock]
+    stop = threading.Event()
+
+    def monitor():
+        while not stop.is_set():
+            with manager.connection() as conn:
+                value = conn.execute("SELECT MIN(stock_actual) FROM inventario_actual").fetchone()[0]
+            min_seen[0] = min(min_seen[0], value)
+            time.sleep(0.001)
+
+    start_event = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    procs = [multiprocessing.Process(target=worker, args=(db_path, movements, products, seed, start_event, results))
+             for seed in range(processes)]
+    for p in procs:
+        p.start()
+    watcher = threading.Thread(target=monitor)
+    watcher.start()
+
+    t0 = time.perf_counter()
+    start_event.set()
+    totals = [results.get() for _ in procs]
+    elapsed = time.perf_counter() - t0
+    for p in procs:
+        p.join()
+    stop.set()
+    watcher.join()
+
+    ok, rejected, errors = (sum(col) for col in zip(*totals))
+    with manager.connection() as conn:
+        final_min = conn.execute("SELECT MIN(stock_actual) FROM inventario_actual").fetchone()[0]
+        # El stock final debe coincidir con el inicial más el neto del kardex
+        mismatched = conn.execute("""
+            SELECT COUNT(*) FROM inventario_actual ia
+            WHERE ia.stock_actual != ? + (
+                SELECT COALESCE(SUM(CASE k.tipo_movimiento WHEN 'ENTRADA' THEN k.cantidad ELSE -k.cantidad END), 0)
+                FROM kardex k WHERE k.id_producto = ia.id_producto)
+        """, (initial_stock,)).fetchone()[0]
+    manager.close_all()
+
+    return {
+        'elapsed': elapsed,
+        'ok': ok,
+        'rejected': rejected,
+        'errors': errors,
+        'min_stock': min(min_seen[0], final_min),
+        'mismatched': mismatched,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Estrés de SALIDAS concurrentes en varios procesos")
+    parser.add_argument("--procesos", type=int, default=8)
+    parser.add_argument("--movimientos", type=int, default=500, help="movimientos por proceso")
+    parser.add_argument("--productos", type=int, default=4)
+    parser.add_argument("--stock-inicial", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        r = run(os.path.join(tmp, "stress.db"), args.procesos, args.movimientos, args.productos, args.stock_inicial)
+
+    total = r['ok'] + r['rejected']
+    print(f"{total} intentos en {r['elapsed']:.2f} s ({total / r['elapsed']:,.0f} mov/s); "
+          f"{r['ok']} registrados, {r['rejected']} rechazados por stock, {r['errors']} errores")
+    print(f"Stock mínimo observado: {r['min_stock']}; productos descuadrados: {r['mismatched']}")
+    failed = r['errors'] or r['min_stock'] < 0 or r['mismatched']
+    if failed:
+        print("ERROR: invariantes de stock violadas")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
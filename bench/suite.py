@@ -0,0 +1,191 @@
+# Suite de rendimiento: mide la ruta de datos de cada página y cada escritura
+# del dashboard sobre bases sintéticas de distintos tamaños y guarda el
+# resultado en JSON para comparar corridas.
+# Uso: python -m bench.suite --tamanos pequeno,mediano --salida resultados.json
+#      python -m bench.suite --tamanos pequeno --comparar resultados.json
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+from analytics import inventory_totals, stock_ranking, stock_rollup, stock_series
+from bench.generate import TAMANOS, generate
+from budget import get_budget_summary, get_summary_months, record_expense
+from cache import QueryCache
+from db import ConnectionManager, init_db
+from inventory import stock_as_of
+from kardex import get_kardex_page, record_movement
+from products import search_products
+from profiler import QueryProfiler
+from reorder import get_reorder_suggestions
+from valuation import cogs_by_month, valuation_totals
+
+REPETICIONES = 5
+TOLERANCIA = 0.5   # una mediana 50 % más lenta que la base se reporta como regresión
+MINIMO_MS = 1.0    # ...siempre que la diferencia supere este piso (ruido en casos de microsegundos)
+
+def _read_cases(cache, hoy):
+    # Cada caso es una función sin argumentos; el caché se vacía antes de cada
+    # repetición para medir la consulta y no el acierto en memoria
+    mes = hoy.strftime('%Y-%m')
+
+    def historial_paginas(n):
+        def run():
+            cursor = None
+            for _ in range(n):
+                _, cursor = get_kardex_page(cache, after=cursor)
+        return run
+
+    return {
+        'kardex_historial': historial_paginas(1),
+        'kardex_historial_20_paginas': historial_paginas(20),
+        'kardex_historial_producto': lambda: get_kardex_page(cache, id_producto=1),
+        'kardex_historial_rango': lambda: get_kardex_page(cache, tipo_movimiento='SALIDA',
+                                                          desde=str(hoy - timedelta(days=90)), hasta=str(hoy - timedelta(days=60))),
+        'buscar_producto_prefijo': lambda: search_products(cache, 'p'),
+        'buscar_producto': lambda: search_products(cache, 'producto 0001'),
+        'analisis_top_valor': lambda: (inventory_totals(cache), stock_ranking(cache, 'valor'), stock_ranking(cache, 'valor', ascending=True)),
+        'analisis_por_proveedor': lambda: stock_rollup(cache, 'proveedor'),
+        'serie_stock_producto': lambda: stock_series(cache, 1),
+        'stock_a_fecha': lambda: stock_as_of(cache, hoy - timedelta(days=15)),
+        'pedido_sugerido': lambda: get_reorder_suggestions(cache, hoy=hoy),
+        'resumen_presupuesto': lambda: (get_summary_months(cache), get_budget_summary(cache, mes)),
+        'valuacion_costo_ventas': lambda: (valuation_totals(cache), cogs_by_month(cache)),
+    }
+
+
+def _write_cases(manager, hoy):
+    contador = iter(range(10 ** 9))
+    mes = hoy.strftime('%Y-%m')
+
+    def alta_producto():
+        # Mismas sentencias que add_product en app.py
+        def write(conn):
+            cursor = conn.execute("INSERT INTO productos (nombre_producto, unidad_medida, stock_minimo, precio_unitario, proveedor, ubicacion) "
+                                  "VALUES (?, ?, ?, ?, ?, ?)", (f"Bench {time.time_ns()}-{next(contador)}", 'unidad', 5, 1.0, None, None))
+            conn.execute("INSERT INTO inventario_actual (id_producto, stock_actual) VALUES (?, 0)", (cursor.lastrowid,))
+        manager.run_transaction(write)
+
+    return {
+        'alta_producto': alta_producto,
+        'movimiento_entrada': lambda: record_movement(manager, 1, 'ENTRADA', 1, 'bench', str(hoy)),
+        'movimiento_salida': lambda: record_movement(manager, 1, 'SALIDA', 1, 'bench', str(hoy)),
+        'gasto': lambda: record_expense(manager, mes, 'Compras', str(hoy), 1.0, 'bench'),
+    }
+
+
+def _measure(fn, repeticiones, before=None):
+    tiempos = []
+    for _ in range(repeticiones):
+        if before:
+            before()
+        t0 = time.perf_counter()
+        fn()
+        tiempos.append((time.perf_counter() - t0) * 1000)
+    tiempos.sort()
+    return {
+        'min_ms': round(tiempos[0], 3),
+        'mediana_ms': round(statistics.median(tiempos), 3),
+        'p95_ms': round(tiempos[min(len(tiempos) - 1, int(len(tiempos) * 0.95))], 3),
+    }
+
+
+def run_size(db_path, repeticiones, hoy, profiler=None, log=print):
+    manager = ConnectionManager(db_path, profiler=profiler)
+    # Las bases de corridas anteriores se migran al esquema actual
+    init_db(manager)
+    cache = QueryCache(manager)
+    resultados = {}
+    try:
+        for nombre, fn in _read_cases(cache, hoy).items():
+            fn()  # calentamiento: páginas del archivo en caché del sistema
+            resultados[nombre] = _measure(fn, repeticiones, before=cache.clear)
+            log(f"  {nombre:30} {resultados[nombre]['mediana_ms']:10.2f} ms")
+        for nombre, fn in _write_cases(manager, hoy).items():
+            resultados[nombre] = _measure(fn, repeticiones * 4)
+            log(f"  {nombre:30} {resultados[nombre]['mediana_ms']:10.2f} ms")
+    finally:
+        manager.close_all()
+    return resultados
+
+
+def compare(actual, base, tolerancia=TOLERANCIA, minimo_ms=MINIMO_MS):
+    # Lista de (tamaño, caso, mediana base, mediana actual) más lentos que la tolerancia
+    regresiones = []
+    for tamano, datos in actual['tamanos'].items():
+        previos = base.get('tamanos', {}).get(tamano, {}).get('resultados', {})
+        for caso, medida in datos['resultados'].items():
+            previo = previos.get(caso)
+            if not previo:
+                continue
+            antes, ahora = previo['mediana_ms'], medida['mediana_ms']
+            if ahora > antes * (1 + tolerancia) and ahora - antes > minimo_ms:
+                regresiones.append((tamano, caso, previo['mediana_ms'], medida['mediana_ms']))
+    return regresiones
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mide las páginas y escrituras del dashboard a varios tamaños")
+    parser.add_argument("--tamanos", default="pequeno", help=f"Lista separada por comas de {', '.join(TAMANOS)}")
+    parser.add_argument("--dir", default="bench_data", help="Carpeta de las bases generadas (se reutilizan entre corridas)")
+    parser.add_argument("--repeticiones", type=int, default=REPETICIONES)
+    parser.add_argument("--salida", help="Archivo JSON donde guardar los resultados")
+    parser.add_argument("--comparar", help="JSON de una corrida anterior para detectar regresiones")
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCIA)
+    parser.add_argument("--minimo-ms", type=float, default=MINIMO_MS)
+    parser.add_argument("--perfil", help="JSON con las estadísticas por sentencia y las consultas lentas (con su plan)")
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.dir, exist_ok=True)
+    hoy = date.today() - timedelta(days=1)
+    resultado = {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'plataforma': platform.platform(),
+        'repeticiones': args.repeticiones,
+        'tamanos': {},
+    }
+    # El perfilador agrega su propio costo; sus tiempos no son comparables con una corrida sin él
+    profiler = QueryProfiler() if args.perfil else None
+    for tamano in args.tamanos.split(','):
+        volumen = TAMANOS[tamano]
+        db_path = os.path.join(args.dir, f"{tamano}.db")
+        print(f"[{tamano}] " + ", ".join(f"{k}={v:,}" for k, v in volumen.items()))
+        generacion = None
+        if not os.path.exists(db_path):
+            generacion = generate(db_path, hasta=hoy, **volumen)
+        resultado['tamanos'][tamano] = {
+            'volumen': volumen,
+            'generacion_s': generacion,
+            'resultados': run_size(db_path, args.repeticiones, hoy, profiler),
+        }
+        if profiler is not None:
+            with open(f"{os.path.splitext(args.perfil)[0]}_{tamano}.json", 'w', encoding='utf-8') as f:
+                f.write(profiler.export())
+            profiler.reset()
+
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            json.dump(resultado, f, indent=2, ensure_ascii=False)
+        print(f"Resultados guardados en {args.salida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            base = json.load(f)
+        regresiones = compare(resultado, base, args.tolerancia, args.minimo_ms)
+        for tamano, caso, antes, ahora in regresiones:
+            print(f"REGRESIÓN [{tamano}] {caso}: {antes:.2f} ms -> {ahora:.2f} ms")
+        if regresiones:
+            return 1
+        print("Sin regresiones.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+# Valuación al costo: reconstrucción vectorizada desde kardex, lectura de los
+# reportes desde el estado mantenido frente a recorrer toda la historia, y costo
+# de los triggers de valuación en cada movimiento. Al final comprueba que el
+# estado que dejaron los triggers es el mismo que da la reconstrucción.
+# Uso: python -m bench.valuation --productos 10000 --movimientos 1000000 --escrituras 2000
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from bench.generate import generate
+from bench.suite import REPETICIONES, _measure
+from cache import QueryCache
+from db import ConnectionManager, init_db
+from kardex import StockInsuficienteError, insert_movement
+from valuation import _load_movements, cogs_by_month, rebuild_product_valuation, rebuild_valuation, \
+    valuation_totals, value_movements
+
+_TABLAS = {
+    'valuacion_producto': 'id_producto',
+    'capas_fifo': 'id_movimiento',
+    'costo_ventas_mensual': 'mes_anio, id_producto',
+}
+_TRIGGERS = ('trg_kardex_insert_valuacion_entrada', 'trg_kardex_insert_valuacion_salida')
+
+
+def _escrituras(manager, n, productos, seed=0):
+    # n movimientos de a uno por transacción, como los registra la aplicación
+    rng = random.Random(seed)
+    t0 = time.perf_counter()
+    for i in range(n):
+        tipo = 'ENTRADA' if rng.random() < 0.45 else 'SALIDA'
+        costo = round(rng.uniform(1, 100), 2) if tipo == 'ENTRADA' else None
+        try:
+            manager.run_transaction(lambda conn: insert_movement(conn, rng.randint(1, productos), tipo, rng.randint(1, 20),
+                                                                 f"bench-{i}", costo_unitario=costo))
+        except StockInsuficienteError:
+            pass
+    return (time.perf_counter() - t0) * 1000 / n
+
+
+def _estado(conn):
+    return {tabla: pd.read_sql_query(f"SELECT * FROM {tabla} ORDER BY {orden}", conn) for tabla, orden in _TABLAS.items()}
+
+
+def _iguales(a, b):
+    if a.shape != b.shape:
+        return False
+    for columna in a.columns:
+        if a[columna].dtype.kind == 'f':
+            if not np.allclose(a[columna], b[columna], rtol=1e-9, atol=1e-6):
+                return False
+        elif not (a[columna].to_numpy() == b[columna].to_numpy()).all():
+            return False
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Valuación mantenida por triggers vs. recorrer la historia")
+    parser.add_argument("--productos", type=int, default=10_000)
+    parser.add_argument("--movimientos", type=int, default=1_000_000)
+    parser.add_argument("--meses", type=int, default=24)
+    parser.add_argument("--escrituras", type=int, default=2_000)
+    parser.add_argument("--repeticiones", type=int, default=REPETICIONES)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "valuacion.db")
+        generate(db_path, args.productos, args.movimientos, args.meses, 10_000, log=lambda *_: None)
+        manager = ConnectionManager(db_path)
+        init_db(manager)
+        cache = QueryCache(manager)
+
+        reconstruccion = _measure(lambda: rebuild_valuation(manager), args.repeticiones)['mediana_ms']
+        mantenido = _measure(lambda: (valuation_totals(cache), cogs_by_month(cache)), args.repeticiones,
+                             before=cache.clear)['mediana_ms']
+        with manager.connection() as conn:
+            historia = _measure(lambda: value_movements(_load_movements(conn)), args.repeticiones)['mediana_ms']
+
+        # Costo por movimiento con los triggers de valuación; lo que dejan debe
+        # coincidir con la reconstrucción
+        con_triggers = _escrituras(manager, args.escrituras, args.productos)
+        with manager.transaction() as conn:
+            antes = _estado(conn)
+            rebuild_product_valuation(conn)
+            despues = _estado(conn)
+        distintos = [tabla for tabla in _TABLAS if not _iguales(antes[tabla], despues[tabla])]
+
+        # ...y sin ellos (la valuación queda desactualizada; la base se descarta)
+        with manager.transaction() as conn:
+            for nombre in _TRIGGERS:
+                conn.execute(f"DROP TRIGGER {nombre}")
+        sin_triggers = _escrituras(manager, args.escrituras, args.productos, seed=1)
+        manager.close_all()
+
+    print(f"{args.movimientos:,} movimientos, {args.productos:,} productos")
+    print(f"{'reconstrucción vectorizada':40} {reconstruccion:10.1f} ms")
+    print(f"{'reportes desde el estado mantenido':40} {mantenido:10.1f} ms")
+    print(f"{'reportes recorriendo toda la historia':40} {historia:10.1f} ms")
+    print(f"{'movimiento con triggers de valuación':40} {con_triggers:10.3f} ms")
+    print(f"{'movimiento sin triggers de valuación':40} {sin_triggers:10.3f} ms")
+    for tabla in distintos:
+        print(f"ERROR: {tabla} difiere entre los triggers y la reconstrucción")
+    return 1 if distintos else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
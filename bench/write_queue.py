@@ -0,0 +1,109 @@
+# Compara escrituras directas (un commit por movimiento) con la cola de
+# escritura agrupada. Cada hilo simula un escáner que registra movimientos;
+# una parte son SALIDAS sin stock que deben rechazarse una por una.
+# Uso: python -m bench.write_queue --clients 16 --ops 200 [--synchronous FULL]
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from db import ConnectionManager, init_db
+from kardex import StockInsuficienteError, record_movement
+from writer import WriteQueue
+
+PRODUCTOS = 10
+
+
+def _movement(n, i):
+    # Cada décimo movimiento es una SALIDA mayor que todo lo que entra
+    producto = 1 + (n + i) % PRODUCTOS
+    if i % 10 == 9:
+        return producto, 'SALIDA', 10 ** 9
+    return producto, 'ENTRADA', 1
+
+
+def run(db_path, clients, ops, modo, synchronous):
+    manager = ConnectionManager(db_path, pragmas={'synchronous': synchronous})
+    init_db(manager)
+    with manager.transaction() as conn:
+        conn.executemany("INSERT INTO productos (id_producto, nombre_producto) VALUES (?, ?)",
+                         [(p, f"Producto {p}") for p in range(1, PRODUCTOS + 1)])
+        conn.executemany("INSERT INTO inventario_actual (id_producto, stock_actual) VALUES (?, 0)",
+                         [(p,) for p in range(1, PRODUCTOS + 1)])
+
+    write_queue = WriteQueue(manager) if modo == 'cola' else None
+    counts = {'ok': 0, 'rechazados': 0}
+    errors = []
+    lock = threading.Lock()
+    start = threading.Barrier(clients)
+
+    def client(n):
+        start.wait()
+        for i in range(ops):
+            producto, tipo, cantidad = _movement(n, i)
+            try:
+                if write_queue is not None:
+                    write_queue.submit_movement(producto, tipo, cantidad, f"c{n}-{i}").result()
+                else:
+                    record_movement(manager, producto, tipo, cantidad, f"c{n}-{i}")
+                key = 'ok'
+            except StockInsuficienteError:
+                key = 'rechazados'
+            except Exception as e:
+                errors.append(f"cliente {n}: {e}")
+                continue
+            with lock:
+                counts[key] += 1
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+
+    stats = None
+    if write_queue is not None:
+        write_queue.close()
+        stats = write_queue.stats()
+    with manager.connection() as conn:
+        movimientos = conn.execute("SELECT COUNT(*) FROM kardex").fetchone()[0]
+        stock = conn.execute("SELECT SUM(stock_actual) FROM inventario_actual").fetchone()[0]
+    manager.close_all()
+
+    salidas = sum(1 for n in range(clients) for i in range(ops) if _movement(n, i)[1] == 'SALIDA')
+    if counts['rechazados'] != salidas:
+        errors.append(f"esperadas {salidas} salidas rechazadas, hubo {counts['rechazados']}")
+    if movimientos != counts['ok'] or stock != counts['ok']:
+        errors.append(f"{counts['ok']} movimientos aceptados, kardex tiene {movimientos} y el stock suma {stock}")
+    return elapsed, counts, stats, errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Escrituras directas vs. cola de escritura con commit agrupado")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--ops", type=int, default=200)
+    parser.add_argument("--synchronous", default="NORMAL", help="PRAGMA synchronous (FULL para forzar fsync por commit)")
+    args = parser.parse_args(argv)
+
+    failed = False
+    for modo in ('directo', 'cola'):
+        with tempfile.TemporaryDirectory() as tmp:
+            elapsed, counts, stats, errors = run(os.path.join(tmp, "write_queue.db"), args.clients,
+                                                 args.ops, modo, args.synchronous)
+        total = args.clients * args.ops
+        print(f"{modo:8} {total} escrituras en {elapsed:.2f} s ({total / elapsed:,.0f} op/s); "
+              f"{counts['ok']} aceptadas, {counts['rechazados']} rechazadas")
+        if stats:
+            print(f"         {stats['lotes']} lotes, promedio {stats['lote_promedio']:.1f}, máximo {stats['lote_maximo']}")
+        for e in errors:
+            print(f"ERROR: {e}")
+        failed = failed or bool(errors)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
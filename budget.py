@@ -0,0 +1,202 @@
+# Presupuestos, gastos y resumen mensual de presupuesto vs. gasto.
+# Uso: python -m budget reconstruir [--db dashboard_control.db]
+import argparse
+import sqlite3
+import sys
+
+import pandas as pd
+
+from db import DB_NAME, get_manager, init_db
+
+
+def _closed_month(conn):
+    # Primer mes abierto tras el último cierre de periodo ('' si no hay). La
+    # migración 004 reconstruye el resumen antes de que exista cierres_periodo.
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'cierres_periodo'").fetchone():
+        return ''
+    return conn.execute("SELECT COALESCE(substr(MAX(corte), 1, 7), '') FROM cierres_periodo").fetchone()[0]
+
+
+def rebuild_resumen_mensual(conn):
+    # Recalcula resumen_mensual desde detalle_presupuesto y gastos_reales. Los
+    # meses de un periodo cerrado se conservan: sus gastos están en los archivos.
+    mes = _closed_month(conn)
+    conn.execute("DELETE FROM resumen_mensual WHERE mes_anio >= ?", (mes,))
+    conn.execute("""
+        INSERT INTO resumen_mensual (mes_anio, categoria_gasto, monto_asignado, asignaciones, gasto_real, movimientos)
+        SELECT mes_anio, categoria_gasto, SUM(monto_asignado), SUM(asignaciones), SUM(gasto_real), SUM(movimientos)
+        FROM (
+            SELECT p.mes_anio, dp.categoria_gasto, dp.monto_asignado, 1 AS asignaciones, 0 AS gasto_real, 0 AS movimientos
+            FROM detalle_presupuesto dp
+            JOIN presupuestos p ON p.id_presupuesto = dp.id_presupuesto
+            WHERE p.mes_anio >= :mes
+            UNION ALL
+            SELECT mes_anio, categoria_gasto, 0, 0, monto_gasto, 1
+            FROM gastos_reales
+            WHERE mes_anio >= :mes
+        )
+        GROUP BY mes_anio, categoria_gasto
+    """, {'mes': mes})
+
+
+def rebuild_budget_summary(manager=None):
+    manager = manager or get_manager()
+    manager.run_transaction(rebuild_resumen_mensual)
+
+
+def save_budget(manager, mes_anio, monto_total):
+    # Upsert por mes: conserva id_presupuesto para no dejar huérfano su detalle
+    manager.run_transaction(lambda conn: conn.execute(
+        "INSERT INTO presupuestos (mes_anio, monto_total_presupuesto) VALUES (?, ?) "
+        "ON CONFLICT(mes_anio) DO UPDATE SET monto_total_presupuesto = excluded.monto_total_presupuesto",
+        (mes_anio, monto_total)))
+
+
+SPLIT_COLUMNS = ['id_detalle', 'categoria_gasto', 'monto_asignado']
+
+
+def get_budget_split(cache, mes_anio):
+    # División guardada del presupuesto del mes, una fila por categoría
+    return cache.read_sql("""
+        SELECT dp.id_detalle, dp.categoria_gasto, dp.monto_asignado
+        FROM detalle_presupuesto dp
+        JOIN presupuestos p ON p.id_presupuesto = dp.id_presupuesto
+        WHERE p.mes_anio = ?
+        ORDER BY dp.id_detalle
+    """, (mes_anio,), tables=('detalle_presupuesto', 'presupuestos'))
+
+
+def _clean_split(edited):
+    # Filas del editor con categoría; rechaza montos vacíos o negativos y categorías repetidas
+    df = pd.DataFrame(edited, columns=SPLIT_COLUMNS).copy()
+    df['categoria_gasto'] = df['categoria_gasto'].fillna('').astype(str).str.strip()
+    df = df[df['categoria_gasto'] != '']
+    montos = pd.to_numeric(df['monto_asignado'], errors='coerce')
+    if montos.isna().any() or (montos < 0).any():
+        raise ValueError("Cada categoría necesita un monto asignado mayor o igual a cero")
+    repetidas = df['categoria_gasto'][df['categoria_gasto'].duplicated()].unique()
+    if len(repetidas):
+        raise ValueError(f"Categorías repetidas: {', '.join(repetidas)}")
+    return df.assign(monto_asignado=montos.astype(float))
+
+
+def diff_budget_split(stored, edited):
+    """Cambios para pasar de la división guardada a la editada.
+
+    Las filas se emparejan por id_detalle; las editadas sin id (o con un id
+    que ya no existe) son altas. Devuelve (altas, cambios, bajas) como listas
+    de parámetros: (categoria, monto), (categoria, monto, id) e (id,).
+    """
+    edited = _clean_split(edited)
+    actuales = stored.set_index('id_detalle')[['categoria_gasto', 'monto_asignado']]
+    ids = pd.to_numeric(edited['id_detalle'], errors='coerce')
+    existentes = ids.isin(actuales.index)
+
+    altas = list(edited.loc[~existentes, ['categoria_gasto', 'monto_asignado']].itertuples(index=False, name=None))
+    editadas = edited[existentes].assign(id_detalle=ids[existentes].astype(int))
+    previas = actuales.loc[editadas['id_detalle']]
+    distinto = ((editadas['categoria_gasto'].to_numpy() != previas['categoria_gasto'].to_numpy())
+                | (editadas['monto_asignado'].to_numpy() != previas['monto_asignado'].to_numpy()))
+    cambios = list(editadas.loc[distinto, ['categoria_gasto', 'monto_asignado', 'id_detalle']].itertuples(index=False, name=None))
+    bajas = [(int(i),) for i in actuales.index.difference(editadas['id_detalle'])]
+    return altas, cambios, bajas
+
+
+def apply_budget_split(conn, mes_anio, edited):
+    """Guarda la división editada del mes aplicando solo las diferencias.
+
+    Lee la división guardada dentro de la transacción y ejecuta las bajas,
+    los cambios y las altas con executemany; los triggers de
+    detalle_presupuesto ajustan resumen_mensual fila a fila. Devuelve un dict
+    con la cantidad de altas, cambios y bajas.
+    """
+    row = conn.execute("SELECT id_presupuesto FROM presupuestos WHERE mes_anio = ?", (mes_anio,)).fetchone()
+    if row is None:
+        raise ValueError(f"No hay presupuesto para {mes_anio}")
+    id_presupuesto = row[0]
+    stored = pd.read_sql_query(
+        "SELECT id_detalle, categoria_gasto, monto_asignado FROM detalle_presupuesto WHERE id_presupuesto = ?",
+        conn, params=(id_presupuesto,))
+    altas, cambios, bajas = diff_budget_split(stored, edited)
+    conn.executemany("DELETE FROM detalle_presupuesto WHERE id_detalle = ?", bajas)
+    conn.executemany("UPDATE detalle_presupuesto SET categoria_gasto = ?, monto_asignado = ? WHERE id_detalle = ?", cambios)
+    conn.executemany("INSERT INTO detalle_presupuesto (id_presupuesto, categoria_gasto, monto_asignado) VALUES (?, ?, ?)",
+                     [(id_presupuesto, categoria, monto) for categoria, monto in altas])
+    return {'altas': len(altas), 'cambios': len(cambios), 'bajas': len(bajas)}
+
+
+def save_budget_split(manager, mes_anio, edited):
+    return manager.run_transaction(lambda conn: apply_budget_split(conn, mes_anio, edited))
+
+
+def copy_budget_split(origen, destino):
+    # División de otro mes para cargar en el editor: las categorías que el mes
+    # destino ya tiene conservan su id_detalle (se guardan como cambios y no
+    # como baja y alta); el resto entra como alta y lo que falta, como baja
+    ids = destino.drop_duplicates('categoria_gasto').set_index('categoria_gasto')['id_detalle']
+    copia = origen[['categoria_gasto', 'monto_asignado']].reset_index(drop=True)
+    copia.insert(0, 'id_detalle', copia['categoria_gasto'].map(ids).astype('Int64'))
+    return copia
+
+
+def insert_expense(conn, mes_anio, categoria_gasto, fecha_gasto, monto_gasto, descripcion):
+    # El trigger trg_gastos_insert_resumen actualiza resumen_mensual en el mismo INSERT
+    try:
+        return conn.execute(
+            "INSERT INTO gastos_reales (mes_anio, categoria_gasto, fecha_gasto, monto_gasto, descripcion) VALUES (?, ?, ?, ?, ?)",
+            (mes_anio, categoria_gasto, str(fecha_gasto), monto_gasto, descripcion)).lastrowid
+    except sqlite3.IntegrityError as e:
+        if 'periodo cerrado' not in str(e):
+            raise
+        raise ValueError(f"El mes {mes_anio} pertenece a un periodo cerrado") from None
+
+
+def record_expense(manager, mes_anio, categoria_gasto, fecha_gasto, monto_gasto, descripcion):
+    return manager.run_transaction(
+        lambda conn: insert_expense(conn, mes_anio, categoria_gasto, fecha_gasto, monto_gasto, descripcion))
+
+
+def get_summary_months(cache):
+    return cache.read_sql("""
+        SELECT mes_anio FROM presupuestos
+        UNION
+        SELECT mes_anio FROM resumen_mensual
+        ORDER BY mes_anio DESC
+    """, tables=('presupuestos', 'resumen_mensual'))['mes_anio'].tolist()
+
+
+def get_budget_summary(cache, mes_anio):
+    """Devuelve (monto total presupuestado o None, DataFrame por categoría, gasto total).
+
+    El DataFrame incluye solo las categorías con asignación en el mes; el
+    gasto total suma todas las categorías con gastos registrados.
+    """
+    total = cache.read_sql("SELECT monto_total_presupuesto FROM presupuestos WHERE mes_anio = ?",
+                           (mes_anio,), tables=('presupuestos',))
+    resumen = cache.read_sql("""
+        SELECT categoria_gasto, monto_asignado, gasto_real, asignaciones, movimientos
+        FROM resumen_mensual
+        WHERE mes_anio = ?
+        ORDER BY categoria_gasto
+    """, (mes_anio,), tables=('resumen_mensual',))
+    total_presupuesto = None if total.empty else float(total['monto_total_presupuesto'].iloc[0])
+    por_categoria = resumen[resumen['asignaciones'] > 0].reset_index(drop=True)
+    return total_presupuesto, por_categoria, float(resumen['gasto_real'].sum())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mantenimiento del resumen de presupuesto vs. gasto")
+    parser.add_argument("--db", default=DB_NAME)
+    sub = parser.add_subparsers(dest="comando", required=True)
+    sub.add_parser("reconstruir", help="Recalcula resumen_mensual desde detalle_presupuesto y gastos_reales")
+    args = parser.parse_args(argv)
+
+    manager = get_manager(args.db)
+    init_db(manager)
+    rebuild_budget_summary(manager)
+    print("Resumen mensual reconstruido.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
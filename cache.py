@@ -0,0 +1,183 @@
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+from db import get_manager
+
+# Límite de memoria por defecto para los DataFrames en caché (128 MB)
+MAX_BYTES = 128 * 1024 * 1024
+
+
+class QueryCache:
+    """Caché de lecturas invalidada por generación de escritura de cada tabla.
+
+    Cada consulta declara las tablas que lee; la clave incluye la generación
+    actual de esas tablas, así que una escritura local (``invalidate``) solo
+    descarta las consultas afectadas. Las escrituras de otros procesos se
+    detectan con ``PRAGMA data_version`` sobre una conexión de vigilancia. La
+    caché escucha los commits de ``manager.transaction()``: antes del COMMIT,
+    con el bloqueo de escritura tomado, cualquier cambio de versión es externo;
+    después, ``invalidate`` guarda la versión nueva solo si ninguna otra
+    conexión confirmó entre medio. Lo que no se puede atribuir al commit local
+    vacía la caché.
+    """
+
+    def __init__(self, manager, max_bytes=MAX_BYTES):
+        self.manager = manager
+        self.max_bytes = max_bytes
+        self._generations = {}
+        self._epoch = 0
+        self._entries = OrderedDict()  # clave -> (DataFrame, bytes, tablas)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._watcher = sqlite3.connect(manager.db_name, check_same_thread=False)
+        self._data_version = self._read_data_version()
+        # data_version de la conexión que escribe, tomado antes de su COMMIT
+        self._writer = threading.local()
+        self.hits = 0
+        self.misses = 0
+        manager.add_commit_listener(self)
+
+    def _read_data_version(self):
+        return self._watcher.execute("PRAGMA data_version").fetchone()[0]
+
+    def _poll_external_writes(self):
+        # data_version cambia con cualquier commit de otra conexión. Los commits
+        # locales ya la dejaron al día en invalidate(), así que un cambio vino
+        # de otro proceso y no sabemos qué tablas tocó: se invalida todo.
+        version = self._read_data_version()
+        if version != self._data_version:
+            self._flush()
+            self._data_version = version
+
+    def _flush(self):
+        self._epoch += 1
+        self._entries.clear()
+        self._bytes = 0
+
+    def before_commit(self, conn):
+        # Con el bloqueo de escritura tomado nadie más puede confirmar: lo que
+        # cambió desde la última lectura vino de otra conexión
+        with self._lock:
+            self._poll_external_writes()
+        self._writer.version = _connection_data_version(conn)
+
+    def after_commit(self, conn):
+        # La versión de vigilancia se lee antes de mirar la conexión que
+        # escribió: si la de esta no cambió (su propio commit no la mueve),
+        # ninguna otra conexión confirmó después y la versión leída solo suma
+        # el commit local. Se guarda recién en invalidate(), cuando ya se
+        # descartaron sus tablas; hasta entonces un sondeo vacía la caché.
+        with self._lock:
+            version = self._read_data_version()
+            if _connection_data_version(conn) != self._writer.version:
+                self._flush()
+                version = None
+        self._writer.committed = version
+
+    def invalidate(self, *tables):
+        # Se llama después del commit local con las tablas que escribió. Una
+        # versión vieja (o la de un commit sin invalidate posterior) solo
+        # provoca un vaciado de más en el próximo sondeo, nunca uno de menos.
+        committed, self._writer.committed = getattr(self._writer, 'committed', None), None
+        with self._lock:
+            if committed is not None:
+                self._data_version = committed
+            for table in tables:
+                self._generations[table] = self._generations.get(table, 0) + 1
+            affected = set(tables)
+            for key in [k for k, (_, _, t) in self._entries.items() if affected & t]:
+                self._evict(key)
+
+    def _evict(self, key):
+        _, nbytes, _ = self._entries.pop(key)
+        self._bytes -= nbytes
+
+    def _lookup(self, base_key, tables):
+        with self._lock:
+            self._poll_external_writes()
+            # La clave se arma antes de ejecutar la consulta: si alguien escribe
+            # mientras tanto, el resultado queda con la generación vieja y no
+            # se vuelve a servir.
+            key = (base_key, self._epoch, tuple(self._generations.get(t, 0) for t in tables))
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return key, entry[0].copy()
+            self.misses += 1
+            return key, None
+
+    def _store(self, key, df, tables):
+        nbytes = int(df.memory_usage(deep=True).sum())
+        if nbytes <= self.max_bytes:
+            with self._lock:
+                if key not in self._entries:
+                    self._entries[key] = (df, nbytes, frozenset(tables))
+                    self._bytes += nbytes
+                    while self._bytes > self.max_bytes:
+                        self._evict(next(iter(self._entries)))
+            return df.copy()
+        return df
+
+    def read_sql(self, sql, params=(), tables=()):
+        # Parámetros posicionales (secuencia) o con nombre (dict)
+        key_params = tuple(sorted(params.items())) if isinstance(params, dict) else tuple(params)
+        key, df = self._lookup((sql, key_params), tables)
+        if df is not None:
+            return df
+        with self.manager.connection() as conn:
+            # Igual que pd.read_sql_query, pero separando el tiempo de SQLite
+            # del de construir el DataFrame para el perfilador
+            cursor = conn.cursor()
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+            t0 = time.perf_counter()
+            df = pd.DataFrame.from_records(rows, columns=[c[0] for c in cursor.description], coerce_float=True)
+            if getattr(cursor, 'execution', None) is not None:
+                cursor.execution.add_build(time.perf_counter() - t0)
+        return self._store(key, df, tables)
+
+    def get_or_compute(self, name, params, tables, compute):
+        # Igual que read_sql pero para un DataFrame calculado en Python a partir
+        # de las tablas indicadas; compute() solo corre tras una escritura
+        key, df = self._lookup((name, tuple(params)), tables)
+        if df is not None:
+            return df
+        return self._store(key, compute(), tables)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+def _connection_data_version(conn):
+    # Cursor base de sqlite3 para que la consulta de control no se perfile
+    return sqlite3.Cursor(conn).execute("PRAGMA data_version").fetchone()[0]
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(manager=None):
+    # Una caché por base de datos y proceso, compartida entre sesiones
+    manager = manager or get_manager()
+    with _caches_lock:
+        cache = _caches.get(manager.db_name)
+        if cache is None:
+            cache = _caches[manager.db_name] = QueryCache(manager)
+        return cache
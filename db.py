@@ -0,0 +1,865 @@
+import glob
+import os
+import random
+import sqlite3
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+
+from profiler import ProfiledConnection
+
+# --- Configuración de la Base de Datos ---
+DB_NAME = 'dashboard_control.db'
+
+# Pragmas aplicados a cada conexión nueva del pool
+PRAGMAS = {
+    'journal_mode': 'WAL',          # Lectores y escritor no se bloquean entre sí
+    'synchronous': 'NORMAL',        # Seguro con WAL y evita un fsync por commit
+    'mmap_size': 256 * 1024 * 1024, # Lecturas vía memoria mapeada (256 MB)
+    'cache_size': -64000,           # Negativo = KiB, unos 64 MB de caché de páginas
+    'busy_timeout': 5000,           # Esperar hasta 5 s antes de "database is locked"
+    'temp_store': 'MEMORY',
+}
+
+# Archivos anuales del cierre de periodo: dashboard_control_archivo_2023.db se
+# adjunta (ATTACH) a cada conexión como el esquema archivo_2023
+ARCHIVE_PREFIX = 'archivo_'
+
+# Reintentos de escritura cuando la base sigue bloqueada tras busy_timeout
+WRITE_RETRIES = 5
+WRITE_BACKOFF = 0.05  # segundos, se duplica en cada intento
+
+
+def is_busy_error(error):
+    code = getattr(error, 'sqlite_errorcode', None)
+    if code is not None:
+        return code & 0xff in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+    return 'locked' in str(error) or 'busy' in str(error)
+
+
+class ConnectionManager:
+    """Pool de conexiones SQLite compartido por todas las sesiones del proceso.
+
+    Cada hilo recibe su propia conexión mientras la usa; las llamadas anidadas
+    dentro del mismo hilo reutilizan la misma conexión.
+    """
+
+    def __init__(self, db_name=DB_NAME, pragmas=None, max_idle=8, profiler=None):
+        self.db_name = db_name
+        # QueryProfiler opcional; se puede activar o quitar en caliente
+        self.profiler = profiler
+        self.pragmas = dict(PRAGMAS, **(pragmas or {}))
+        self.max_idle = max_idle
+        self._idle = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # Bases adjuntas a todas las conexiones: {esquema: ruta}
+        self._attached = {}
+        self._attached_version = 0
+        # Objetos avisados en cada commit de transaction() (las cachés de lectura)
+        self._commit_listeners = weakref.WeakSet()
+
+    def _open(self):
+        timeout = self.pragmas.get('busy_timeout', 5000) / 1000
+        conn = sqlite3.connect(self.db_name, timeout=timeout, check_same_thread=False, factory=ProfiledConnection)
+        conn.manager = self
+        for pragma, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {pragma} = {value}")
+        conn.attached_version = 0
+        return conn
+
+    def attach(self, schema, path):
+        # Adjunta `path` como `schema` en todas las conexiones del pool. Las que
+        # ya existen lo hacen la próxima vez que se prestan fuera de una transacción.
+        with self._lock:
+            if self._attached.get(schema) != path:
+                self._attached[schema] = path
+                self._attached_version += 1
+
+    def add_commit_listener(self, listener):
+        # listener.before_commit(conn) corre con el bloqueo de escritura tomado,
+        # justo antes del COMMIT, y listener.after_commit(conn) justo después,
+        # en el mismo hilo y con la misma conexión
+        with self._lock:
+            self._commit_listeners.add(listener)
+
+    def _sync_attached(self, conn):
+        if conn.attached_version == self._attached_version or conn.in_transaction:
+            return
+        with self._lock:
+            attached, version = dict(self._attached), self._attached_version
+        present = {row[1] for row in conn.execute("PRAGMA database_list")}
+        for schema, path in attached.items():
+            if schema not in present:
+                conn.execute(f"ATTACH DATABASE ? AS {schema}", (path,))
+        conn.attached_version = version
+
+    def _acquire(self):
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return self._open()
+
+    def _release(self, conn):
+        # Igual que el conn.close() anterior: lo que no se confirmó se descarta
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    @contextmanager
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            # Llamada anidada en el mismo hilo: reutilizar la conexión prestada
+            self._sync_attached(conn)
+            self._local.depth += 1
+            try:
+                yield conn
+            finally:
+                self._local.depth -= 1
+            return
+
+        conn = self._acquire()
+        self._local.conn = conn
+        self._local.depth = 1
+        try:
+            self._sync_attached(conn)
+            yield conn
+        finally:
+            self._local.conn = None
+            self._local.depth = 0
+            self._release(conn)
+
+    @contextmanager
+    def transaction(self):
+        # BEGIN IMMEDIATE toma el bloqueo de escritura al inicio y evita
+        # interbloqueos al promover una lectura a escritura
+        with self.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                with self._lock:
+                    listeners = list(self._commit_listeners)
+                for listener in listeners:
+                    listener.before_commit(conn)
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+            for listener in listeners:
+                listener.after_commit(conn)
+
+    def run_transaction(self, fn, retries=WRITE_RETRIES, backoff=WRITE_BACKOFF):
+        # Ejecuta fn(conn) dentro de BEGIN IMMEDIATE; si la base sigue ocupada
+        # tras busy_timeout, reintenta con espera exponencial y algo de azar
+        for attempt in range(retries + 1):
+            try:
+                with self.transaction() as conn:
+                    return fn(conn)
+            except sqlite3.OperationalError as e:
+                if attempt == retries or not is_busy_error(e):
+                    raise
+                time.sleep(backoff * (2 ** attempt) * (0.5 + random.random()))
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+
+def get_manager(db_name=DB_NAME):
+    # Un único pool por archivo de base de datos y proceso
+    with _managers_lock:
+        manager = _managers.get(db_name)
+        if manager is None:
+            manager = _managers[db_name] = ConnectionManager(db_name)
+        return manager
+
+
+def archive_path(anio, db_name=DB_NAME):
+    # dashboard_control.db -> dashboard_control_archivo_2023.db
+    stem, ext = os.path.splitext(db_name)
+    return f"{stem}_{ARCHIVE_PREFIX}{anio}{ext or '.db'}"
+
+
+def attach_archives(manager):
+    # Adjunta al pool los archivos anuales que ya existen junto a la base y les
+    # agrega lo que sumaron las migraciones posteriores a su creación
+    from archive import upgrade_archive
+
+    stem, ext = os.path.splitext(manager.db_name)
+    schemas = []
+    for path in sorted(glob.glob(f"{glob.escape(stem)}_{ARCHIVE_PREFIX}[0-9][0-9][0-9][0-9]{ext or '.db'}")):
+        anio = path[len(stem) + len(ARCHIVE_PREFIX) + 1:][:4]
+        schemas.append(f"{ARCHIVE_PREFIX}{anio}")
+        manager.attach(schemas[-1], path)
+    if schemas:
+        with manager.connection() as conn:
+            for schema in schemas:
+                upgrade_archive(conn, schema)
+
+
+# Cuerpos de los triggers de resumen_mensual. NEW suma y OLD resta, así un
+# UPDATE es la combinación de ambos.
+_RESUMEN_GASTO_SQL = {
+    row: f'''
+                    INSERT INTO resumen_mensual (mes_anio, categoria_gasto, gasto_real, movimientos)
+                    VALUES ({row}.mes_anio, {row}.categoria_gasto, {sign}{row}.monto_gasto, {sign}1)
+                    ON CONFLICT(mes_anio, categoria_gasto) DO UPDATE SET
+                        gasto_real = gasto_real + excluded.gasto_real,
+                        movimientos = movimientos + excluded.movimientos;'''
+    for row, sign in (('NEW', ''), ('OLD', '-'))
+}
+_RESUMEN_GASTO_SQL['OLD'] += '''
+                    DELETE FROM resumen_mensual
+                    WHERE mes_anio = OLD.mes_anio AND categoria_gasto = OLD.categoria_gasto
+                        AND asignaciones = 0 AND movimientos = 0;'''
+_RESUMEN_DETALLE_SQL = {
+    row: f'''
+                    INSERT INTO resumen_mensual (mes_anio, categoria_gasto, monto_asignado, asignaciones)
+                    SELECT p.mes_anio, {row}.categoria_gasto, {sign}{row}.monto_asignado, {sign}1
+                    FROM presupuestos p WHERE p.id_presupuesto = {row}.id_presupuesto
+                    ON CONFLICT(mes_anio, categoria_gasto) DO UPDATE SET
+                        monto_asignado = monto_asignado + excluded.monto_asignado,
+                        asignaciones = asignaciones + excluded.asignaciones;'''
+    for row, sign in (('NEW', ''), ('OLD', '-'))
+}
+_RESUMEN_DETALLE_SQL['OLD'] += '''
+                    DELETE FROM resumen_mensual
+                    WHERE mes_anio = (SELECT mes_anio FROM presupuestos WHERE id_presupuesto = OLD.id_presupuesto)
+                        AND categoria_gasto = OLD.categoria_gasto
+                        AND asignaciones = 0 AND movimientos = 0;'''
+
+
+# --- Migraciones del esquema ---
+# Cada paso lleva la base de la versión i a la i+1 (PRAGMA user_version).
+# Usan IF NOT EXISTS para que una base creada antes de las migraciones
+# (user_version 0) pueda recorrerlas todas sin error.
+
+def _migration_001_base_tables(cursor):
+    # Crear tabla productos
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS productos (
+            id_producto INTEGER PRIMARY KEY,
+            nombre_producto TEXT NOT NULL UNIQUE,
+            unidad_medida TEXT,
+            stock_minimo INTEGER DEFAULT 0,
+            precio_unitario REAL DEFAULT 0.0,
+            proveedor TEXT,
+            ubicacion TEXT
+        )
+    ''')
+
+    # Crear tabla kardex
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS kardex (
+            id_movimiento INTEGER PRIMARY KEY AUTOINCREMENT,
+            id_producto INTEGER,
+            tipo_movimiento TEXT NOT NULL, -- 'ENTRADA' o 'SALIDA'
+            cantidad INTEGER NOT NULL,
+            fecha_movimiento DATE NOT NULL,
+            referencia TEXT,
+            FOREIGN KEY (id_producto) REFERENCES productos(id_producto)
+        )
+    ''')
+
+    # Crear tabla inventario_actual (mantenida por los triggers de kardex)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS inventario_actual (
+            id_producto INTEGER PRIMARY KEY,
+            stock_actual INTEGER DEFAULT 0,
+            FOREIGN KEY (id_producto) REFERENCES productos(id_producto)
+        )
+    ''')
+
+    # Crear tabla presupuestos
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS presupuestos (
+            id_presupuesto INTEGER PRIMARY KEY AUTOINCREMENT,
+            mes_anio TEXT NOT NULL UNIQUE, -- Formato YYYY-MM
+            monto_total_presupuesto REAL NOT NULL
+        )
+    ''')
+
+    # Crear tabla detalle_presupuesto (para spliteado)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS detalle_presupuesto (
+            id_detalle INTEGER PRIMARY KEY AUTOINCREMENT,
+            id_presupuesto INTEGER,
+            categoria_gasto TEXT NOT NULL,
+            monto_asignado REAL NOT NULL,
+            FOREIGN KEY (id_presupuesto) REFERENCES presupuestos(id_presupuesto)
+        )
+    ''')
+
+    # Crear tabla gastos_reales
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS gastos_reales (
+            id_gasto INTEGER PRIMARY KEY AUTOINCREMENT,
+            mes_anio TEXT NOT NULL, -- Formato YYYY-MM
+            categoria_gasto TEXT NOT NULL,
+            fecha_gasto DATE NOT NULL,
+            monto_gasto REAL NOT NULL,
+            descripcion TEXT
+        )
+    ''')
+
+
+def _migration_002_history_indexes(cursor):
+    # Índices para el historial paginado (orden por fecha e id, filtro por producto)
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_kardex_fecha
+        ON kardex (fecha_movimiento, id_movimiento)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_kardex_producto_fecha
+        ON kardex (id_producto, fecha_movimiento, id_movimiento)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_gastos_mes_categoria
+        ON gastos_reales (mes_anio, categoria_gasto)
+    ''')
+
+
+def _migration_003_inventory_triggers(cursor):
+    # Cierres diarios de stock: saldo por producto al final de cada fecha.
+    # Solo se guardan saldos distintos de cero; un producto ausente en un
+    # cierre registrado en stock_snapshot_fechas tenía stock 0.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stock_snapshot_fechas (
+            fecha DATE PRIMARY KEY,
+            creado TEXT NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stock_snapshot (
+            fecha DATE NOT NULL,
+            id_producto INTEGER NOT NULL,
+            stock INTEGER NOT NULL,
+            PRIMARY KEY (fecha, id_producto)
+        ) WITHOUT ROWID
+    ''')
+
+    # Interruptor de los triggers de kardex. Solo se apaga dentro de una
+    # transacción de escritura que mantiene inventario_actual por su cuenta
+    # (por ejemplo la importación masiva) y se vuelve a encender antes del commit.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sincronizacion_inventario (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            activa INTEGER NOT NULL DEFAULT 1
+        )
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO sincronizacion_inventario (id, activa) VALUES (1, 1)")
+
+    # Triggers que mantienen inventario_actual a partir de kardex
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_kardex_validar_salida
+        BEFORE INSERT ON kardex
+        WHEN NEW.tipo_movimiento = 'SALIDA' AND (SELECT activa FROM sincronizacion_inventario) = 1
+        BEGIN
+            SELECT RAISE(ABORT, 'stock insuficiente')
+            WHERE COALESCE((SELECT stock_actual FROM inventario_actual WHERE id_producto = NEW.id_producto), 0) < NEW.cantidad;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_kardex_insert
+        AFTER INSERT ON kardex
+        WHEN (SELECT activa FROM sincronizacion_inventario) = 1
+        BEGIN
+            INSERT INTO inventario_actual (id_producto, stock_actual)
+            VALUES (NEW.id_producto, CASE NEW.tipo_movimiento WHEN 'ENTRADA' THEN NEW.cantidad ELSE -NEW.cantidad END)
+            ON CONFLICT(id_producto) DO UPDATE SET stock_actual = stock_actual + excluded.stock_actual;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_kardex_delete
+        AFTER DELETE ON kardex
+        WHEN (SELECT activa FROM sincronizacion_inventario) = 1
+        BEGIN
+            UPDATE inventario_actual
+            SET stock_actual = stock_actual - CASE OLD.tipo_movimiento WHEN 'ENTRADA' THEN OLD.cantidad ELSE -OLD.cantidad END
+            WHERE id_producto = OLD.id_producto;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_kardex_update
+        AFTER UPDATE OF id_producto, tipo_movimiento, cantidad ON kardex
+        WHEN (SELECT activa FROM sincronizacion_inventario) = 1
+        BEGIN
+            UPDATE inventario_actual
+            SET stock_actual = stock_actual - CASE OLD.tipo_movimiento WHEN 'ENTRADA' THEN OLD.cantidad ELSE -OLD.cantidad END
+            WHERE id_producto = OLD.id_producto;
+            INSERT INTO inventario_actual (id_producto, stock_actual)
+            VALUES (NEW.id_producto, CASE NEW.tipo_movimiento WHEN 'ENTRADA' THEN NEW.cantidad ELSE -NEW.cantidad END)
+            ON CONFLICT(id_producto) DO UPDATE SET stock_actual = stock_actual + excluded.stock_actual;
+        END
+    ''')
+
+    # Un movimiento con fecha igual o anterior a un cierre lo deja obsoleto
+    for event, row in (('INSERT', 'NEW'), ('DELETE', 'OLD')):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_kardex_{event.lower()}_cierres
+            AFTER {event} ON kardex
+            WHEN (SELECT activa FROM sincronizacion_inventario) = 1
+                AND {row}.fecha_movimiento <= (SELECT MAX(fecha) FROM stock_snapshot_fechas)
+            BEGIN
+                DELETE FROM stock_snapshot WHERE fecha >= {row}.fecha_movimiento;
+                DELETE FROM stock_snapshot_fechas WHERE fecha >= {row}.fecha_movimiento;
+            END
+        ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_kardex_update_cierres
+        AFTER UPDATE OF id_producto, tipo_movimiento, cantidad, fecha_movimiento ON kardex
+        WHEN (SELECT activa FROM sincronizacion_inventario) = 1
+            AND MIN(OLD.fecha_movimiento, NEW.fecha_movimiento) <= (SELECT MAX(fecha) FROM stock_snapshot_fechas)
+        BEGIN
+            DELETE FROM stock_snapshot WHERE fecha >= MIN(OLD.fecha_movimiento, NEW.fecha_movimiento);
+            DELETE FROM stock_snapshot_fechas WHERE fecha >= MIN(OLD.fecha_movimiento, NEW.fecha_movimiento);
+        END
+    ''')
+
+
+def _migration_004_resumen_mensual(cursor):
+    # Resumen materializado de presupuesto vs. gasto por mes y categoría,
+    # mantenido por triggers sobre detalle_presupuesto y gastos_reales.
+    # 'asignaciones' cuenta las filas de detalle_presupuesto y
+    # 'movimientos' las de gastos_reales.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS resumen_mensual (
+            mes_anio TEXT NOT NULL,
+            categoria_gasto TEXT NOT NULL,
+            monto_asignado REAL NOT NULL DEFAULT 0,
+            asignaciones INTEGER NOT NULL DEFAULT 0,
+            gasto_real REAL NOT NULL DEFAULT 0,
+            movimientos INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (mes_anio, categoria_gasto)
+        ) WITHOUT ROWID
+    ''')
+    for event, rows in (('INSERT', ('NEW',)), ('DELETE', ('OLD',)), ('UPDATE', ('OLD', 'NEW'))):
+        body = ''.join(_RESUMEN_GASTO_SQL[row] for row in rows)
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_gastos_{event.lower()}_resumen
+            AFTER {event} ON gastos_reales
+            BEGIN
+                {body}
+            END
+        ''')
+        body = ''.join(_RESUMEN_DETALLE_SQL[row] for row in rows)
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_detalle_{event.lower()}_resumen
+            AFTER {event} ON detalle_presupuesto
+            BEGIN
+                {body}
+            END
+        ''')
+    # Poblar el resumen con los datos ya registrados
+    cursor.execute("DELETE FROM resumen_mensual")
+    cursor.execute('''
+        INSERT INTO resumen_mensual (mes_anio, categoria_gasto, monto_asignado, asignaciones, gasto_real, movimientos)
+        SELECT mes_anio, categoria_gasto, SUM(monto_asignado), SUM(asignaciones), SUM(gasto_real), SUM(movimientos)
+        FROM (
+            SELECT p.mes_anio, dp.categoria_gasto, dp.monto_asignado, 1 AS asignaciones, 0 AS gasto_real, 0 AS movimientos
+            FROM detalle_presupuesto dp
+            JOIN presupuestos p ON p.id_presupuesto = dp.id_presupuesto
+            UNION ALL
+            SELECT mes_anio, categoria_gasto, 0, 0, monto_gasto, 1
+            FROM gastos_reales
+        )
+        GROUP BY mes_anio, categoria_gasto
+    ''')
+
+
+def _migration_005_reorder_index(cursor):
+    # Índice parcial que cubre el consumo por fecha del Pedido Sugerido
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_kardex_salidas
+        ON kardex (fecha_movimiento, id_producto, cantidad)
+        WHERE tipo_movimiento = 'SALIDA'
+    ''')
+
+
+def _migration_006_product_search(cursor):
+    # Índice FTS5 de contenido externo sobre productos para la búsqueda por
+    # prefijo del selector de productos. Los triggers lo mantienen al día;
+    # prefix='2 3' indexa los prefijos cortos que se escriben al teclear.
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS productos_busqueda USING fts5(
+            nombre_producto, proveedor, ubicacion,
+            content='productos', content_rowid='id_producto',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_productos_insert_busqueda
+        AFTER INSERT ON productos
+        BEGIN
+            INSERT INTO productos_busqueda (rowid, nombre_producto, proveedor, ubicacion)
+            VALUES (NEW.id_producto, NEW.nombre_producto, NEW.proveedor, NEW.ubicacion);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_productos_delete_busqueda
+        AFTER DELETE ON productos
+        BEGIN
+            INSERT INTO productos_busqueda (productos_busqueda, rowid, nombre_producto, proveedor, ubicacion)
+            VALUES ('delete', OLD.id_producto, OLD.nombre_producto, OLD.proveedor, OLD.ubicacion);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_productos_update_busqueda
+        AFTER UPDATE OF id_producto, nombre_producto, proveedor, ubicacion ON productos
+        BEGIN
+            INSERT INTO productos_busqueda (productos_busqueda, rowid, nombre_producto, proveedor, ubicacion)
+            VALUES ('delete', OLD.id_producto, OLD.nombre_producto, OLD.proveedor, OLD.ubicacion);
+            INSERT INTO productos_busqueda (rowid, nombre_producto, proveedor, ubicacion)
+            VALUES (NEW.id_producto, NEW.nombre_producto, NEW.proveedor, NEW.ubicacion);
+        END
+    ''')
+    # Indexar los productos ya registrados
+    cursor.execute("INSERT INTO productos_busqueda (productos_busqueda) VALUES ('rebuild')")
+
+
+def _migration_007_product_balance_index(cursor):
+    # El índice por producto y fecha pasa a cubrir tipo y cantidad: la serie
+    # de stock de un producto (analytics.stock_series) se calcula solo desde
+    # el índice. El historial por producto lo sigue usando para su orden.
+    cursor.execute("DROP INDEX IF EXISTS idx_kardex_producto_fecha")
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_kardex_producto_saldo
+        ON kardex (id_producto, fecha_movimiento, id_movimiento, tipo_movimiento, cantidad)
+    ''')
+
+
+def _migration_008_period_close(cursor):
+    # Cierres de periodo: los movimientos anteriores a `corte` y los gastos de
+    # meses anteriores al de `corte` están en los archivos anuales. Las filas
+    # id_apertura_desde..id_apertura_hasta de kardex son los saldos de apertura
+    # que el cierre escribió con fecha corte - 1 día.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS cierres_periodo (
+            corte DATE PRIMARY KEY,
+            creado TEXT NOT NULL,
+            movimientos INTEGER NOT NULL,
+            gastos INTEGER NOT NULL,
+            id_apertura_desde INTEGER,
+            id_apertura_hasta INTEGER
+        )
+    ''')
+    # Un periodo cerrado no admite movimientos nuevos ni cambios. Como el resto
+    # de los triggers de kardex, se apagan junto con la sincronización (el
+    # cierre escribe los saldos de apertura con ellos apagados).
+    for event, condition in (('INSERT', 'NEW.fecha_movimiento < c.corte'),
+                             ('UPDATE', 'MIN(OLD.fecha_movimiento, NEW.fecha_movimiento) < c.corte'),
+                             ('DELETE', 'OLD.fecha_movimiento < c.corte')):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_kardex_{event.lower()}_periodo_cerrado
+            BEFORE {event} ON kardex
+            WHEN (SELECT activa FROM sincronizacion_inventario) = 1
+            BEGIN
+                SELECT RAISE(ABORT, 'periodo cerrado')
+                FROM (SELECT MAX(corte) AS corte FROM cierres_periodo) c
+                WHERE {condition};
+            END
+        ''')
+    for event, condition in (('INSERT', 'NEW.mes_anio < c.mes'),
+                             ('UPDATE', 'MIN(OLD.mes_anio, NEW.mes_anio) < c.mes')):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_gastos_{event.lower()}_periodo_cerrado
+            BEFORE {event} ON gastos_reales
+            BEGIN
+                SELECT RAISE(ABORT, 'periodo cerrado')
+                FROM (SELECT substr(MAX(corte), 1, 7) AS mes FROM cierres_periodo) c
+                WHERE {condition};
+            END
+        ''')
+
+
+def _migration_009_valuation(cursor):
+    # Valuación al costo. kardex guarda el costo unitario de cada ENTRADA y los
+    # triggers mantienen, en el orden en que se registran los movimientos:
+    #   valuacion_producto: stock, costo promedio ponderado y valor (promedio y FIFO)
+    #   capas_fifo: lo que queda de cada ENTRADA, consumido por las SALIDAS
+    #   costo_ventas_mensual: unidades y costo de las SALIDAS por mes y producto
+    # Un DELETE o UPDATE de kardex no se puede deshacer capa por capa: deja el
+    # producto en valuacion_pendiente hasta que valuation lo recalcula.
+    columnas = {row[1] for row in cursor.execute("PRAGMA table_info(kardex)")}
+    if 'costo_unitario' not in columnas:
+        cursor.execute("ALTER TABLE kardex ADD COLUMN costo_unitario REAL")
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS valuacion_producto (
+            id_producto INTEGER PRIMARY KEY,
+            stock INTEGER NOT NULL DEFAULT 0,
+            costo_promedio REAL NOT NULL DEFAULT 0,
+            valor_promedio REAL NOT NULL DEFAULT 0,
+            valor_fifo REAL NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS capas_fifo (
+            id_movimiento INTEGER PRIMARY KEY, -- la ENTRADA que abrió la capa
+            id_producto INTEGER NOT NULL,
+            restante INTEGER NOT NULL,
+            costo_unitario REAL NOT NULL
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_capas_fifo_producto ON capas_fifo (id_producto, id_movimiento)")
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS costo_ventas_mensual (
+            mes_anio TEXT NOT NULL,
+            id_producto INTEGER NOT NULL,
+            unidades INTEGER NOT NULL DEFAULT 0,
+            costo_promedio REAL NOT NULL DEFAULT 0,
+            costo_fifo REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (mes_anio, id_producto)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute("CREATE TABLE IF NOT EXISTS valuacion_pendiente (id_producto INTEGER PRIMARY KEY)")
+
+    # Sin costo explícito una ENTRADA vale el precio del producto, igual que en valuation
+    costo = "COALESCE(NEW.costo_unitario, (SELECT precio_unitario FROM productos WHERE id_producto = NEW.id_producto), 0)"
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_kardex_insert_valuacion_entrada
+        AFTER INSERT ON kardex
+        WHEN NEW.tipo_movimiento = 'ENTRADA' AND (SELECT activa FROM sincronizacion_inventario) = 1
+        BEGIN
+            INSERT INTO valuacion_producto (id_producto, stock, costo_promedio, valor_promedio, valor_fifo)
+            SELECT NEW.id_producto, NEW.cantidad, c.costo, NEW.cantidad * c.costo, NEW.cantidad * c.costo
+            FROM (SELECT {costo} AS costo) c
+            WHERE true
+            ON CONFLICT(id_producto) DO UPDATE SET
+                stock = stock + excluded.stock,
+                valor_promedio = CASE WHEN stock > 0 THEN valor_promedio ELSE 0 END + excluded.valor_promedio,
+                costo_promedio = COALESCE((CASE WHEN stock > 0 THEN valor_promedio ELSE 0 END + excluded.valor_promedio)
+                                          / NULLIF(stock + excluded.stock, 0), excluded.costo_promedio),
+                valor_fifo = valor_fifo + excluded.valor_fifo;
+            INSERT INTO capas_fifo (id_movimiento, id_producto, restante, costo_unitario)
+            VALUES (NEW.id_movimiento, NEW.id_producto, NEW.cantidad, {costo});
+        END
+    ''')
+    # La SALIDA consume las capas más antiguas: `antes` es lo que queda en las
+    # capas previas a cada una, así que cada capa entrega MIN(restante, cantidad - antes)
+    capas = '''
+                SELECT id_movimiento, restante, costo_unitario,
+                       MAX(0, MIN(restante, NEW.cantidad - (SUM(restante) OVER (ORDER BY id_movimiento) - restante))) AS consumido
+                FROM capas_fifo
+                WHERE id_producto = NEW.id_producto'''
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_kardex_insert_valuacion_salida
+        AFTER INSERT ON kardex
+        WHEN NEW.tipo_movimiento = 'SALIDA' AND (SELECT activa FROM sincronizacion_inventario) = 1
+        BEGIN
+            INSERT INTO costo_ventas_mensual (mes_anio, id_producto, unidades, costo_promedio, costo_fifo)
+            SELECT substr(NEW.fecha_movimiento, 1, 7), NEW.id_producto, NEW.cantidad,
+                   NEW.cantidad * COALESCE((SELECT costo_promedio FROM valuacion_producto WHERE id_producto = NEW.id_producto), 0),
+                   COALESCE((SELECT SUM(consumido * costo_unitario) FROM ({capas})), 0)
+            WHERE true
+            ON CONFLICT(mes_anio, id_producto) DO UPDATE SET
+                unidades = unidades + excluded.unidades,
+                costo_promedio = costo_promedio + excluded.costo_promedio,
+                costo_fifo = costo_fifo + excluded.costo_fifo;
+            UPDATE capas_fifo SET restante = capas_fifo.restante - c.consumido
+            FROM ({capas}) c
+            WHERE capas_fifo.id_movimiento = c.id_movimiento AND c.consumido > 0;
+            DELETE FROM capas_fifo WHERE id_producto = NEW.id_producto AND restante <= 0;
+            UPDATE valuacion_producto SET
+                stock = stock - NEW.cantidad,
+                valor_promedio = CASE WHEN stock > NEW.cantidad THEN valor_promedio - NEW.cantidad * costo_promedio ELSE 0 END,
+                valor_fifo = COALESCE((SELECT SUM(restante * costo_unitario) FROM capas_fifo WHERE id_producto = NEW.id_producto), 0)
+            WHERE id_producto = NEW.id_producto;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_kardex_delete_valuacion
+        AFTER DELETE ON kardex
+        WHEN (SELECT activa FROM sincronizacion_inventario) = 1
+        BEGIN
+            INSERT OR IGNORE INTO valuacion_pendiente (id_producto) VALUES (OLD.id_producto);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_kardex_update_valuacion
+        AFTER UPDATE OF id_producto, tipo_movimiento, cantidad, fecha_movimiento, costo_unitario ON kardex
+        WHEN (SELECT activa FROM sincronizacion_inventario) = 1
+        BEGIN
+            INSERT OR IGNORE INTO valuacion_pendiente (id_producto) VALUES (OLD.id_producto), (NEW.id_producto);
+        END
+    ''')
+
+    # Las ENTRADAS ya registradas no tenían costo: toman el precio actual del
+    # producto. Los triggers de kardex se apagan (los saldos de apertura de un
+    # periodo cerrado no admiten UPDATE).
+    cursor.execute("UPDATE sincronizacion_inventario SET activa = 0")
+    cursor.execute('''
+        UPDATE kardex
+        SET costo_unitario = COALESCE((SELECT precio_unitario FROM productos p WHERE p.id_producto = kardex.id_producto), 0)
+        WHERE tipo_movimiento = 'ENTRADA' AND costo_unitario IS NULL
+    ''')
+    cursor.execute("UPDATE sincronizacion_inventario SET activa = 1")
+
+    # Valuación inicial desde toda la historia, en el orden de id_movimiento.
+    # Con un periodo cerrado la historia anterior al corte está en los archivos
+    # adjuntos y los saldos de apertura de la base activa no se cuentan.
+    cierre = cursor.execute('''
+        SELECT corte, id_apertura_desde, id_apertura_hasta FROM cierres_periodo ORDER BY corte DESC LIMIT 1
+    ''').fetchone()
+    columnas = '''
+        SELECT k.id_producto, k.id_movimiento, k.tipo_movimiento = 'ENTRADA' AS entrada, k.cantidad,
+               COALESCE(k.costo_unitario, p.precio_unitario, 0) AS costo, substr(k.fecha_movimiento, 1, 7) AS mes_anio,
+               CASE k.tipo_movimiento WHEN 'ENTRADA' THEN k.cantidad ELSE -k.cantidad END AS delta
+        FROM {s}.kardex k
+        LEFT JOIN main.productos p ON p.id_producto = k.id_producto'''
+    archivos = [schema for _, schema, _ in cursor.execute("PRAGMA database_list").fetchall()
+                if schema.startswith(ARCHIVE_PREFIX)] if cierre else []
+    partes, params = [columnas.format(s='main')], []
+    if archivos and cierre[1] is not None:
+        partes[0] += " WHERE k.id_movimiento NOT BETWEEN ? AND ?"
+        params += cierre[1:]
+    for schema in archivos:
+        partes.append(columnas.format(s=schema) + " WHERE k.fecha_movimiento < ?")
+        params.append(cierre[0])
+    cursor.execute(f'''
+        CREATE TEMP TABLE valuacion_movimientos AS
+        SELECT id_producto, id_movimiento, entrada, cantidad, costo, mes_anio,
+               ROW_NUMBER() OVER w AS n, SUM(delta) OVER w AS stock
+        FROM ({' UNION ALL '.join(partes)})
+        WINDOW w AS (PARTITION BY id_producto ORDER BY id_movimiento)
+    ''', params)
+    cursor.execute("CREATE UNIQUE INDEX temp.idx_valuacion_movimientos ON valuacion_movimientos (id_producto, n)")
+
+    # Costo promedio ponderado después de cada movimiento: una ENTRADA pondera
+    # el promedio previo por el stock previo (si era positivo); una SALIDA no lo cambia
+    cursor.execute('''
+        CREATE TEMP TABLE valuacion_promedios AS
+        WITH RECURSIVE promedios (id_producto, n, promedio) AS (
+            SELECT id_producto, n, CASE WHEN entrada THEN costo ELSE 0 END
+            FROM valuacion_movimientos
+            WHERE n = 1
+            UNION ALL
+            SELECT m.id_producto, m.n,
+                   CASE WHEN NOT m.entrada THEN a.promedio
+                        WHEN m.stock > 0 THEN (a.promedio * MAX(m.stock - m.cantidad, 0) + m.cantidad * m.costo) / m.stock
+                        ELSE m.costo END
+            FROM promedios a
+            JOIN valuacion_movimientos m ON m.id_producto = a.id_producto AND m.n = a.n + 1
+        )
+        SELECT id_producto, n, promedio FROM promedios
+    ''')
+    cursor.execute("CREATE UNIQUE INDEX temp.idx_valuacion_promedios ON valuacion_promedios (id_producto, n)")
+
+    # FIFO por unidades acumuladas: cada ENTRADA ocupa el tramo (hasta - cantidad, hasta]
+    # de las entradas del producto y las SALIDAS consumen ese eje desde el principio
+    cursor.execute('''
+        CREATE TEMP TABLE valuacion_entradas AS
+        SELECT id_producto, id_movimiento, cantidad, costo,
+               SUM(cantidad) OVER w AS hasta, SUM(cantidad * costo) OVER w AS costo_hasta
+        FROM valuacion_movimientos
+        WHERE entrada
+        WINDOW w AS (PARTITION BY id_producto ORDER BY id_movimiento)
+    ''')
+    cursor.execute("CREATE INDEX temp.idx_valuacion_entradas ON valuacion_entradas (id_producto, hasta)")
+    cursor.execute('''
+        CREATE TEMP TABLE valuacion_salidas AS
+        SELECT s.id_producto, s.mes_anio, s.cantidad, s.cantidad * a.promedio AS costo_promedio,
+               MIN(SUM(s.cantidad) OVER w, COALESCE(t.total, 0)) AS hasta,
+               MIN(SUM(s.cantidad) OVER w - s.cantidad, COALESCE(t.total, 0)) AS desde
+        FROM valuacion_movimientos s
+        JOIN valuacion_promedios a ON a.id_producto = s.id_producto AND a.n = s.n
+        LEFT JOIN (SELECT id_producto, MAX(hasta) AS total FROM valuacion_entradas GROUP BY id_producto) t
+            ON t.id_producto = s.id_producto
+        WHERE NOT s.entrada
+        WINDOW w AS (PARTITION BY s.id_producto ORDER BY s.id_movimiento)
+    ''')
+    # Costo de las primeras x unidades del eje de un producto
+    costo_hasta = '''
+        COALESCE((SELECT e.costo_hasta - (e.hasta - s.{x}) * e.costo FROM valuacion_entradas e
+                  WHERE e.id_producto = s.id_producto AND e.hasta >= s.{x}
+                  ORDER BY e.hasta LIMIT 1), 0)'''
+    cursor.execute(f'''
+        INSERT INTO costo_ventas_mensual (mes_anio, id_producto, unidades, costo_promedio, costo_fifo)
+        SELECT s.mes_anio, s.id_producto, SUM(s.cantidad), SUM(s.costo_promedio),
+               SUM({costo_hasta.format(x='hasta')} - {costo_hasta.format(x='desde')})
+        FROM valuacion_salidas s
+        GROUP BY s.mes_anio, s.id_producto
+    ''')
+    cursor.execute('''
+        INSERT INTO capas_fifo (id_movimiento, id_producto, restante, costo_unitario)
+        SELECT e.id_movimiento, e.id_producto, MIN(e.cantidad, e.hasta - COALESCE(c.consumido, 0)), e.costo
+        FROM valuacion_entradas e
+        LEFT JOIN (SELECT id_producto, MAX(hasta) AS consumido FROM valuacion_salidas GROUP BY id_producto) c
+            ON c.id_producto = e.id_producto
+        WHERE e.hasta > COALESCE(c.consumido, 0)
+    ''')
+    cursor.execute('''
+        INSERT INTO valuacion_producto (id_producto, stock, costo_promedio, valor_promedio, valor_fifo)
+        SELECT m.id_producto, m.stock, a.promedio, CASE WHEN m.stock > 0 THEN m.stock * a.promedio ELSE 0 END,
+               COALESCE((SELECT SUM(c.restante * c.costo_unitario) FROM capas_fifo c WHERE c.id_producto = m.id_producto), 0)
+        FROM valuacion_movimientos m
+        JOIN (SELECT id_producto, MAX(n) AS n FROM valuacion_movimientos GROUP BY id_producto) u
+            ON u.id_producto = m.id_producto AND u.n = m.n
+        JOIN valuacion_promedios a ON a.id_producto = m.id_producto AND a.n = m.n
+    ''')
+    for tabla in ('valuacion_salidas', 'valuacion_entradas', 'valuacion_promedios', 'valuacion_movimientos'):
+        cursor.execute(f"DROP TABLE temp.{tabla}")
+
+
+MIGRATIONS = [
+    _migration_001_base_tables,
+    _migration_002_history_indexes,
+    _migration_003_inventory_triggers,
+    _migration_004_resumen_mensual,
+    _migration_005_reorder_index,
+    _migration_006_product_search,
+    _migration_007_product_balance_index,
+    _migration_008_period_close,
+    _migration_009_valuation,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+# Bases ya migradas en este proceso: init_db no vuelve a tocarlas
+_migrated = set()
+_migrated_lock = threading.Lock()
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def init_db(manager=None):
+    """Aplica las migraciones pendientes según PRAGMA user_version.
+
+    Trabaja una sola vez por archivo y proceso. Con el esquema al día solo
+    lee user_version, sin DDL ni bloqueo de escritura; si faltan pasos, los
+    aplica todos en una transacción BEGIN IMMEDIATE.
+    """
+    manager = manager or get_manager()
+    key = os.path.abspath(manager.db_name)
+    if key in _migrated:
+        return
+    with _migrated_lock:
+        if key in _migrated:
+            return
+        # Los archivos de periodos cerrados se adjuntan antes de migrar: las
+        # migraciones que recalculan desde kardex leen también su historia
+        attach_archives(manager)
+        with manager.connection() as conn:
+            if schema_version(conn) > SCHEMA_VERSION:
+                raise RuntimeError(f"La base {manager.db_name} tiene un esquema más nuevo ({schema_version(conn)}) "
+                                   f"que esta versión de la aplicación ({SCHEMA_VERSION})")
+            if schema_version(conn) < SCHEMA_VERSION:
+                with manager.transaction():
+                    # Releer dentro del bloqueo: otro proceso pudo migrar mientras tanto
+                    cursor = conn.cursor()
+                    for migration in MIGRATIONS[schema_version(conn):]:
+                        migration(cursor)
+                    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        _migrated.add(key)
@@ -0,0 +1,284 @@
+# Exportación por bloques de consultas a CSV, Parquet o XLSX.
+# Las filas se leen del cursor de a `chunksize` y se escriben al destino sin
+# construir el resultado completo en memoria.
+# Uso: python -m exporter kardex kardex_2024.parquet --desde 2024-01-01 --hasta 2024-12-31 [--producto 12]
+#      python -m exporter stock stock_junio.xlsx --fecha 2024-06-30
+#      python -m exporter presupuesto presupuesto.csv --desde 2024-01 --hasta 2024-12
+#      python -m exporter gastos gastos.csv --desde 2024-01 --hasta 2024-12
+import argparse
+import csv
+import io
+import os
+import sys
+import time
+
+from archive import balance_schema, expense_sources, kardex_sources
+from db import DB_NAME, get_manager, init_db
+from inventory import balance_params, stock_as_of_sql
+from kardex import history_filters
+
+FORMATOS = ('csv', 'parquet', 'xlsx')
+CHUNK_SIZE = 50_000
+XLSX_MAX_ROWS = 1_048_575  # filas de datos por hoja de Excel (más el encabezado)
+MIME = {
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+# Columnas de cada conjunto: (nombre, tipo) con tipo 'int', 'float' o 'str'.
+# El tipo fija el esquema de Parquet antes de leer la primera fila.
+KARDEX_COLUMNS = [('id_movimiento', 'int'), ('fecha_movimiento', 'str'), ('id_producto', 'int'),
+                  ('nombre_producto', 'str'), ('tipo_movimiento', 'str'), ('cantidad', 'int'), ('referencia', 'str'),
+                  ('costo_unitario', 'float')]
+STOCK_COLUMNS = [('id_producto', 'int'), ('nombre_producto', 'str'), ('stock', 'int')]
+PRESUPUESTO_COLUMNS = [('mes_anio', 'str'), ('categoria_gasto', 'str'), ('monto_asignado', 'float'),
+                       ('gasto_real', 'float'), ('diferencia', 'float'), ('movimientos', 'int')]
+GASTOS_COLUMNS = [('id_gasto', 'int'), ('mes_anio', 'str'), ('categoria_gasto', 'str'), ('fecha_gasto', 'str'),
+                  ('monto_gasto', 'float'), ('descripcion', 'str')]
+
+
+class _CsvSink:
+    def __init__(self, destino, columns):
+        if isinstance(destino, (str, os.PathLike)):
+            self._file = open(destino, 'w', newline='', encoding='utf-8')
+        else:
+            # Archivo binario del llamador: se escribe encima sin cerrarlo
+            self._file = io.TextIOWrapper(destino, encoding='utf-8', newline='', write_through=True)
+        self._own = isinstance(destino, (str, os.PathLike))
+        self._writer = csv.writer(self._file)
+        self._writer.writerow([name for name, _ in columns])
+
+    def write(self, rows):
+        self._writer.writerows(rows)
+
+    def close(self):
+        self._file.flush()
+        if self._own:
+            self._file.close()
+        else:
+            self._file.detach()
+
+
+class _ParquetSink:
+    # Un row group por bloque: el escritor solo retiene el bloque en curso
+    def __init__(self, destino, columns):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        tipos = {'int': pa.int64(), 'float': pa.float64(), 'str': pa.string()}
+        self._pa = pa
+        self._schema = pa.schema([(name, tipos[tipo]) for name, tipo in columns])
+        self._writer = pq.ParquetWriter(destino, self._schema)
+
+    def write(self, rows):
+        arrays = [self._pa.array(values, type=field.type) for values, field in zip(zip(*rows), self._schema)]
+        self._writer.write_batch(self._pa.record_batch(arrays, schema=self._schema))
+
+    def close(self):
+        self._writer.close()
+
+
+class _XlsxSink:
+    # constant_memory escribe cada fila al archivo temporal de la hoja apenas
+    # se completa; al llenar una hoja se continúa en la siguiente. Excel no
+    # tiene NaN ni infinito (p. ej. dias_cobertura sin consumo): se escriben
+    # como error #NUM! / #DIV/0! en vez de cortar la exportación.
+    def __init__(self, destino, columns):
+        import xlsxwriter
+
+        self._book = xlsxwriter.Workbook(destino, {'constant_memory': True, 'nan_inf_to_errors': True})
+        self._header = [name for name, _ in columns]
+        self._sheet = None
+        self._row = XLSX_MAX_ROWS + 1
+        self._sheets = 0
+
+    def _new_sheet(self):
+        self._sheets += 1
+        self._sheet = self._book.add_worksheet(f"Datos {self._sheets}" if self._sheets > 1 else "Datos")
+        self._sheet.write_row(0, 0, self._header)
+        self._row = 1
+
+    def write(self, rows):
+        for row in rows:
+            if self._row > XLSX_MAX_ROWS:
+                self._new_sheet()
+            self._sheet.write_row(self._row, 0, row)
+            self._row += 1
+
+    def close(self):
+        if self._sheet is None:
+            self._new_sheet()
+        self._book.close()
+
+
+_SINKS = {'csv': _CsvSink, 'parquet': _ParquetSink, 'xlsx': _XlsxSink}
+
+
+def _sink(destino, formato, columns):
+    if formato not in _SINKS:
+        raise ValueError(f"Formato no soportado: {formato} (use {', '.join(FORMATOS)})")
+    return _SINKS[formato](destino, columns)
+
+
+def export_query(manager, sql, params, columns, destino, formato='csv', chunksize=CHUNK_SIZE):
+    """Escribe el resultado de `sql` en `destino` (ruta o archivo binario) y
+    devuelve la cantidad de filas.
+
+    Las filas se traen con fetchmany de a `chunksize`, así que la memoria
+    depende del tamaño del bloque y no del total de filas.
+    """
+    return export_queries(manager, [(sql, params)], columns, destino, formato, chunksize)
+
+
+def export_queries(manager, queries, columns, destino, formato='csv', chunksize=CHUNK_SIZE):
+    # Igual que export_query con varias consultas [(sql, params)] escritas una
+    # tras otra en el mismo destino (p. ej. los archivos anuales y la base activa)
+    sink = _sink(destino, formato, columns)
+    total = 0
+    try:
+        with manager.connection() as conn:
+            for sql, params in queries:
+                cursor = conn.execute(sql, params)
+                while True:
+                    rows = cursor.fetchmany(chunksize)
+                    if not rows:
+                        break
+                    sink.write(rows)
+                    total += len(rows)
+    finally:
+        sink.close()
+    return total
+
+
+def export_kardex(manager, destino, formato='csv', id_producto=None, tipo_movimiento=None,
+                  desde=None, hasta=None, chunksize=CHUNK_SIZE):
+    # Mismos filtros que el historial de la página Kardex, en orden cronológico:
+    # primero los archivos anuales que cubre el rango y luego la base activa
+    where, params = history_filters(id_producto, tipo_movimiento, desde, hasta)
+    with manager.connection() as conn:
+        sources = kardex_sources(conn, desde, hasta)
+    queries = []
+    for schema, source_where, source_params in reversed(sources):
+        conditions = where + source_where
+        queries.append((f"""
+            SELECT k.id_movimiento, k.fecha_movimiento, k.id_producto, p.nombre_producto,
+                   k.tipo_movimiento, k.cantidad, k.referencia, k.costo_unitario
+            FROM {schema}.kardex k
+            LEFT JOIN productos p ON k.id_producto = p.id_producto
+            {"WHERE " + " AND ".join(conditions) if conditions else ""}
+            ORDER BY k.fecha_movimiento, k.id_movimiento
+        """, params + source_params))
+    return export_queries(manager, queries, KARDEX_COLUMNS, destino, formato, chunksize)
+
+
+def export_stock(manager, destino, formato='csv', fecha=None, chunksize=CHUNK_SIZE):
+    # Sin fecha, el stock actual; con fecha, el saldo al cierre de ese día
+    if fecha is None:
+        sql = """
+            SELECT ia.id_producto, p.nombre_producto, ia.stock_actual
+            FROM inventario_actual ia
+            JOIN productos p ON p.id_producto = ia.id_producto
+            ORDER BY p.nombre_producto
+        """
+        params = ()
+    else:
+        with manager.connection() as conn:
+            schema = balance_schema(conn, fecha)
+            params = balance_params(conn, fecha, schema)
+        sql = stock_as_of_sql("b.id_producto, p.nombre_producto, b.stock", schema)
+    return export_query(manager, sql, params, STOCK_COLUMNS, destino, formato, chunksize)
+
+
+def _month_range(columna, desde, hasta, where=(), params=()):
+    where, params = list(where), list(params)
+    if desde:
+        where.append(f"{columna} >= ?")
+        params.append(str(desde))
+    if hasta:
+        where.append(f"{columna} <= ?")
+        params.append(str(hasta))
+    return ("WHERE " + " AND ".join(where)) if where else "", params
+
+
+def export_budget(manager, destino, formato='csv', desde=None, hasta=None, chunksize=CHUNK_SIZE):
+    # Presupuesto vs. gasto por mes y categoría desde resumen_mensual
+    where, params = _month_range("mes_anio", desde, hasta)
+    sql = f"""
+        SELECT mes_anio, categoria_gasto, monto_asignado, gasto_real,
+               monto_asignado - gasto_real AS diferencia, movimientos
+        FROM resumen_mensual
+        {where}
+        ORDER BY mes_anio, categoria_gasto
+    """
+    return export_query(manager, sql, params, PRESUPUESTO_COLUMNS, destino, formato, chunksize)
+
+
+def export_expenses(manager, destino, formato='csv', desde=None, hasta=None, chunksize=CHUNK_SIZE):
+    # Gastos registrados, incluidos los de meses cerrados que cubre el rango;
+    # el rango de meses usa idx_gastos_mes_categoria
+    with manager.connection() as conn:
+        sources = expense_sources(conn, desde, hasta)
+    queries = []
+    for schema, source_where, source_params in reversed(sources):
+        where, params = _month_range("mes_anio", desde, hasta, source_where, source_params)
+        queries.append((f"""
+            SELECT id_gasto, mes_anio, categoria_gasto, fecha_gasto, monto_gasto, descripcion
+            FROM {schema}.gastos_reales
+            {where}
+            ORDER BY mes_anio, id_gasto
+        """, params))
+    return export_queries(manager, queries, GASTOS_COLUMNS, destino, formato, chunksize)
+
+
+def export_frame(df, destino, formato='csv', chunksize=CHUNK_SIZE):
+    # Para resultados que ya están en memoria (p. ej. Pedido Sugerido): se
+    # escribe por bloques sin pasar por to_csv ni una copia codificada completa
+    columns = [(str(name), 'int' if dtype.kind in 'iub' else 'float' if dtype.kind == 'f' else 'str')
+               for name, dtype in df.dtypes.items()]
+    sink = _sink(destino, formato, columns)
+    try:
+        for start in range(0, len(df), chunksize):
+            block = df.iloc[start:start + chunksize].astype(object)
+            # NaN como celda vacía, igual que un NULL de SQLite
+            block = block.where(block.notna(), None)
+            sink.write(list(block.itertuples(index=False, name=None)))
+    finally:
+        sink.close()
+    return len(df)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exporta datos del dashboard por bloques")
+    parser.add_argument("conjunto", choices=['kardex', 'stock', 'presupuesto', 'gastos'])
+    parser.add_argument("destino", help="Archivo de salida; el formato se toma de la extensión si no se indica")
+    parser.add_argument("--formato", choices=FORMATOS)
+    parser.add_argument("--desde", help="Fecha (kardex) o mes AAAA-MM (presupuesto, gastos)")
+    parser.add_argument("--hasta", help="Fecha (kardex) o mes AAAA-MM (presupuesto, gastos)")
+    parser.add_argument("--producto", type=int, help="id_producto (kardex)")
+    parser.add_argument("--tipo", choices=['ENTRADA', 'SALIDA'], help="Tipo de movimiento (kardex)")
+    parser.add_argument("--fecha", help="Stock al cierre de esta fecha (stock); por defecto el actual")
+    parser.add_argument("--bloque", type=int, default=CHUNK_SIZE, help="Filas por bloque")
+    parser.add_argument("--db", default=DB_NAME)
+    args = parser.parse_args(argv)
+
+    formato = args.formato or os.path.splitext(args.destino)[1].lstrip('.').lower()
+    if formato not in FORMATOS:
+        parser.error(f"No se reconoce el formato de {args.destino}; use --formato")
+    manager = get_manager(args.db)
+    init_db(manager)
+    t0 = time.perf_counter()
+    if args.conjunto == 'kardex':
+        filas = export_kardex(manager, args.destino, formato, args.producto, args.tipo, args.desde, args.hasta, args.bloque)
+    elif args.conjunto == 'stock':
+        filas = export_stock(manager, args.destino, formato, args.fecha, args.bloque)
+    elif args.conjunto == 'presupuesto':
+        filas = export_budget(manager, args.destino, formato, args.desde, args.hasta, args.bloque)
+    else:
+        filas = export_expenses(manager, args.destino, formato, args.desde, args.hasta, args.bloque)
+    print(f"{filas:,} filas exportadas a {args.destino} en {time.perf_counter() - t0:.1f} s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,195 @@
+# Importación masiva de movimientos de Kardex desde CSV o Parquet.
+# Uso: python -m importer movimientos.csv [--db dashboard_control.db] [--rechazos rechazos.csv]
+import argparse
+import sys
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from archive import last_close
+from db import DB_NAME, get_manager, init_db
+from inventory import inventory_sync_suspended, invalidate_snapshots
+from valuation import apply_new_movements
+
+CHUNK_SIZE = 50_000
+COLUMNS = ['id_producto', 'tipo_movimiento', 'cantidad', 'fecha_movimiento', 'referencia', 'costo_unitario']
+
+
+def _read_chunks(source, formato, chunksize):
+    if formato == 'parquet':
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(source).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(source, chunksize=chunksize, dtype={'referencia': str})
+
+
+def _detect_format(name):
+    return 'parquet' if str(name).lower().endswith(('.parquet', '.pq')) else 'csv'
+
+
+def _normalize(chunk, offset, known_products, cerrado_hasta=None):
+    # Devuelve el bloque con columnas tipadas y una columna 'motivo' con la
+    # causa de rechazo (None si la fila es válida)
+    missing = {'id_producto', 'tipo_movimiento', 'cantidad'} - set(chunk.columns)
+    if missing:
+        raise ValueError(f"Faltan columnas obligatorias: {', '.join(sorted(missing))}")
+
+    df = pd.DataFrame({'fila': np.arange(offset + 1, offset + len(chunk) + 1)}, index=chunk.index)
+    df['id_producto'] = pd.to_numeric(chunk['id_producto'], errors='coerce')
+    df['tipo_movimiento'] = chunk['tipo_movimiento'].astype(str).str.strip().str.upper()
+    df['cantidad'] = pd.to_numeric(chunk['cantidad'], errors='coerce')
+    if 'fecha_movimiento' in chunk.columns:
+        df['fecha_movimiento'] = pd.to_datetime(chunk['fecha_movimiento'], errors='coerce').dt.strftime('%Y-%m-%d')
+    else:
+        df['fecha_movimiento'] = datetime.now().strftime('%Y-%m-%d')
+    df['referencia'] = chunk['referencia'].where(chunk['referencia'].notna(), None) if 'referencia' in chunk.columns else None
+    # Costo opcional de las ENTRADAS; vacío = precio del producto
+    if 'costo_unitario' in chunk.columns:
+        df['costo_unitario'] = pd.to_numeric(chunk['costo_unitario'], errors='coerce')
+        costo_invalido = (chunk['costo_unitario'].notna() & df['costo_unitario'].isna()) | (df['costo_unitario'] < 0)
+    else:
+        df['costo_unitario'] = np.nan
+        costo_invalido = pd.Series(False, index=df.index)
+
+    motivo = pd.Series(None, index=df.index, dtype=object)
+    motivo[costo_invalido] = "Costo inválido"
+    motivo[df['fecha_movimiento'].isna()] = "Fecha inválida"
+    if cerrado_hasta:
+        motivo[df['fecha_movimiento'].fillna(cerrado_hasta) < cerrado_hasta] = "Periodo cerrado"
+    motivo[df['cantidad'].isna() | (df['cantidad'] <= 0) | (df['cantidad'] % 1 != 0)] = "Cantidad inválida"
+    motivo[~df['tipo_movimiento'].isin(['ENTRADA', 'SALIDA'])] = "Tipo de movimiento inválido"
+    motivo[~df['id_producto'].isin(known_products)] = "Producto inexistente"
+    df['motivo'] = motivo
+    return df
+
+
+def _validate_stock(valid, balances):
+    # Saldo corrido por producto dentro del archivo, partiendo del stock actual.
+    # Los productos cuyo saldo nunca baja de cero se aceptan completos de forma
+    # vectorizada; solo los que tienen alguna SALIDA sin stock se recorren fila
+    # a fila para rechazar exactamente las salidas que no alcanzan.
+    ids = valid['id_producto'].to_numpy(dtype=np.int64)
+    qty = valid['cantidad'].to_numpy(dtype=np.int64)
+    delta = np.where(valid['tipo_movimiento'].to_numpy() == 'ENTRADA', qty, -qty)
+    start = balances.reindex(ids, fill_value=0).to_numpy(dtype=np.int64)
+    running = start + pd.Series(delta).groupby(ids).cumsum().to_numpy()
+
+    accepted = np.ones(len(valid), dtype=bool)
+    short = np.unique(ids[running < 0])
+    for product in short:
+        positions = np.flatnonzero(ids == product)
+        balance = int(start[positions[0]])
+        for pos in positions:
+            if delta[pos] < 0 and balance + delta[pos] < 0:
+                accepted[pos] = False
+            else:
+                balance += int(delta[pos])
+
+    applied = pd.Series(np.where(accepted, delta, 0)).groupby(ids).sum()
+    return accepted, applied
+
+
+def import_movements(source, manager=None, formato=None, chunksize=CHUNK_SIZE):
+    """Importa movimientos en una sola transacción.
+
+    Los bloques se leen y validan en orden, de modo que las SALIDAS se
+    comprueban contra el saldo corrido (stock actual más los movimientos
+    previos del mismo archivo). Al final los movimientos insertados se aplican
+    en bloque a la valuación mantenida (valuation.apply_new_movements).
+    Devuelve un dict con el número de filas insertadas, los productos
+    actualizados y un DataFrame con las filas rechazadas y su motivo.
+    """
+    manager = manager or get_manager()
+    formato = formato or _detect_format(getattr(source, 'name', source))
+    inserted = 0
+    deltas = pd.Series(dtype=np.int64)
+    rejected = []
+    first_date = None
+
+    # Los triggers de kardex se apagan durante la importación: la validación de
+    # stock ya se hizo aquí; inventario_actual y la valuación se actualizan en
+    # bloque al final
+    with manager.transaction() as conn, inventory_sync_suspended(conn):
+        precios = pd.read_sql_query("SELECT id_producto, precio_unitario FROM productos", conn) \
+            .set_index('id_producto')['precio_unitario']
+        known_products = precios.index
+        # Con los triggers apagados, el periodo cerrado se valida aquí
+        cierre = last_close(conn)
+        balances = pd.read_sql_query("SELECT id_producto, stock_actual FROM inventario_actual", conn) \
+            .set_index('id_producto')['stock_actual'].astype(np.int64)
+        # Los movimientos importados son los de id mayor a este
+        ultimo_id = conn.execute("SELECT COALESCE(MAX(id_movimiento), 0) FROM kardex").fetchone()[0]
+
+        offset = 0
+        for chunk in _read_chunks(source, formato, chunksize):
+            df = _normalize(chunk, offset, known_products, cierre and cierre[0])
+            offset += len(chunk)
+
+            valid = df[df['motivo'].isna()]
+            accepted, applied = _validate_stock(valid, balances)
+            bad = valid[~accepted].copy()
+            bad['motivo'] = "Stock insuficiente"
+            rejected.append(df[df['motivo'].notna()])
+            rejected.append(bad)
+
+            rows = valid[accepted]
+            costos = rows['costo_unitario'].fillna(rows['id_producto'].map(precios)).fillna(0) \
+                .where(rows['tipo_movimiento'] == 'ENTRADA')
+            conn.executemany(
+                "INSERT INTO kardex (id_producto, tipo_movimiento, cantidad, fecha_movimiento, referencia, costo_unitario) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                zip(rows['id_producto'].astype(int).tolist(), rows['tipo_movimiento'].tolist(),
+                    rows['cantidad'].astype(int).tolist(), rows['fecha_movimiento'].tolist(),
+                    rows['referencia'].tolist(), costos.astype(object).where(costos.notna(), None).tolist()))
+            inserted += len(rows)
+            if len(rows):
+                chunk_first = rows['fecha_movimiento'].min()
+                first_date = chunk_first if first_date is None else min(first_date, chunk_first)
+
+            balances = balances.add(applied, fill_value=0).astype(np.int64)
+            deltas = deltas.add(applied, fill_value=0).astype(np.int64)
+
+        # Un único UPDATE agregado por producto al final del archivo
+        deltas = deltas[deltas != 0]
+        conn.executemany(
+            "INSERT INTO inventario_actual (id_producto, stock_actual) VALUES (?, ?) "
+            "ON CONFLICT(id_producto) DO UPDATE SET stock_actual = stock_actual + excluded.stock_actual",
+            zip(deltas.index.astype(int).tolist(), deltas.astype(int).tolist()))
+        if first_date is not None:
+            invalidate_snapshots(conn, first_date)
+        apply_new_movements(conn, ultimo_id)
+
+    rejected = pd.concat(rejected) if rejected else pd.DataFrame(columns=['fila', *COLUMNS, 'motivo'])
+    return {
+        'insertados': inserted,
+        'productos_actualizados': len(deltas),
+        'rechazados': rejected.sort_values('fila')[['fila', *COLUMNS, 'motivo']].reset_index(drop=True),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Importa movimientos de Kardex desde CSV o Parquet")
+    parser.add_argument("archivo")
+    parser.add_argument("--db", default=DB_NAME)
+    parser.add_argument("--chunksize", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--rechazos", help="CSV donde guardar las filas rechazadas")
+    args = parser.parse_args(argv)
+
+    manager = get_manager(args.db)
+    init_db(manager)
+    start = datetime.now()
+    result = import_movements(args.archivo, manager, chunksize=args.chunksize)
+    elapsed = (datetime.now() - start).total_seconds()
+
+    print(f"{result['insertados']} movimientos importados en {elapsed:.2f} s; "
+          f"{result['productos_actualizados']} productos actualizados; "
+          f"{len(result['rechazados'])} filas rechazadas.")
+    if args.rechazos and not result['rechazados'].empty:
+        result['rechazados'].to_csv(args.rechazos, index=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
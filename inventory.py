@@ -0,0 +1,155 @@
+# Mantenimiento de inventario_actual y cierres diarios de stock.
+# Uso: python -m inventory reconciliar [--db dashboard_control.db]
+#      python -m inventory cierre [--fecha YYYY-MM-DD]
+import argparse
+import sys
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+from db import DB_NAME, get_manager, init_db
+
+
+# Saldo por producto a una fecha: último cierre anterior más los movimientos
+# posteriores a ese cierre. Solo recorre kardex desde el cierre (índice por fecha).
+# `schema` es 'main' o el archivo anual de un periodo cerrado (archivo_2023).
+def balance_sql(schema='main'):
+    return f"""
+        SELECT id_producto, SUM(delta) AS stock
+        FROM (
+            SELECT id_producto, stock AS delta
+            FROM {schema}.stock_snapshot
+            WHERE fecha = :base
+            UNION ALL
+            SELECT id_producto, CASE tipo_movimiento WHEN 'ENTRADA' THEN cantidad ELSE -cantidad END
+            FROM {schema}.kardex
+            WHERE fecha_movimiento > COALESCE(:base, '') AND fecha_movimiento <= :fecha
+        )
+        GROUP BY id_producto
+    """
+
+
+@contextmanager
+def inventory_sync_suspended(conn):
+    # Apaga los triggers de kardex dentro de la transacción en curso. Quien lo
+    # usa queda a cargo de actualizar inventario_actual y los cierres.
+    if not conn.in_transaction:
+        raise RuntimeError("inventory_sync_suspended requiere una transacción de escritura abierta")
+    conn.execute("UPDATE sincronizacion_inventario SET activa = 0")
+    try:
+        yield conn
+    finally:
+        conn.execute("UPDATE sincronizacion_inventario SET activa = 1")
+
+
+def invalidate_snapshots(conn, desde):
+    # Descarta los cierres que un movimiento con fecha `desde` deja obsoletos
+    conn.execute("DELETE FROM stock_snapshot WHERE fecha >= ?", (desde,))
+    conn.execute("DELETE FROM stock_snapshot_fechas WHERE fecha >= ?", (desde,))
+
+
+def rebuild_inventory(manager=None):
+    """Recalcula inventario_actual desde kardex con un único GROUP BY.
+
+    Devuelve el número de productos corregidos o agregados.
+    """
+    manager = manager or get_manager()
+
+    def write(conn):
+        before = conn.total_changes
+        conn.execute("""
+            INSERT INTO inventario_actual (id_producto, stock_actual)
+            SELECT p.id_producto, COALESCE(n.stock, 0)
+            FROM productos p
+            LEFT JOIN (
+                SELECT id_producto, SUM(CASE tipo_movimiento WHEN 'ENTRADA' THEN cantidad ELSE -cantidad END) AS stock
+                FROM kardex
+                GROUP BY id_producto
+            ) n ON n.id_producto = p.id_producto
+            WHERE true
+            ON CONFLICT(id_producto) DO UPDATE SET stock_actual = excluded.stock_actual
+            WHERE stock_actual IS NOT excluded.stock_actual
+        """)
+        return conn.total_changes - before
+
+    return manager.run_transaction(write)
+
+
+def _base_snapshot(conn, fecha, schema='main'):
+    return conn.execute(f"SELECT MAX(fecha) FROM {schema}.stock_snapshot_fechas WHERE fecha < ?", (fecha,)).fetchone()[0]
+
+
+def take_snapshot(manager=None, fecha=None):
+    """Guarda el cierre de stock de `fecha` (por defecto, ayer).
+
+    Devuelve False si ese cierre ya existía.
+    """
+    manager = manager or get_manager()
+    fecha = str(fecha or date.today() - timedelta(days=1))
+
+    def write(conn):
+        if conn.execute("SELECT 1 FROM stock_snapshot_fechas WHERE fecha = ?", (fecha,)).fetchone():
+            return False
+        base = _base_snapshot(conn, fecha)
+        conn.execute(f"""
+            INSERT INTO stock_snapshot (fecha, id_producto, stock)
+            SELECT :fecha, id_producto, stock FROM ({balance_sql()}) WHERE stock != 0
+        """, {'fecha': fecha, 'base': base})
+        conn.execute("INSERT INTO stock_snapshot_fechas (fecha, creado) VALUES (?, ?)",
+                     (fecha, datetime.now().isoformat(timespec='seconds')))
+        return True
+
+    return manager.run_transaction(write)
+
+
+def balance_params(conn, fecha, schema='main'):
+    # Parámetros de balance_sql para `fecha`: un cierre del mismo día ya es
+    # la respuesta completa; si no, se parte del cierre anterior
+    fecha = str(fecha)
+    exact = conn.execute(f"SELECT 1 FROM {schema}.stock_snapshot_fechas WHERE fecha = ?", (fecha,)).fetchone()
+    return {'fecha': fecha, 'base': fecha if exact else _base_snapshot(conn, fecha, schema)}
+
+
+def stock_as_of_sql(columns="p.nombre_producto, b.stock", schema='main'):
+    return f"""
+        SELECT {columns}
+        FROM ({balance_sql(schema)}) b
+        JOIN productos p ON p.id_producto = b.id_producto
+        WHERE b.stock != 0
+        ORDER BY p.nombre_producto
+    """
+
+
+def stock_as_of(cache, fecha):
+    # Stock de cada producto al cierre de `fecha` a partir del cierre previo;
+    # una fecha de un periodo cerrado se responde desde el archivo de su año
+    from archive import balance_schema
+
+    with cache.manager.connection() as conn:
+        schema = balance_schema(conn, fecha)
+        params = balance_params(conn, fecha, schema)
+    return cache.read_sql(stock_as_of_sql(schema=schema), params, tables=('kardex', 'stock_snapshot', 'productos'))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mantenimiento de inventario y cierres de stock")
+    parser.add_argument("--db", default=DB_NAME)
+    sub = parser.add_subparsers(dest="comando", required=True)
+    sub.add_parser("reconciliar", help="Recalcula inventario_actual desde kardex")
+    cierre = sub.add_parser("cierre", help="Guarda el cierre diario de stock")
+    cierre.add_argument("--fecha", help="YYYY-MM-DD (por defecto, ayer)")
+    args = parser.parse_args(argv)
+
+    manager = get_manager(args.db)
+    init_db(manager)
+    if args.comando == "reconciliar":
+        print(f"{rebuild_inventory(manager)} productos corregidos en inventario_actual.")
+    else:
+        if take_snapshot(manager, args.fecha):
+            print("Cierre de stock guardado.")
+        else:
+            print("El cierre de stock para esa fecha ya existía.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
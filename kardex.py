@@ -0,0 +1,131 @@
+import sqlite3
+from datetime import datetime
+
+import pandas as pd
+
+from archive import kardex_sources
+
+# --- Consultas del Kardex ---
+
+HISTORY_PAGE_SIZE = 50
+
+
+class StockInsuficienteError(ValueError):
+    def __init__(self, id_producto, stock_actual, cantidad):
+        self.id_producto = id_producto
+        self.stock_actual = stock_actual
+        self.cantidad = cantidad
+        super().__init__(f"No hay suficiente stock para la salida. Stock actual: {stock_actual}")
+
+
+def insert_movement(conn, id_producto, tipo_movimiento, cantidad, referencia, fecha=None, costo_unitario=None):
+    # INSERT de un movimiento dentro de una transacción ya abierta. Los triggers
+    # de kardex validan la SALIDA y actualizan inventario_actual y la valuación
+    # en la misma sentencia. Una ENTRADA sin costo_unitario toma el precio del
+    # producto; una SALIDA no lleva costo (sale al promedio o FIFO vigente).
+    if tipo_movimiento not in ('ENTRADA', 'SALIDA'):
+        raise ValueError(f"Tipo de movimiento inválido: {tipo_movimiento}")
+    if costo_unitario is not None and costo_unitario < 0:
+        raise ValueError(f"Costo unitario inválido: {costo_unitario}")
+    fecha = fecha or datetime.now().strftime('%Y-%m-%d')
+    if tipo_movimiento == 'SALIDA':
+        costo_unitario = None
+    try:
+        cursor = conn.execute("""
+            INSERT INTO kardex (id_producto, tipo_movimiento, cantidad, fecha_movimiento, referencia, costo_unitario)
+            VALUES (?, ?, ?, ?, ?, CASE WHEN ? = 'ENTRADA'
+                THEN COALESCE(?, (SELECT precio_unitario FROM productos WHERE id_producto = ?), 0) END)
+        """, (id_producto, tipo_movimiento, cantidad, fecha, referencia, tipo_movimiento, costo_unitario, id_producto))
+    except sqlite3.IntegrityError as e:
+        if 'periodo cerrado' in str(e):
+            raise ValueError(f"El {fecha} pertenece a un periodo cerrado") from None
+        if 'stock insuficiente' not in str(e):
+            raise
+        row = conn.execute("SELECT stock_actual FROM inventario_actual WHERE id_producto = ?", (id_producto,)).fetchone()
+        raise StockInsuficienteError(id_producto, row[0] if row else 0, cantidad) from None
+    return cursor.lastrowid
+
+
+def record_movement(manager, id_producto, tipo_movimiento, cantidad, referencia, fecha=None, costo_unitario=None):
+    """Registra un movimiento y actualiza inventario_actual de forma atómica.
+
+    El INSERT corre dentro de una transacción BEGIN IMMEDIATE y el trigger
+    trg_kardex_validar_salida comprueba el stock en la misma sentencia, así que
+    dos sesiones no pueden validar el mismo stock a la vez. Lanza
+    StockInsuficienteError si no alcanza.
+    """
+    if tipo_movimiento not in ('ENTRADA', 'SALIDA'):
+        raise ValueError(f"Tipo de movimiento inválido: {tipo_movimiento}")
+    return manager.run_transaction(
+        lambda conn: insert_movement(conn, id_producto, tipo_movimiento, cantidad, referencia, fecha, costo_unitario))
+
+
+def history_filters(id_producto=None, tipo_movimiento=None, desde=None, hasta=None):
+    # Condiciones sobre kardex (alias k) compartidas por el historial y la exportación
+    where, params = [], []
+    if id_producto is not None:
+        where.append("k.id_producto = ?")
+        params.append(int(id_producto))
+    if tipo_movimiento:
+        where.append("k.tipo_movimiento = ?")
+        params.append(tipo_movimiento)
+    if desde:
+        where.append("k.fecha_movimiento >= ?")
+        params.append(str(desde))
+    if hasta:
+        where.append("k.fecha_movimiento <= ?")
+        params.append(str(hasta))
+    return where, params
+
+
+def get_kardex_page(cache, page_size=HISTORY_PAGE_SIZE, after=None, id_producto=None,
+                    tipo_movimiento=None, desde=None, hasta=None):
+    """Devuelve una página del historial y el cursor para la siguiente.
+
+    Paginación por clave (fecha_movimiento, id_movimiento) en orden
+    descendente: cada página es una búsqueda en índice de ``page_size`` filas,
+    sin OFFSET, así que el costo no crece con el tamaño de la tabla.
+    ``after`` es el cursor devuelto por la página anterior (o None). Si la
+    página no se completa con la base activa y el rango llega a un periodo
+    cerrado, sigue en los archivos anuales, del más nuevo al más viejo.
+    """
+    where, params = history_filters(id_producto, tipo_movimiento, desde, hasta)
+    if after is not None:
+        where.append("(k.fecha_movimiento, k.id_movimiento) < (?, ?)")
+        params.extend(after)
+    with cache.manager.connection() as conn:
+        sources = kardex_sources(conn, desde, hasta)
+
+    # Se pide una fila de más para saber si existe una página siguiente
+    remaining = page_size + 1
+    frames = []
+    for schema, source_where, source_params in sources:
+        conditions = where + source_where
+        sql = f"""
+            SELECT
+                k.id_movimiento,
+                k.fecha_movimiento,
+                p.nombre_producto,
+                k.tipo_movimiento,
+                k.cantidad,
+                k.referencia
+            FROM {schema}.kardex k
+            JOIN productos p ON k.id_producto = p.id_producto
+            {"WHERE " + " AND ".join(conditions) if conditions else ""}
+            ORDER BY k.fecha_movimiento DESC, k.id_movimiento DESC
+            LIMIT ?
+        """
+        frames.append(cache.read_sql(sql, params + source_params + [remaining], tables=('kardex', 'productos')))
+        remaining -= len(frames[-1])
+        if remaining == 0:
+            break
+    # Las partes vacías se descartan para no perder los tipos de columna al concatenar
+    frames = [df for df in frames if not df.empty] or frames[:1]
+    df = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+
+    next_cursor = None
+    if len(df) > page_size:
+        df = df.iloc[:page_size]
+        last = df.iloc[-1]
+        next_cursor = (str(last['fecha_movimiento']), int(last['id_movimiento']))
+    return df, next_cursor
@@ -0,0 +1,53 @@
+# Búsqueda de productos por prefijo sobre el índice FTS5 productos_busqueda
+# (nombre, proveedor y ubicación), mantenido por triggers sobre productos.
+import re
+
+SEARCH_LIMIT = 20  # coincidencias que se muestran en el selector
+
+_WORD = re.compile(r"\w+")
+
+
+def match_expression(texto, column=None):
+    # Cada palabra como prefijo ("torn acme" -> "torn"* "acme"*): todas deben
+    # aparecer, en `column` si se indica o en cualquier columna. Solo se toman
+    # caracteres de palabra, así que la sintaxis de FTS5 que escriba el
+    # usuario no llega a la consulta.
+    prefix = f"{column} : " if column else ""
+    return " ".join(f'{prefix}"{word}"*' for word in _WORD.findall(texto or ''))
+
+
+def search_products(cache, texto='', limit=SEARCH_LIMIT):
+    """Devuelve hasta ``limit`` productos que coinciden con ``texto``.
+
+    Primero los que coinciden por nombre y luego los que coinciden por
+    proveedor o ubicación, cada grupo ordenado por nombre. Cada búsqueda en
+    el índice se corta en ``limit`` filas en lugar de puntuar todas las
+    coincidencias, así que el costo no crece con el catálogo ni con lo
+    general que sea el prefijo. Sin texto, devuelve los primeros por nombre.
+    """
+    if not match_expression(texto):
+        return cache.read_sql("""
+            SELECT id_producto, nombre_producto, proveedor, ubicacion
+            FROM productos
+            ORDER BY nombre_producto
+            LIMIT ?
+        """, (limit,), tables=('productos',))
+    return cache.read_sql("""
+        SELECT p.id_producto, p.nombre_producto, p.proveedor, p.ubicacion
+        FROM (
+            SELECT rowid, MIN(grupo) AS grupo
+            FROM (
+                SELECT * FROM (SELECT rowid, 0 AS grupo FROM productos_busqueda
+                               WHERE productos_busqueda MATCH :nombre LIMIT :limite)
+                UNION ALL
+                SELECT * FROM (SELECT rowid, 1 AS grupo FROM productos_busqueda
+                               WHERE productos_busqueda MATCH :todas LIMIT :limite)
+            )
+            GROUP BY rowid
+        ) b
+        JOIN productos p ON p.id_producto = b.rowid
+        ORDER BY b.grupo, p.nombre_producto
+        LIMIT :limite
+    """, {'nombre': match_expression(texto, 'nombre_producto'), 'todas': match_expression(texto), 'limite': limit},
+        tables=('productos',))
+
@@ -0,0 +1,275 @@
+# Perfilado de consultas: tiempos por sentencia, registro de consultas lentas
+# con su EXPLAIN QUERY PLAN y tiempos de ejecución del script por página.
+import json
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import pandas as pd
+
+SLOW_QUERY_MS = 100      # umbral del registro de consultas lentas
+SLOW_LOG_SIZE = 200      # entradas que se conservan en memoria
+
+
+def normalize_sql(sql):
+    return " ".join(sql.split())
+
+
+class Execution:
+    # Una ejecución de una sentencia: execute más los fetch posteriores del
+    # mismo cursor y, si pasa por QueryCache, la construcción del DataFrame
+    __slots__ = ('profiler', 'conn', 'sql', 'params', 'seconds', 'rows', 'logged')
+
+    def __init__(self, profiler, conn, sql, params):
+        self.profiler = profiler
+        self.conn = conn
+        self.sql = sql
+        self.params = params
+        self.seconds = 0.0
+        self.rows = 0
+        self.logged = False
+
+    def add(self, seconds, rows=0, done=True):
+        self.profiler._add(self, seconds, rows, done)
+
+    def add_build(self, seconds):
+        self.profiler._add_build(self, seconds)
+
+
+class QueryProfiler:
+    """Acumula estadísticas por sentencia y por página para todo el proceso.
+
+    Las conexiones de ConnectionManager reportan cada execute/executemany y
+    cada fetch; las sentencias que superan ``slow_ms`` se guardan en el
+    registro de consultas lentas junto con su plan. Si se indica ``log_path``,
+    el registro también se agrega a ese archivo en formato JSON por línea.
+    """
+
+    def __init__(self, slow_ms=SLOW_QUERY_MS, log_path=None, log_size=SLOW_LOG_SIZE):
+        self.slow_ms = slow_ms
+        self.log_path = log_path
+        self._lock = threading.Lock()
+        self._statements = {}
+        self._pages = {}
+        self._slow = deque(maxlen=log_size)
+
+    def begin(self, conn, sql, params, seconds, rows, done=True):
+        execution = Execution(self, conn, normalize_sql(sql), params)
+        with self._lock:
+            stats = self._statements.get(execution.sql)
+            if stats is None:
+                stats = self._statements[execution.sql] = {
+                    'llamadas': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'filas': 0, 'dataframe_ms': 0.0}
+            stats['llamadas'] += 1
+        self._add(execution, seconds, rows, done)
+        return execution
+
+    def _add(self, execution, seconds, rows, done):
+        # El registro de lentas se evalúa cuando la sentencia terminó de
+        # consumirse (tras el execute de una escritura o el fetch de una lectura)
+        execution.seconds += seconds
+        execution.rows += max(rows, 0)
+        with self._lock:
+            stats = self._statements[execution.sql]
+            stats['total_ms'] += seconds * 1000
+            stats['filas'] += max(rows, 0)
+            stats['max_ms'] = max(stats['max_ms'], execution.seconds * 1000)
+        if done and not execution.logged and execution.seconds * 1000 >= self.slow_ms:
+            execution.logged = True
+            self._log_slow(execution)
+
+    def _add_build(self, execution, seconds):
+        with self._lock:
+            self._statements[execution.sql]['dataframe_ms'] += seconds * 1000
+
+    def _explain(self, execution):
+        # Cursor base de sqlite3 para que el EXPLAIN no se perfile a sí mismo
+        try:
+            rows = sqlite3.Cursor(execution.conn).execute(
+                "EXPLAIN QUERY PLAN " + execution.sql, execution.params).fetchall()
+        except sqlite3.Error as e:
+            return f"(sin plan: {e})"
+        return "\n".join(row[-1] for row in rows)
+
+    def _log_slow(self, execution):
+        entry = {
+            'fecha': datetime.now().isoformat(timespec='seconds'),
+            'duracion_ms': round(execution.seconds * 1000, 3),
+            'filas': execution.rows,
+            'sql': execution.sql,
+            'params': repr(execution.params),
+            'plan': self._explain(execution),
+        }
+        with self._lock:
+            self._slow.append(entry)
+            if self.log_path:
+                with open(self.log_path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def record_page(self, page, seconds):
+        # Tiempo total de una ejecución del script de Streamlit para `page`
+        with self._lock:
+            stats = self._pages.setdefault(page, {'ejecuciones': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'ultima_ms': 0.0})
+            stats['ejecuciones'] += 1
+            stats['total_ms'] += seconds * 1000
+            stats['max_ms'] = max(stats['max_ms'], seconds * 1000)
+            stats['ultima_ms'] = seconds * 1000
+
+    def statements(self):
+        with self._lock:
+            rows = [dict(sql=sql, **stats) for sql, stats in self._statements.items()]
+        df = pd.DataFrame(rows, columns=['sql', 'llamadas', 'total_ms', 'max_ms', 'filas', 'dataframe_ms'])
+        df['promedio_ms'] = df['total_ms'] / df['llamadas']
+        return df.sort_values('total_ms', ascending=False).round(3).reset_index(drop=True)
+
+    def pages(self):
+        with self._lock:
+            rows = [dict(pagina=page, **stats) for page, stats in self._pages.items()]
+        df = pd.DataFrame(rows, columns=['pagina', 'ejecuciones', 'total_ms', 'max_ms', 'ultima_ms'])
+        df['promedio_ms'] = df['total_ms'] / df['ejecuciones']
+        return df.sort_values('total_ms', ascending=False).round(3).reset_index(drop=True)
+
+    def slow_queries(self):
+        with self._lock:
+            return list(self._slow)
+
+    def export(self):
+        # Estadísticas agregadas en un único documento JSON para análisis fuera de línea
+        return json.dumps({
+            'exportado': datetime.now().isoformat(timespec='seconds'),
+            'umbral_lento_ms': self.slow_ms,
+            'sentencias': self.statements().to_dict(orient='records'),
+            'paginas': self.pages().to_dict(orient='records'),
+            'lentas': self.slow_queries(),
+        }, ensure_ascii=False, indent=2)
+
+    def reset(self):
+        with self._lock:
+            self._statements.clear()
+            self._pages.clear()
+            self._slow.clear()
+
+
+class ProfiledCursor(sqlite3.Cursor):
+    # Sin perfilador activo solo agrega una comprobación por llamada
+    execution = None
+    # Tiempo y filas de la iteración (for row in cursor) aún no reportados: se
+    # acumulan aquí para no tomar el lock del perfilador en cada fila
+    _iter_seconds = 0.0
+    _iter_rows = 0
+
+    def _finish_iteration(self, done=True):
+        # Reporta lo acumulado por __next__; con done la ejecución se da por
+        # consumida y se evalúa contra el umbral de lentas
+        if self.execution is not None and (self._iter_rows or self._iter_seconds or done):
+            self.execution.add(self._iter_seconds, self._iter_rows, done=done)
+        self._iter_seconds, self._iter_rows = 0.0, 0
+
+    def execute(self, sql, parameters=()):
+        profiler = self.connection.profiler
+        # Una lectura iterada a medias termina cuando el cursor se reutiliza
+        self._finish_iteration()
+        if profiler is None:
+            self.execution = None
+            return super().execute(sql, parameters)
+        t0 = time.perf_counter()
+        result = super().execute(sql, parameters)
+        self.execution = profiler.begin(self.connection, sql, parameters, time.perf_counter() - t0,
+                                        self.rowcount, done=self.description is None)
+        return result
+
+    def executemany(self, sql, seq_of_parameters):
+        profiler = self.connection.profiler
+        self._finish_iteration()
+        if profiler is None:
+            self.execution = None
+            return super().executemany(sql, seq_of_parameters)
+        t0 = time.perf_counter()
+        result = super().executemany(sql, seq_of_parameters)
+        # Sin parámetros representativos: el plan se pide sin ellos
+        self.execution = profiler.begin(self.connection, sql, (), time.perf_counter() - t0, self.rowcount)
+        return result
+
+    def __next__(self):
+        if self.execution is None:
+            return super().__next__()
+        t0 = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._iter_seconds += time.perf_counter() - t0
+            self._finish_iteration()
+            self.execution = None
+            raise
+        self._iter_seconds += time.perf_counter() - t0
+        self._iter_rows += 1
+        return row
+
+    def _timed_fetch(self, fetch, *args):
+        if self.execution is None:
+            return fetch(*args)
+        self._finish_iteration(done=False)
+        t0 = time.perf_counter()
+        rows = fetch(*args)
+        count = len(rows) if isinstance(rows, list) else int(rows is not None)
+        # fetchmany sigue pendiente mientras devuelva bloques completos
+        pending = bool(args) and count == args[0]
+        self.execution.add(time.perf_counter() - t0, count, done=not pending)
+        return rows
+
+    def fetchone(self):
+        return self._timed_fetch(super().fetchone)
+
+    def fetchmany(self, size=None):
+        return self._timed_fetch(super().fetchmany, self.arraysize if size is None else size)
+
+    def fetchall(self):
+        return self._timed_fetch(super().fetchall)
+
+    def close(self):
+        self._finish_iteration()
+        self.execution = None
+        return super().close()
+
+
+class ProfiledConnection(sqlite3.Connection):
+    # Conexión del pool: todas las sentencias pasan por ProfiledCursor, que
+    # consulta el perfilador activo del ConnectionManager dueño
+    manager = None
+
+    @property
+    def profiler(self):
+        return self.manager.profiler if self.manager is not None else None
+
+    def cursor(self, factory=ProfiledCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        # El commit (y su fsync) cuenta como una sentencia más
+        profiler = self.profiler
+        if profiler is None:
+            return super().commit()
+        t0 = time.perf_counter()
+        super().commit()
+        profiler.begin(self, "COMMIT", (), time.perf_counter() - t0, 0)
+
+
+_profiler = None
+_profiler_lock = threading.Lock()
+
+
+def get_profiler():
+    # Un único perfilador por proceso, compartido por todas las sesiones
+    global _profiler
+    with _profiler_lock:
+        if _profiler is None:
+            _profiler = QueryProfiler()
+        return _profiler
@@ -0,0 +1,118 @@
+# Motor de Pedido Sugerido basado en el consumo real registrado en kardex.
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+# Parámetros por defecto del cálculo
+LEAD_TIME_DIAS = 7        # días entre el pedido y la recepción
+COBERTURA_DIAS = 30       # días de consumo que debe cubrir el pedido tras recibirlo
+VENTANA_SEMANAS = 8       # semanas del promedio móvil de consumo
+NIVEL_SERVICIO_Z = 1.65   # ~95 % de nivel de servicio para el stock de seguridad
+FACTOR_ESTACIONAL_MIN = 0.5
+FACTOR_ESTACIONAL_MAX = 2.0
+
+# Consumo por producto en una sola pasada sobre el índice parcial
+# idx_kardex_salidas (solo SALIDAS, ordenado por fecha y con la cantidad
+# incluida). Devuelve una fila por producto con:
+#   reciente / reciente_sq: suma y suma de cuadrados de la ventana móvil
+#   anual: consumo de las últimas 52 semanas
+#   mismo_periodo: consumo de hace un año en las fechas del horizonte que viene
+#   historia_previa: consumo anterior a un año (indica si hay historia suficiente)
+_CONSUMO_SQL = """
+    SELECT
+        id_producto,
+        SUM(CASE WHEN fecha_movimiento > :reciente THEN cantidad ELSE 0 END) AS reciente,
+        SUM(CASE WHEN fecha_movimiento > :reciente THEN cantidad * cantidad ELSE 0 END) AS reciente_sq,
+        SUM(CASE WHEN fecha_movimiento > :anual THEN cantidad ELSE 0 END) AS anual,
+        SUM(CASE WHEN fecha_movimiento > :anual AND fecha_movimiento <= :mismo_hasta THEN cantidad ELSE 0 END) AS mismo_periodo,
+        SUM(CASE WHEN fecha_movimiento <= :anual THEN cantidad ELSE 0 END) AS historia_previa
+    FROM kardex
+    WHERE tipo_movimiento = 'SALIDA'
+        AND fecha_movimiento > :desde
+        AND fecha_movimiento <= :hoy
+    GROUP BY id_producto
+"""
+
+_PRODUCTOS_SQL = """
+    SELECT p.id_producto, p.nombre_producto, COALESCE(p.stock_minimo, 0) AS stock_minimo, COALESCE(ia.stock_actual, 0) AS stock_actual
+    FROM productos p
+    LEFT JOIN inventario_actual ia ON ia.id_producto = p.id_producto
+"""
+
+
+def _demand_rates(consumo, ventana, horizonte_dias, estacional):
+    # Consumo diario pronosticado y desviación semanal por producto
+    media = consumo['reciente'] / ventana
+    # Demanda compuesta de Poisson: la varianza semanal es la suma de los
+    # cuadrados de cada salida dividida por el número de semanas
+    desviacion = np.sqrt(consumo['reciente_sq'] / ventana)
+
+    factor = pd.Series(1.0, index=consumo.index)
+    if estacional:
+        base = consumo['anual'] / 364
+        mismo = consumo['mismo_periodo'] / horizonte_dias
+        con_historia = (consumo['historia_previa'] > 0) & (base > 0)
+        factor[con_historia] = (mismo[con_historia] / base[con_historia]).clip(FACTOR_ESTACIONAL_MIN, FACTOR_ESTACIONAL_MAX)
+
+    return pd.DataFrame({
+        'consumo_diario': media * factor / 7,
+        'desviacion_semanal': desviacion,
+        'factor_estacional': factor,
+    })
+
+
+def compute_reorder(conn, hoy=None, lead_time_dias=LEAD_TIME_DIAS, cobertura_dias=COBERTURA_DIAS,
+                    ventana_semanas=VENTANA_SEMANAS, nivel_servicio_z=NIVEL_SERVICIO_Z, estacional=True):
+    """Calcula el pedido sugerido para todo el catálogo.
+
+    punto_reorden = max(stock_minimo, consumo en el lead time + stock de seguridad)
+    cantidad_sugerida = punto_reorden + consumo de la cobertura - stock_actual
+    Devuelve un DataFrame con una fila por producto (incluye los que no
+    necesitan pedido, con cantidad_sugerida = 0).
+    """
+    hoy = date.fromisoformat(str(hoy)) if hoy else date.today()
+    horizonte_dias = lead_time_dias + cobertura_dias
+    hace_un_anio = hoy - timedelta(days=364)
+    limites = {
+        'hoy': str(hoy),
+        'reciente': str(hoy - timedelta(weeks=ventana_semanas)),
+        'anual': str(hace_un_anio),
+        'mismo_hasta': str(hace_un_anio + timedelta(days=horizonte_dias)),
+        # Cuatro semanas antes del año bastan para saber si hay historia previa
+        'desde': str(hace_un_anio - timedelta(weeks=4)) if estacional else str(hoy - timedelta(weeks=ventana_semanas)),
+    }
+    consumo = pd.read_sql_query(_CONSUMO_SQL, conn, params=limites).set_index('id_producto').astype(float)
+    productos = pd.read_sql_query(_PRODUCTOS_SQL, conn).set_index('id_producto')
+
+    rates = _demand_rates(consumo, ventana_semanas, horizonte_dias, estacional)
+    df = productos.join(rates, how='left')
+    df[['consumo_diario', 'desviacion_semanal']] = df[['consumo_diario', 'desviacion_semanal']].fillna(0.0)
+    df['factor_estacional'] = df['factor_estacional'].fillna(1.0)
+
+    stock_seguridad = nivel_servicio_z * df['desviacion_semanal'] * np.sqrt(lead_time_dias / 7)
+    df['punto_reorden'] = np.maximum(df['stock_minimo'], np.ceil(df['consumo_diario'] * lead_time_dias + stock_seguridad)).astype(np.int64)
+    necesidad = df['punto_reorden'] + df['consumo_diario'] * cobertura_dias - df['stock_actual']
+    df['cantidad_sugerida'] = np.where(df['stock_actual'] < df['punto_reorden'], np.ceil(np.maximum(necesidad, 0)), 0).astype(np.int64)
+    consumo_diario = df['consumo_diario'].to_numpy(dtype=float)
+    df['dias_cobertura'] = np.divide(df['stock_actual'].to_numpy(dtype=float), consumo_diario,
+                                     out=np.full(len(df), np.inf), where=consumo_diario > 0)
+
+    df['consumo_diario'] = df['consumo_diario'].round(2)
+    df['factor_estacional'] = df['factor_estacional'].round(2)
+    df['dias_cobertura'] = df['dias_cobertura'].round(1)
+    return df.reset_index()[['id_producto', 'nombre_producto', 'stock_actual', 'stock_minimo', 'consumo_diario',
+                             'factor_estacional', 'dias_cobertura', 'punto_reorden', 'cantidad_sugerida']]
+
+
+def get_reorder_suggestions(cache, **params):
+    # Resultado en caché hasta la próxima escritura en kardex, inventario o productos
+    hoy = str(params.pop('hoy', None) or date.today())
+
+    def compute():
+        with cache.manager.connection() as conn:
+            df = compute_reorder(conn, hoy=hoy, **params)
+        return df[df['cantidad_sugerida'] > 0].sort_values('dias_cobertura').reset_index(drop=True)
+
+    return cache.get_or_compute('pedido_sugerido', (hoy, *sorted(params.items())),
+                                ('kardex', 'inventario_actual', 'productos'), compute)
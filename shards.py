@@ -0,0 +1,173 @@
+# Modo multi-almacén: un archivo SQLite por almacén, todos con el esquema de
+# init_db. Cada almacén escribe en su propio archivo, así que los sitios no
+# compiten por el mismo bloqueo de escritura; las vistas consolidadas consultan
+# todos los archivos en paralelo y combinan los resultados.
+# Uso: python -m shards stock --almacenes norte,sur,centro
+#      python -m shards pedido --almacenes norte,sur
+#      python -m shards presupuesto 2024-06 --almacenes norte,sur
+# Sin --almacenes se usa la variable DASHBOARD_ALMACENES (la misma que lee app.py).
+import argparse
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from analytics import inventory_totals
+from budget import get_budget_summary, get_summary_months
+from cache import get_cache
+from db import DB_NAME, get_manager, init_db
+from reorder import get_reorder_suggestions
+
+WAREHOUSES_ENV = 'DASHBOARD_ALMACENES'
+
+_NAME = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+def parse_warehouses(value):
+    # "norte, sur" -> ['norte', 'sur']; el nombre forma parte del nombre de archivo
+    almacenes = []
+    for almacen in (value or '').split(','):
+        almacen = almacen.strip()
+        if not almacen:
+            continue
+        if not _NAME.match(almacen):
+            raise ValueError(f"Nombre de almacén inválido: {almacen!r} (use letras, números, - o _)")
+        if almacen not in almacenes:
+            almacenes.append(almacen)
+    return almacenes
+
+
+def configured_warehouses():
+    return parse_warehouses(os.environ.get(WAREHOUSES_ENV, ''))
+
+
+def shard_path(almacen, db_name=DB_NAME):
+    # dashboard_control.db -> dashboard_control_norte.db
+    stem, ext = os.path.splitext(db_name)
+    return f"{stem}_{almacen}{ext or '.db'}"
+
+
+class ShardSet:
+    """Una base por almacén, con su pool de conexiones y su caché de lecturas.
+
+    ``manager(almacen)`` enruta las escrituras al archivo del almacén.
+    ``map(fn)`` ejecuta ``fn(almacen, cache)`` en todos los almacenes a la vez
+    en un pool de hilos: sqlite3 libera el GIL mientras SQLite ejecuta cada
+    consulta, así que las lecturas de archivos distintos avanzan en paralelo.
+    """
+
+    def __init__(self, almacenes, db_name=DB_NAME, max_workers=None):
+        if not almacenes:
+            raise ValueError("Se necesita al menos un almacén")
+        self.almacenes = list(almacenes)
+        self._managers = {almacen: get_manager(shard_path(almacen, db_name)) for almacen in self.almacenes}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or len(self.almacenes), thread_name_prefix="shard")
+
+    def manager(self, almacen):
+        try:
+            return self._managers[almacen]
+        except KeyError:
+            raise ValueError(f"Almacén desconocido: {almacen}") from None
+
+    def managers(self):
+        return list(self._managers.values())
+
+    def cache(self, almacen):
+        return get_cache(self.manager(almacen))
+
+    def map(self, fn):
+        # {almacen: fn(almacen, cache)}; la primera excepción se propaga
+        futures = {almacen: self._executor.submit(fn, almacen, self.cache(almacen)) for almacen in self.almacenes}
+        return {almacen: future.result() for almacen, future in futures.items()}
+
+    def init_db(self):
+        self.map(lambda almacen, cache: init_db(cache.manager))
+
+    def close(self):
+        self._executor.shutdown()
+        for manager in self._managers.values():
+            manager.close_all()
+
+
+def consolidated_stock(shards):
+    # Una fila por almacén con productos, unidades y valor del inventario actual
+    totales = shards.map(lambda almacen, cache: inventory_totals(cache))
+    df = pd.DataFrame([dict(almacen=almacen, **totales[almacen]) for almacen in shards.almacenes],
+                      columns=['almacen', 'productos', 'con_stock', 'stock', 'valor'])
+    return df.astype({'productos': int, 'con_stock': int, 'stock': int, 'valor': float})
+
+
+def consolidated_reorder(shards, **params):
+    # Pedido Sugerido de cada almacén (cada sitio repone su propio stock), con la columna almacen
+    sugerencias = shards.map(lambda almacen, cache: get_reorder_suggestions(cache, **params))
+    df = pd.concat([df.assign(almacen=almacen) for almacen, df in sugerencias.items()], ignore_index=True)
+    return df[['almacen'] + [c for c in df.columns if c != 'almacen']]
+
+
+def consolidated_months(shards):
+    meses = shards.map(lambda almacen, cache: get_summary_months(cache))
+    return sorted(set().union(*meses.values()), reverse=True)
+
+
+def consolidated_budget(shards, mes_anio):
+    """Mismo resultado que get_budget_summary sumando todos los almacenes.
+
+    El total presupuestado es None solo si ningún almacén tiene presupuesto
+    para el mes; las categorías se suman por nombre.
+    """
+    resumenes = shards.map(lambda almacen, cache: get_budget_summary(cache, mes_anio))
+    totales = [total for total, _, _ in resumenes.values() if total is not None]
+    frames = [df for _, df, _ in resumenes.values() if not df.empty]
+    if frames:
+        por_categoria = pd.concat(frames).groupby('categoria_gasto', as_index=False).sum()
+    else:
+        por_categoria = next(iter(resumenes.values()))[1]
+    return (sum(totales) if totales else None, por_categoria,
+            sum(gasto for _, _, gasto in resumenes.values()))
+
+
+def main(argv=None):
+    comunes = argparse.ArgumentParser(add_help=False)
+    comunes.add_argument("--almacenes", default=os.environ.get(WAREHOUSES_ENV, ''),
+                         help="Lista separada por comas; cada almacén usa su propio archivo")
+    comunes.add_argument("--db", default=DB_NAME, help="Nombre base de los archivos (se agrega _<almacén>)")
+    parser = argparse.ArgumentParser(description="Vistas consolidadas del modo multi-almacén")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    sub.add_parser("init", parents=[comunes], help="Crea o migra la base de cada almacén")
+    sub.add_parser("stock", parents=[comunes], help="Stock y valor por almacén")
+    sub.add_parser("pedido", parents=[comunes], help="Pedido Sugerido de todos los almacenes")
+    presupuesto = sub.add_parser("presupuesto", parents=[comunes], help="Presupuesto vs. gasto consolidado de un mes")
+    presupuesto.add_argument("mes", help="AAAA-MM")
+    args = parser.parse_args(argv)
+
+    try:
+        almacenes = parse_warehouses(args.almacenes)
+    except ValueError as e:
+        parser.error(str(e))
+    if not almacenes:
+        parser.error(f"Indique --almacenes o la variable {WAREHOUSES_ENV}")
+    shards = ShardSet(almacenes, args.db)
+    try:
+        shards.init_db()
+        if args.comando == "init":
+            for almacen in almacenes:
+                print(f"{almacen}: {shard_path(almacen, args.db)}")
+        elif args.comando == "stock":
+            df = consolidated_stock(shards)
+            print(df.to_string(index=False))
+            print(f"Total: {df['stock'].sum()} unidades, ${df['valor'].sum():,.2f}")
+        elif args.comando == "pedido":
+            print(consolidated_reorder(shards).to_string(index=False))
+        else:
+            total, por_categoria, gasto = consolidated_budget(shards, args.mes)
+            print(por_categoria.to_string(index=False))
+            print(f"Presupuesto: {'-' if total is None else f'${total:,.2f}'}  Gasto: ${gasto:,.2f}")
+    finally:
+        shards.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import ConnectionManager, init_db  # noqa: E402
+
+
+@pytest.fixture
+def manager(tmp_path):
+    # Base nueva con el esquema completo en un directorio temporal
+    manager = ConnectionManager(str(tmp_path / "dashboard_control.db"))
+    init_db(manager)
+    yield manager
+    manager.close_all()
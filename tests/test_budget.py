@@ -0,0 +1,63 @@
+import pandas as pd
+
+from budget import SPLIT_COLUMNS, rebuild_resumen_mensual, record_expense, save_budget, save_budget_split
+
+
+def _split(manager, mes_anio):
+    with manager.connection() as conn:
+        return pd.read_sql_query("""
+            SELECT dp.id_detalle, dp.categoria_gasto, dp.monto_asignado
+            FROM detalle_presupuesto dp
+            JOIN presupuestos p ON p.id_presupuesto = dp.id_presupuesto
+            WHERE p.mes_anio = ?
+            ORDER BY dp.id_detalle
+        """, conn, params=(mes_anio,))
+
+
+def _resumen(manager):
+    with manager.connection() as conn:
+        return pd.read_sql_query("SELECT * FROM resumen_mensual ORDER BY mes_anio, categoria_gasto", conn)
+
+
+def test_split_edit_applies_only_the_diff(manager):
+    save_budget(manager, '2025-01', 1000)
+    save_budget(manager, '2025-02', 800)
+    save_budget_split(manager, '2025-01', pd.DataFrame(
+        [(None, 'Fletes', 300), (None, 'Sueldos', 500), (None, 'Luz', 100)], columns=SPLIT_COLUMNS))
+    save_budget_split(manager, '2025-02', pd.DataFrame([(None, 'Fletes', 250)], columns=SPLIT_COLUMNS))
+    record_expense(manager, '2025-01', 'Luz', '2025-01-15', 80, 'factura')
+    record_expense(manager, '2025-01', 'Sueldos', '2025-01-30', 480, 'nómina')
+
+    guardada = _split(manager, '2025-01')
+    ids = dict(zip(guardada['categoria_gasto'], guardada['id_detalle']))
+    otro_mes = int(_split(manager, '2025-02')['id_detalle'][0])
+    # Como lo devuelve el data_editor: Fletes sin cambios, Sueldos con otro
+    # monto, Luz borrada, una fila nueva, una vacía y una con el id de otro mes
+    editada = pd.DataFrame([
+        (ids['Fletes'], 'Fletes', 300.0),
+        (ids['Sueldos'], 'Sueldos', 550.0),
+        (None, 'Alquiler', 120.0),
+        (None, None, None),
+        (otro_mes, 'Seguros', 30.0),
+    ], columns=SPLIT_COLUMNS)
+    assert save_budget_split(manager, '2025-01', editada) == {'altas': 2, 'cambios': 1, 'bajas': 1}
+
+    final = _split(manager, '2025-01')
+    assert final[['categoria_gasto', 'monto_asignado']].values.tolist() == [
+        ['Fletes', 300.0], ['Sueldos', 550.0], ['Alquiler', 120.0], ['Seguros', 30.0]]
+    # Las filas que siguen conservan su id; el otro mes no se toca
+    assert final['id_detalle'][:2].tolist() == [ids['Fletes'], ids['Sueldos']]
+    assert _split(manager, '2025-02')[['id_detalle', 'categoria_gasto', 'monto_asignado']].values.tolist() == [
+        [otro_mes, 'Fletes', 250.0]]
+    with manager.connection() as conn:
+        assert conn.execute("SELECT mes_anio, monto_total_presupuesto FROM presupuestos ORDER BY mes_anio").fetchall() == [
+            ('2025-01', 1000.0), ('2025-02', 800.0)]
+
+    resumen = _resumen(manager)
+    enero = resumen[resumen['mes_anio'] == '2025-01'].set_index('categoria_gasto')
+    assert enero.loc['Sueldos', ['monto_asignado', 'gasto_real']].tolist() == [550.0, 480.0]
+    # Luz pierde la asignación pero conserva su gasto real
+    assert enero.loc['Luz', ['monto_asignado', 'asignaciones', 'gasto_real']].tolist() == [0.0, 0, 80.0]
+    assert enero.loc['Alquiler', 'monto_asignado'] == 120.0
+    manager.run_transaction(rebuild_resumen_mensual)
+    pd.testing.assert_frame_equal(resumen, _resumen(manager))
@@ -0,0 +1,102 @@
+import sqlite3
+
+from cache import QueryCache
+from inventory import rebuild_inventory
+
+INSERT_PRODUCTO = "INSERT INTO productos (nombre_producto, precio_unitario, stock_minimo, proveedor) VALUES (?, 10, 1, 'Prov')"
+
+
+def _count_productos(cache):
+    return int(cache.read_sql("SELECT COUNT(*) AS n FROM productos", tables=('productos',))['n'][0])
+
+
+def _external_insert(manager, nombre):
+    # Otro proceso: una conexión propia, fuera del pool
+    conn = sqlite3.connect(manager.db_name)
+    conn.execute(INSERT_PRODUCTO, (nombre,))
+    conn.commit()
+    conn.close()
+
+
+def test_local_write_keeps_unrelated_entries(manager):
+    cache = QueryCache(manager)
+    with manager.transaction() as conn:
+        conn.execute(INSERT_PRODUCTO, ("Tornillo",))
+    cache.invalidate('productos')
+    assert _count_productos(cache) == 1
+
+    with manager.transaction() as conn:
+        conn.execute("INSERT INTO gastos_reales (mes_anio, categoria_gasto, fecha_gasto, monto_gasto) VALUES ('2024-01', 'Fletes', '2024-01-05', 10)")
+    cache.invalidate('gastos_reales')
+    hits = cache.hits
+    assert _count_productos(cache) == 1
+    assert cache.hits == hits + 1
+
+
+def test_external_write_after_noop_local_write(manager):
+    cache = QueryCache(manager)
+    with manager.transaction() as conn:
+        conn.execute(INSERT_PRODUCTO, ("Tornillo",))
+    rebuild_inventory(manager)
+    cache.invalidate('productos', 'inventario_actual')
+    assert _count_productos(cache) == 1
+
+    # Escritura local que no cambia nada seguida de una de otro proceso
+    assert rebuild_inventory(manager) == 0
+    cache.invalidate('inventario_actual')
+    _external_insert(manager, "Arandela")
+    assert _count_productos(cache) == 2
+
+
+def test_external_write_between_commit_and_invalidate(manager):
+    cache = QueryCache(manager)
+    assert _count_productos(cache) == 0
+    with manager.transaction() as conn:
+        conn.execute(INSERT_PRODUCTO, ("Tornillo",))
+    # Una lectura que sondea antes del invalidate() del commit local
+    assert _count_productos(cache) == 1
+    cache.invalidate('productos')
+    _external_insert(manager, "Arandela")
+    assert _count_productos(cache) == 2
+
+
+def test_external_write_after_local_commit_is_not_swallowed(manager):
+    cache = QueryCache(manager)
+    assert _count_productos(cache) == 0
+    with manager.transaction() as conn:
+        conn.execute("INSERT INTO gastos_reales (mes_anio, categoria_gasto, fecha_gasto, monto_gasto) VALUES ('2024-01', 'Fletes', '2024-01-05', 10)")
+    # Otro proceso confirma antes de que el commit local llegue a invalidate()
+    _external_insert(manager, "Arandela")
+    cache.invalidate('gastos_reales')
+    assert _count_productos(cache) == 1
+
+
+def test_external_write_before_local_commit_is_not_swallowed(manager):
+    cache = QueryCache(manager)
+    assert _count_productos(cache) == 0
+    _external_insert(manager, "Arandela")
+    with manager.transaction() as conn:
+        conn.execute("INSERT INTO gastos_reales (mes_anio, categoria_gasto, fecha_gasto, monto_gasto) VALUES ('2024-01', 'Fletes', '2024-01-05', 10)")
+    cache.invalidate('gastos_reales')
+    assert _count_productos(cache) == 1
+
+
+def test_external_write_right_after_commit_is_not_swallowed(manager, monkeypatch):
+    cache = QueryCache(manager)
+    assert _count_productos(cache) == 0
+    read_data_version = cache._read_data_version
+    pendiente = []
+
+    def external_then_read():
+        # El otro proceso confirma entre el COMMIT local y la lectura de
+        # after_commit(), la segunda tras el sondeo de before_commit()
+        if pendiente and pendiente.pop() == 'after_commit':
+            _external_insert(manager, "Arandela")
+        return read_data_version()
+
+    monkeypatch.setattr(cache, '_read_data_version', external_then_read)
+    with manager.transaction() as conn:
+        conn.execute("INSERT INTO gastos_reales (mes_anio, categoria_gasto, fecha_gasto, monto_gasto) VALUES ('2024-01', 'Fletes', '2024-01-05', 10)")
+        pendiente.extend(['after_commit', 'before_commit'])
+    cache.invalidate('gastos_reales')
+    assert _count_productos(cache) == 1
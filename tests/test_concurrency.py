@@ -0,0 +1,60 @@
+import sqlite3
+import threading
+
+from kardex import insert_movement
+
+READERS = 6
+WRITERS = 4
+OPS = 40
+PRODUCTOS = (1, 2)
+
+
+def test_readers_and_writers_share_the_pool(manager):
+    with manager.transaction() as conn:
+        conn.executemany("INSERT INTO productos (id_producto, nombre_producto, precio_unitario, stock_minimo, proveedor) VALUES (?, ?, 5, 1, 'Prov')",
+                         [(p, f"Producto {p}") for p in PRODUCTOS])
+
+    errors = []
+    start = threading.Barrier(READERS + WRITERS)
+
+    def movimiento(conn, n, i):
+        # Cada operación entra dos unidades y saca una: la SALIDA siempre tiene stock
+        producto = PRODUCTOS[(n + i) % len(PRODUCTOS)]
+        insert_movement(conn, producto, 'ENTRADA', 2, f"w{n}-{i}", '2025-03-01')
+        insert_movement(conn, producto, 'SALIDA', 1, f"w{n}-{i}", '2025-03-02')
+
+    def writer(n):
+        start.wait()
+        for i in range(OPS):
+            try:
+                manager.run_transaction(lambda conn: movimiento(conn, n, i))
+            except sqlite3.Error as e:
+                errors.append(f"escritor {n}: {e}")
+
+    def reader(n):
+        start.wait()
+        for _ in range(OPS):
+            try:
+                with manager.connection() as conn:
+                    # Una sola sentencia ve un único snapshot: kardex e inventario coinciden
+                    kardex, inventario = conn.execute("""
+                        SELECT (SELECT COALESCE(SUM(CASE tipo_movimiento WHEN 'ENTRADA' THEN cantidad ELSE -cantidad END), 0) FROM kardex),
+                               (SELECT COALESCE(SUM(stock_actual), 0) FROM inventario_actual)
+                    """).fetchone()
+                    if kardex != inventario:
+                        errors.append(f"lector {n}: kardex {kardex} != inventario {inventario}")
+            except sqlite3.Error as e:
+                errors.append(f"lector {n}: {e}")
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(WRITERS)]
+    threads += [threading.Thread(target=reader, args=(n,)) for n in range(READERS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    with manager.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM kardex").fetchone()[0] == 2 * WRITERS * OPS
+        stock = dict(conn.execute("SELECT id_producto, stock_actual FROM inventario_actual").fetchall())
+    assert stock == {p: WRITERS * OPS // len(PRODUCTOS) for p in PRODUCTOS}
@@ -0,0 +1,33 @@
+import io
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+from exporter import export_frame, export_query
+
+
+def _sheet_xml(buffer):
+    return zipfile.ZipFile(buffer).read('xl/worksheets/sheet1.xml').decode()
+
+
+def test_export_frame_xlsx_with_inf_and_nan():
+    # Como el Pedido Sugerido: dias_cobertura es infinito sin consumo
+    df = pd.DataFrame({
+        'id_producto': [1, 2, 3],
+        'dias_cobertura': [12.5, np.inf, np.nan],
+        'consumo_diario': [2.0, 0.0, -np.inf],
+    })
+    buffer = io.BytesIO()
+    assert export_frame(df, buffer, 'xlsx') == 3
+    xml = _sheet_xml(buffer)
+    assert '<v>12.5</v>' in xml
+    assert '#DIV/0!' in xml
+
+
+def test_export_query_xlsx_with_inf(manager):
+    buffer = io.BytesIO()
+    filas = export_query(manager, "SELECT 1 AS id, 9e999 AS valor UNION ALL SELECT 2, NULL", (),
+                         [('id', 'int'), ('valor', 'float')], buffer, 'xlsx')
+    assert filas == 2
+    assert '#DIV/0!' in _sheet_xml(buffer)
@@ -0,0 +1,106 @@
+import pandas as pd
+import pytest
+
+from archive import close_period
+from importer import import_movements
+from kardex import record_movement
+
+# Sin inventario previo el saldo inicial de un producto se busca por etiqueta
+pytestmark = pytest.mark.filterwarnings("error::FutureWarning")
+
+COLUMNAS = ['id_producto', 'tipo_movimiento', 'cantidad', 'fecha_movimiento', 'costo_unitario']
+
+
+@pytest.fixture
+def productos(manager):
+    with manager.transaction() as conn:
+        conn.executemany("INSERT INTO productos (nombre_producto, precio_unitario, stock_minimo, proveedor) VALUES (?, 4, 1, 'Prov')",
+                         [("Tornillo",), ("Tuerca",)])
+    return manager
+
+
+def _import(manager, tmp_path, filas, **kwargs):
+    path = tmp_path / "movimientos.csv"
+    pd.DataFrame(filas, columns=COLUMNAS).to_csv(path, index=False)
+    return import_movements(str(path), manager, **kwargs)
+
+
+def _stock(manager):
+    with manager.connection() as conn:
+        return dict(conn.execute("SELECT id_producto, stock_actual FROM inventario_actual WHERE stock_actual != 0").fetchall())
+
+
+def _valuation_stock(manager):
+    with manager.connection() as conn:
+        return dict(conn.execute("SELECT id_producto, stock FROM valuacion_producto WHERE stock != 0").fetchall())
+
+
+def test_salida_covered_by_earlier_entrada_in_file(productos, tmp_path):
+    # inventario_actual vacío: la SALIDA solo se cubre con la ENTRADA previa,
+    # que queda en otro bloque
+    resultado = _import(productos, tmp_path, [
+        (1, 'ENTRADA', 10, '2025-03-01', 2.5),
+        (2, 'ENTRADA', 3, '2025-03-01', None),
+        (1, 'SALIDA', 8, '2025-03-02', None),
+        (1, 'SALIDA', 2, '2025-03-03', None),
+    ], chunksize=2)
+    assert resultado['insertados'] == 4
+    assert resultado['rechazados'].empty
+    assert _stock(productos) == {2: 3}
+    assert _valuation_stock(productos) == {2: 3}
+
+
+def test_only_the_short_salida_is_rejected(productos, tmp_path):
+    record_movement(productos, 1, 'ENTRADA', 5, 'compra', fecha='2025-02-01', costo_unitario=3.0)
+    resultado = _import(productos, tmp_path, [
+        (1, 'SALIDA', 4, '2025-03-01', None),
+        (1, 'SALIDA', 2, '2025-03-02', None),
+        (1, 'SALIDA', 1, '2025-03-03', None),
+        (2, 'ENTRADA', 6, '2025-03-03', None),
+        (1, 'ENTRADA', 2, '2025-03-04', None),
+        (1, 'SALIDA', 2, '2025-03-05', None),
+    ])
+    rechazados = resultado['rechazados']
+    assert rechazados[['fila', 'motivo']].values.tolist() == [[2, "Stock insuficiente"]]
+    assert resultado['insertados'] == 5
+    assert _stock(productos) == {2: 6}
+    assert _valuation_stock(productos) == {2: 6}
+    with productos.connection() as conn:
+        capa = conn.execute("SELECT restante, costo_unitario FROM capas_fifo WHERE id_producto = 2").fetchone()
+    # Sin costo en el archivo la ENTRADA toma el precio del producto
+    assert capa == (6, 4.0)
+
+
+def test_invalid_rows_are_rejected_with_reason(productos, tmp_path):
+    resultado = _import(productos, tmp_path, [
+        (1, 'ENTRADA', 5, '2025-03-01', None),
+        (1, 'ENTRADA', 5, 'no es fecha', None),
+        (99, 'ENTRADA', 5, '2025-03-01', None),
+        (1, 'DEVOLUCION', 5, '2025-03-01', None),
+        (1, 'ENTRADA', 0, '2025-03-01', None),
+        (1, 'ENTRADA', 2.5, '2025-03-01', None),
+        (1, 'ENTRADA', 5, '2025-03-01', -1),
+        (2, 'salida ', 1, '2025-03-01', None),
+    ])
+    assert resultado['rechazados'][['fila', 'motivo']].values.tolist() == [
+        [2, "Fecha inválida"],
+        [3, "Producto inexistente"],
+        [4, "Tipo de movimiento inválido"],
+        [5, "Cantidad inválida"],
+        [6, "Cantidad inválida"],
+        [7, "Costo inválido"],
+        [8, "Stock insuficiente"],
+    ]
+    assert resultado['insertados'] == 1
+    assert _stock(productos) == {1: 5}
+
+
+def test_closed_period_rows_are_rejected(productos, tmp_path):
+    record_movement(productos, 1, 'ENTRADA', 5, 'compra', fecha='2024-06-01')
+    close_period(productos, '2025-01-01', hoy='2026-10-17')
+    resultado = _import(productos, tmp_path, [
+        (1, 'ENTRADA', 3, '2024-12-31', None),
+        (1, 'SALIDA', 2, '2025-01-01', None),
+    ])
+    assert resultado['rechazados'][['fila', 'motivo']].values.tolist() == [[1, "Periodo cerrado"]]
+    assert _stock(productos) == {1: 3}
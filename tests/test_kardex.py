@@ -0,0 +1,54 @@
+from archive import close_period
+from cache import QueryCache
+from kardex import get_kardex_page, record_movement
+
+# Varias filas por fecha, para que los cortes de página caigan dentro de una misma fecha
+FECHAS = ['2023-05-10', '2024-03-01', '2024-11-30', '2025-02-14', '2025-06-01']
+POR_FECHA = 5
+
+
+def _history(manager, desde=None, hasta=None):
+    # Orden esperado, leído antes del cierre cuando todo está en la base activa
+    with manager.connection() as conn:
+        return [row[0] for row in conn.execute("""
+            SELECT id_movimiento FROM kardex
+            WHERE fecha_movimiento BETWEEN ? AND ?
+            ORDER BY fecha_movimiento DESC, id_movimiento DESC
+        """, (desde or '0001-01-01', hasta or '9999-12-31'))]
+
+
+def _pages(cache, page_size, **filtros):
+    # Avanza hasta el final guardando la pila de cursores, como la página Historial
+    cursores, paginas = [None], []
+    while True:
+        df, siguiente = get_kardex_page(cache, page_size, after=cursores[-1], **filtros)
+        paginas.append(df['id_movimiento'].tolist())
+        if siguiente is None:
+            return cursores, paginas
+        cursores.append(siguiente)
+
+
+def test_keyset_pages_span_live_and_archived_rows(manager):
+    with manager.transaction() as conn:
+        conn.execute("INSERT INTO productos (nombre_producto, precio_unitario, stock_minimo, proveedor) VALUES ('Tornillo', 4, 1, 'Prov')")
+    for i in range(POR_FECHA):
+        for fecha in FECHAS:
+            record_movement(manager, 1, 'ENTRADA', 1 + i, f"r{i}", fecha=fecha)
+    esperado = _history(manager)
+    esperado_rango = _history(manager, '2024-03-01', '2025-02-14')
+    close_period(manager, '2025-01-01', hoy='2026-10-17')
+    cache = QueryCache(manager)
+
+    for page_size, filtros, orden in ((4, {}, esperado), (3, {'desde': '2024-03-01', 'hasta': '2025-02-14'}, esperado_rango)):
+        cursores, paginas = _pages(cache, page_size, **filtros)
+        assert len(paginas) > 2
+        assert all(len(p) == page_size for p in paginas[:-1])
+        # Ni repetidas ni salteadas, en el mismo orden que antes del cierre
+        assert [i for p in paginas for i in p] == orden
+
+        # Volver atrás reutiliza el cursor guardado y repite la misma página
+        while len(cursores) > 1:
+            cursores.pop()
+            df, siguiente = get_kardex_page(cache, page_size, after=cursores[-1], **filtros)
+            assert df['id_movimiento'].tolist() == paginas[len(cursores) - 1]
+            assert siguiente is not None
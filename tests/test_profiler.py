@@ -0,0 +1,32 @@
+from profiler import QueryProfiler
+
+SERIE = "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 50) SELECT i FROM n"
+
+
+def _logged(profiler):
+    return [entry for entry in profiler.slow_queries() if entry['sql'] == SERIE]
+
+
+def test_iterated_select_reaches_slow_log(manager):
+    manager.profiler = profiler = QueryProfiler(slow_ms=0)
+    with manager.connection() as conn:
+        cur = conn.cursor()
+        cur.execute(SERIE)
+        assert _logged(profiler) == []
+        assert sum(1 for _ in cur) == 50
+    [entry] = _logged(profiler)
+    assert entry['filas'] == 50
+    assert profiler.statements().set_index('sql').loc[SERIE, 'filas'] == 50
+
+
+def test_partial_iteration_ends_on_next_execute(manager):
+    manager.profiler = profiler = QueryProfiler(slow_ms=0)
+    with manager.connection() as conn:
+        cur = conn.cursor()
+        cur.execute(SERIE)
+        for _, _ in zip(range(10), cur):
+            pass
+        assert _logged(profiler) == []
+        cur.execute("SELECT 1").fetchall()
+    [entry] = _logged(profiler)
+    assert entry['filas'] == 10
@@ -0,0 +1,21 @@
+from cache import QueryCache
+from kardex import record_movement
+from reorder import compute_reorder, get_reorder_suggestions
+
+
+def test_null_stock_minimo_counts_as_zero(manager):
+    with manager.transaction() as conn:
+        conn.execute("INSERT INTO productos (nombre_producto, precio_unitario, stock_minimo, proveedor) VALUES ('Sin mínimo', 10, NULL, 'Prov')")
+        conn.execute("INSERT INTO productos (nombre_producto, precio_unitario, stock_minimo, proveedor) VALUES ('Con mínimo', 10, 5, 'Prov')")
+    record_movement(manager, 1, 'ENTRADA', 20, 'compra', fecha='2025-05-01')
+    record_movement(manager, 1, 'SALIDA', 14, 'venta', fecha='2025-05-20')
+
+    with manager.connection() as conn:
+        df = compute_reorder(conn, hoy='2025-06-01').set_index('id_producto')
+    assert df.loc[1, 'stock_minimo'] == 0
+    assert df.loc[1, 'punto_reorden'] > 0
+    assert df.loc[2, 'punto_reorden'] == 5
+    assert df.loc[2, 'cantidad_sugerida'] == 5
+
+    sugeridos = get_reorder_suggestions(QueryCache(manager), hoy='2025-06-01')
+    assert set(sugeridos['id_producto']) == {1, 2}
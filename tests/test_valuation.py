@@ -0,0 +1,128 @@
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+import db
+from archive import close_period
+from db import MIGRATIONS, ConnectionManager, init_db
+from importer import import_movements
+from kardex import record_movement
+from valuation import VALUATION_TABLES, rebuild_product_valuation, rebuild_valuation
+
+
+def _state(manager):
+    with manager.connection() as conn:
+        return [pd.read_sql_query(sql, conn) for sql in (
+            "SELECT * FROM valuacion_producto ORDER BY id_producto",
+            "SELECT * FROM capas_fifo ORDER BY id_movimiento",
+            "SELECT * FROM costo_ventas_mensual ORDER BY mes_anio, id_producto",
+        )]
+
+
+def _assert_same_state(obtenido, esperado):
+    for a, b in zip(obtenido, esperado):
+        pd.testing.assert_frame_equal(a, b, check_exact=False, rtol=1e-9)
+
+
+def _migrated_matches_rebuild(manager):
+    # Lo que dejó la migración 009 contra valuation sobre la misma base
+    migrado = _state(manager)
+    assert len(migrado[0]) > 0
+    manager.run_transaction(rebuild_product_valuation)
+    _assert_same_state(migrado, _state(manager))
+
+
+def _random_movements(rng, productos, n, anios):
+    # Movimientos válidos en orden de registro: una SALIDA nunca supera el stock
+    stock = dict.fromkeys(productos, 0)
+    for _ in range(n):
+        producto = int(rng.choice(productos))
+        cantidad = int(rng.integers(1, 25))
+        tipo = 'SALIDA' if stock[producto] >= cantidad and rng.random() < 0.55 else 'ENTRADA'
+        stock[producto] += cantidad if tipo == 'ENTRADA' else -cantidad
+        fecha = f"{rng.choice(anios)}-{rng.integers(1, 13):02d}-{rng.integers(1, 29):02d}"
+        yield producto, tipo, cantidad, fecha
+
+
+def test_migration_009_matches_rebuild(tmp_path):
+    # Base en la versión 8, anterior al costo en kardex, poblada con SQL directo
+    path = str(tmp_path / "v8.db")
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    for migration in MIGRATIONS[:8]:
+        migration(cursor)
+    conn.execute("PRAGMA user_version = 8")
+    conn.executemany("INSERT INTO productos (nombre_producto, precio_unitario, stock_minimo, proveedor) VALUES (?, ?, 1, 'Prov')",
+                     [(f"Producto {i}", 3.0 + i) for i in range(5)])
+    conn.executemany("INSERT INTO kardex (id_producto, tipo_movimiento, cantidad, fecha_movimiento, referencia) VALUES (?, ?, ?, ?, 'r')",
+                     _random_movements(np.random.default_rng(5), [1, 2, 3, 4, 5], 300, [2023, 2024]))
+    conn.commit()
+    conn.close()
+
+    manager = ConnectionManager(path)
+    try:
+        init_db(manager)
+        _migrated_matches_rebuild(manager)
+    finally:
+        manager.close_all()
+
+
+def test_migration_009_reads_closed_period_archives(manager):
+    with manager.transaction() as conn:
+        conn.executemany("INSERT INTO productos (nombre_producto, precio_unitario, stock_minimo, proveedor) VALUES (?, ?, 1, 'Prov')",
+                         [(f"Producto {i}", 3.0 + i) for i in range(4)])
+    rng = np.random.default_rng(11)
+    for producto, tipo, cantidad, fecha in list(_random_movements(rng, [1, 2, 3, 4], 200, [2023, 2024, 2025])):
+        record_movement(manager, producto, tipo, cantidad, 'r', fecha=fecha,
+                        costo_unitario=float(rng.integers(1, 20)) if tipo == 'ENTRADA' else None)
+    assert close_period(manager, '2025-01-01', hoy='2026-10-17')['archivos']
+
+    # Volver la base y sus archivos a la versión 8
+    with manager.transaction() as conn:
+        for tabla in VALUATION_TABLES:
+            conn.execute(f"DROP TABLE {tabla}")
+        for (trigger,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE '%valuacion%'").fetchall():
+            conn.execute(f"DROP TRIGGER {trigger}")
+        for _, schema, _ in conn.execute("PRAGMA database_list").fetchall():
+            if schema.startswith(db.ARCHIVE_PREFIX) or schema == 'main':
+                conn.execute(f"ALTER TABLE {schema}.kardex DROP COLUMN costo_unitario")
+        conn.execute("PRAGMA user_version = 8")
+    manager.close_all()
+    db._migrated.discard(manager.db_name)
+
+    reabierta = ConnectionManager(manager.db_name)
+    try:
+        init_db(reabierta)
+        _migrated_matches_rebuild(reabierta)
+    finally:
+        reabierta.close_all()
+
+
+def test_import_applies_only_new_movements(manager, tmp_path):
+    with manager.transaction() as conn:
+        conn.executemany("INSERT INTO productos (nombre_producto, precio_unitario, stock_minimo, proveedor) VALUES (?, 8, 1, 'Prov')",
+                         [(f"Producto {i}",) for i in range(6)])
+    # Estado previo mantenido por los triggers, con capas a medio consumir
+    for i in range(12):
+        record_movement(manager, 1 + i % 4, 'ENTRADA', 10, 'compra', fecha='2024-01-10', costo_unitario=2.0 + i)
+    record_movement(manager, 1, 'SALIDA', 15, 'venta', fecha='2024-02-01')
+
+    rng = np.random.default_rng(3)
+    n = 400
+    lote = pd.DataFrame({
+        'id_producto': rng.integers(1, 7, n),
+        'tipo_movimiento': np.where(rng.random(n) < 0.5, 'ENTRADA', 'SALIDA'),
+        'cantidad': rng.integers(1, 12, n),
+        'fecha_movimiento': pd.Timestamp('2024-03-01') + pd.to_timedelta(rng.integers(0, 120, n), unit='D'),
+        'costo_unitario': np.where(rng.random(n) < 0.3, np.nan, rng.uniform(1, 9, n).round(2)),
+    })
+    path = tmp_path / "lote.csv"
+    lote.to_csv(path, index=False)
+    resultado = import_movements(str(path), manager, chunksize=100)
+    assert resultado['insertados'] > 0
+
+    incremental = _state(manager)
+    rebuild_valuation(manager)
+    for mantenido, reconstruido in zip(incremental, _state(manager)):
+        pd.testing.assert_frame_equal(mantenido, reconstruido, check_exact=False, rtol=1e-9)
@@ -0,0 +1,382 @@
+# Valuación del inventario al costo: costo promedio ponderado y capas FIFO por
+# producto, y costo de ventas por mes. Los triggers de kardex mantienen
+# valuacion_producto, capas_fifo y costo_ventas_mensual con cada movimiento, en
+# el orden en que se registran (id_movimiento); los reportes leen esas tablas.
+# rebuild_valuation recalcula todo desde kardex (archivos de periodos cerrados
+# incluidos) en una pasada vectorizada, sin recorrer los movimientos en Python;
+# apply_new_movements aplica de la misma forma solo los movimientos nuevos
+# sobre el estado mantenido (importación masiva con los triggers apagados).
+# Uso: python -m valuation reconstruir [--pendientes] [--db dashboard_control.db]
+#      python -m valuation resumen [--meses 12]
+import argparse
+import json
+import sys
+
+import numpy as np
+import pandas as pd
+
+from archive import kardex_sources
+from cache import get_cache
+from db import DB_NAME, get_manager, init_db
+
+VALUATION_TABLES = ('valuacion_producto', 'capas_fifo', 'costo_ventas_mensual', 'valuacion_pendiente')
+
+
+def _load_movements(conn, productos=None):
+    # Toda la historia de kardex, ordenada por producto y id_movimiento. Sin
+    # costo registrado una ENTRADA vale el precio del producto, como en los triggers.
+    extra, extra_params = [], []
+    if productos is not None:
+        extra, extra_params = ["k.id_producto IN (SELECT value FROM json_each(?))"], [json.dumps(productos)]
+    frames = []
+    for schema, where, params in kardex_sources(conn):
+        conditions = where + extra
+        frames.append(pd.read_sql_query(f"""
+            SELECT k.id_producto, k.id_movimiento, k.tipo_movimiento = 'ENTRADA' AS entrada, k.cantidad,
+                   COALESCE(k.costo_unitario, p.precio_unitario, 0) AS costo,
+                   substr(k.fecha_movimiento, 1, 7) AS mes_anio
+            FROM {schema}.kardex k
+            LEFT JOIN productos p ON p.id_producto = k.id_producto
+            {"WHERE " + " AND ".join(conditions) if conditions else ""}
+        """, conn, params=params + extra_params))
+    frames = [df for df in frames if not df.empty] or frames[:1]
+    df = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+    return _sorted(df)
+
+
+def _sorted(df):
+    orden = np.lexsort((df['id_movimiento'].to_numpy(), df['id_producto'].to_numpy()))
+    return df.iloc[orden].reset_index(drop=True)
+
+
+def _affine_scan(a, b):
+    # x_i = a_i * x_(i-1) + b_i con x_(-1) = 0, por duplicación: log2(n) pasos
+    # vectorizados. Un a_i = 0 corta la dependencia con lo anterior.
+    a, b = a.copy(), b.copy()
+    k = 1
+    while k < len(a) and a.any():
+        b[k:] = a[k:] * b[:-k] + b[k:]
+        a[k:] = a[k:] * a[:-k]
+        k *= 2
+    return b
+
+
+def value_movements(df, inicial=None, capas_previas=None):
+    """Valuación de movimientos ordenados por producto e id_movimiento.
+
+    ``df`` tiene id_producto, id_movimiento, entrada (bool), cantidad, costo y
+    mes_anio. Devuelve (estado, capas, costo_ventas): el estado final por
+    producto, lo que queda de cada ENTRADA y el costo de las SALIDAS por mes y
+    producto.
+
+    Sin ``inicial`` cada producto parte de cero. Con ``inicial`` (id_producto,
+    stock, costo_promedio) y ``capas_previas`` (filas de capas_fifo) los
+    movimientos se aplican a continuación de ese estado: las capas previas
+    entran al eje FIFO antes que las ENTRADAS nuevas sin mover el stock ni el
+    promedio, y vuelven en ``capas`` con lo que les queda.
+
+    El costo promedio después de cada movimiento es una recurrencia lineal
+    (una ENTRADA pondera el promedio previo por stock_antes / stock y suma
+    cantidad * costo / stock; una SALIDA lo deja igual) que se resuelve con
+    _affine_scan. El costo FIFO de una SALIDA es el tramo de las ENTRADAS
+    acumuladas entre las salidas acumuladas antes y después de ella, ubicado
+    con searchsorted sobre el costo acumulado de las ENTRADAS.
+    """
+    if df.empty:
+        return (pd.DataFrame(columns=['id_producto', 'stock', 'costo_promedio', 'valor_promedio', 'valor_fifo']),
+                pd.DataFrame(columns=['id_movimiento', 'id_producto', 'restante', 'costo_unitario']),
+                pd.DataFrame(columns=['mes_anio', 'id_producto', 'unidades', 'costo_promedio', 'costo_fifo']))
+    df = df.assign(previa=False)
+    if capas_previas is not None and len(capas_previas):
+        previas = pd.DataFrame({
+            'id_producto': capas_previas['id_producto'].to_numpy(np.int64),
+            'id_movimiento': capas_previas['id_movimiento'].to_numpy(np.int64),
+            'entrada': True,
+            'cantidad': capas_previas['restante'].to_numpy(np.int64),
+            'costo': capas_previas['costo_unitario'].to_numpy(np.float64),
+            'mes_anio': '',
+            'previa': True,
+        })
+        df = _sorted(pd.concat([previas, df[previas.columns]], ignore_index=True))
+    producto = df['id_producto'].to_numpy(np.int64)
+    previa = df['previa'].to_numpy(bool)
+    entrada = df['entrada'].to_numpy(bool)
+    cantidad = df['cantidad'].to_numpy(np.int64)
+    costo = np.where(entrada, df['costo'].to_numpy(np.float64), 0.0)
+    n = len(df)
+
+    inicio = np.ones(n, dtype=bool)
+    inicio[1:] = producto[1:] != producto[:-1]
+    primeros = np.flatnonzero(inicio)
+    ultimos = np.r_[primeros[1:] - 1, n - 1].astype(np.int64)
+    grupo = np.cumsum(inicio) - 1
+    stock_inicial = np.zeros(len(primeros), dtype=np.int64)
+    promedio_inicial = np.zeros(len(primeros))
+    if inicial is not None and len(inicial):
+        inicial = inicial.set_index('id_producto')
+        stock_inicial = inicial['stock'].reindex(producto[primeros], fill_value=0).to_numpy(np.int64)
+        promedio_inicial = inicial['costo_promedio'].reindex(producto[primeros], fill_value=0.0).to_numpy(np.float64)
+
+    def acumulado(valores):
+        # Suma corrida dentro de cada producto
+        total = np.cumsum(valores)
+        return total - (total - valores)[primeros][grupo]
+
+    # Las capas previas ya están en el stock y el promedio iniciales
+    nueva = entrada & ~previa
+    delta = np.where(nueva, cantidad, np.where(entrada, 0, -cantidad))
+    stock = stock_inicial[grupo] + acumulado(delta)
+
+    # Costo promedio ponderado; el primer movimiento de cada producto parte del promedio inicial
+    antes = np.maximum(stock - delta, 0)
+    hay_stock = stock > 0
+    a = np.where(nueva, np.divide(antes, stock, out=np.zeros(n), where=hay_stock), 1.0)
+    b = np.where(nueva, np.divide(cantidad * costo, stock, out=costo.copy(), where=hay_stock), 0.0)
+    b[inicio] += a[inicio] * promedio_inicial
+    a[inicio] = 0.0
+    promedio = _affine_scan(a, b)
+    costo_promedio = np.where(entrada, 0.0, cantidad * promedio)
+
+    # FIFO sobre el eje de unidades de ENTRADA acumuladas de todos los productos
+    unidades_entrada = np.where(entrada, cantidad, 0)
+    unidades_salida = np.where(entrada, 0, cantidad)
+    entradas_global = np.cumsum(unidades_entrada)
+    base = (entradas_global - unidades_entrada)[primeros]
+    total_entradas = entradas_global[ultimos] - base
+    salidas = acumulado(unidades_salida)
+    # Una SALIDA sin capas suficientes (saldo negativo) no toma capas de otro producto
+    hasta = base[grupo] + np.minimum(salidas, total_entradas[grupo])
+    desde = base[grupo] + np.minimum(salidas - unidades_salida, total_entradas[grupo])
+
+    posiciones = np.flatnonzero(entrada)
+    eje = entradas_global[posiciones]
+    costo_capa = costo[posiciones]
+    costo_eje = np.cumsum(cantidad[posiciones] * costo_capa)
+
+    def costo_hasta(x):
+        # Costo de las primeras x unidades del eje
+        i = np.minimum(np.searchsorted(eje, x, side='left'), len(eje) - 1)
+        return costo_eje[i] - (eje[i] - x) * costo_capa[i]
+
+    salida = ~entrada
+    costo_fifo = np.zeros(n)
+    if len(posiciones):
+        costo_fifo[salida] = costo_hasta(hasta[salida]) - costo_hasta(desde[salida])
+
+    consumido = base + np.minimum(salidas[ultimos], total_entradas)
+    restante = np.clip(eje - consumido[grupo[posiciones]], 0, cantidad[posiciones])
+    vigentes = restante > 0
+    capas = pd.DataFrame({
+        'id_movimiento': df['id_movimiento'].to_numpy()[posiciones][vigentes],
+        'id_producto': producto[posiciones][vigentes],
+        'restante': restante[vigentes],
+        'costo_unitario': costo_capa[vigentes],
+    })
+
+    stock_final = stock[ultimos]
+    estado = pd.DataFrame({
+        'id_producto': producto[ultimos],
+        'stock': stock_final,
+        'costo_promedio': promedio[ultimos],
+        'valor_promedio': np.where(stock_final > 0, stock_final * promedio[ultimos], 0.0),
+        'valor_fifo': np.bincount(grupo[posiciones][vigentes], weights=restante[vigentes] * costo_capa[vigentes],
+                                  minlength=len(primeros)),
+    })
+
+    costo_ventas = pd.DataFrame({
+        'mes_anio': df['mes_anio'].to_numpy()[salida],
+        'id_producto': producto[salida],
+        'unidades': cantidad[salida],
+        'costo_promedio': costo_promedio[salida],
+        'costo_fifo': costo_fifo[salida],
+    }).groupby(['mes_anio', 'id_producto'], as_index=False, sort=False).sum()
+    return estado, capas, costo_ventas
+
+
+def rebuild_product_valuation(conn, productos=None):
+    """Recalcula la valuación de ``productos`` (todos con None) dentro de la transacción abierta.
+
+    Reemplaza sus filas de valuacion_producto, capas_fifo y
+    costo_ventas_mensual y los quita de valuacion_pendiente. Devuelve el
+    número de productos valuados.
+    """
+    if productos is not None:
+        productos = sorted({int(p) for p in productos})
+        if not productos:
+            return 0
+    estado, capas, costo_ventas = value_movements(_load_movements(conn, productos))
+
+    if productos is None:
+        for tabla in VALUATION_TABLES:
+            conn.execute(f"DELETE FROM {tabla}")
+    else:
+        ids = json.dumps(productos)
+        for tabla in VALUATION_TABLES:
+            conn.execute(f"DELETE FROM {tabla} WHERE id_producto IN (SELECT value FROM json_each(?))", (ids,))
+    for tabla, df in (('valuacion_producto', estado), ('capas_fifo', capas), ('costo_ventas_mensual', costo_ventas)):
+        conn.executemany(f"INSERT INTO {tabla} ({', '.join(df.columns)}) VALUES ({', '.join('?' * len(df.columns))})",
+                         df.itertuples(index=False, name=None))
+    return len(estado)
+
+
+def apply_new_movements(conn, desde_id):
+    """Aplica a la valuación mantenida los movimientos de kardex con id_movimiento > ``desde_id``.
+
+    Es lo que harían los triggers fila por fila, en una pasada vectorizada
+    dentro de la transacción abierta: cada producto parte de su fila de
+    valuacion_producto y sus capas_fifo, y el costo de ventas se suma a
+    costo_ventas_mensual. Un producto en valuacion_pendiente no tiene un
+    estado confiable y se recalcula desde kardex. El costo depende del
+    tamaño del bloque nuevo, no de la historia. Devuelve el número de
+    productos valuados.
+    """
+    df = _sorted(pd.read_sql_query("""
+        SELECT k.id_producto, k.id_movimiento, k.tipo_movimiento = 'ENTRADA' AS entrada, k.cantidad,
+               COALESCE(k.costo_unitario, p.precio_unitario, 0) AS costo,
+               substr(k.fecha_movimiento, 1, 7) AS mes_anio
+        FROM main.kardex k
+        LEFT JOIN productos p ON p.id_producto = k.id_producto
+        WHERE k.id_movimiento > ?
+    """, conn, params=(desde_id,)))
+    if df.empty:
+        return 0
+    productos = json.dumps(sorted(df['id_producto'].unique().tolist()))
+    pendientes = [row[0] for row in conn.execute(
+        "SELECT id_producto FROM valuacion_pendiente WHERE id_producto IN (SELECT value FROM json_each(?))", (productos,))]
+    recalculados = rebuild_product_valuation(conn, pendientes)
+    if pendientes:
+        df = df[~df['id_producto'].isin(pendientes)]
+        productos = json.dumps(sorted(df['id_producto'].unique().tolist()))
+    if df.empty:
+        return recalculados
+
+    inicial = pd.read_sql_query("""
+        SELECT id_producto, stock, costo_promedio, valor_fifo FROM valuacion_producto
+        WHERE id_producto IN (SELECT value FROM json_each(?))
+    """, conn, params=(productos,))
+    # Las capas solo cambian en los productos con SALIDAS en el bloque; en los
+    # demás las ENTRADAS nuevas se agregan al final y valor_fifo solo suma
+    vendidos = json.dumps(sorted(df.loc[~df['entrada'].astype(bool), 'id_producto'].unique().tolist()))
+    capas_previas = pd.read_sql_query("""
+        SELECT id_movimiento, id_producto, restante, costo_unitario FROM capas_fifo
+        WHERE id_producto IN (SELECT value FROM json_each(?))
+    """, conn, params=(vendidos,))
+    estado, capas, costo_ventas = value_movements(df, inicial, capas_previas)
+
+    # Sin capas previas cargadas, valor_fifo parte del valor que ya tenía el producto
+    previo = estado['id_producto'].map(inicial.set_index('id_producto')['valor_fifo']).fillna(0)
+    estado['valor_fifo'] += previo.where(~estado['id_producto'].isin(capas_previas['id_producto']), 0)
+
+    # Solo se escriben las capas que cambiaron: las consumidas, las que
+    # quedaron con menos y las ENTRADAS nuevas
+    capas = capas.merge(capas_previas[['id_movimiento', 'restante']], on='id_movimiento', how='left', suffixes=('', '_previo'))
+    consumidas = capas_previas.loc[~capas_previas['id_movimiento'].isin(capas['id_movimiento']), 'id_movimiento']
+    conn.executemany("DELETE FROM capas_fifo WHERE id_movimiento = ?", ((int(i),) for i in consumidas))
+    cambiadas = capas[capas['restante_previo'].notna() & (capas['restante'] != capas['restante_previo'])]
+    conn.executemany("UPDATE capas_fifo SET restante = ? WHERE id_movimiento = ?",
+                     cambiadas[['restante', 'id_movimiento']].itertuples(index=False, name=None))
+    nuevas = capas[capas['restante_previo'].isna()]
+    conn.executemany("INSERT INTO capas_fifo (id_movimiento, id_producto, restante, costo_unitario) VALUES (?, ?, ?, ?)",
+                     nuevas[['id_movimiento', 'id_producto', 'restante', 'costo_unitario']].itertuples(index=False, name=None))
+    conn.executemany("INSERT OR REPLACE INTO valuacion_producto (id_producto, stock, costo_promedio, valor_promedio, valor_fifo) "
+                     "VALUES (?, ?, ?, ?, ?)", estado.itertuples(index=False, name=None))
+    conn.executemany("""
+        INSERT INTO costo_ventas_mensual (mes_anio, id_producto, unidades, costo_promedio, costo_fifo)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(mes_anio, id_producto) DO UPDATE SET
+            unidades = unidades + excluded.unidades,
+            costo_promedio = costo_promedio + excluded.costo_promedio,
+            costo_fifo = costo_fifo + excluded.costo_fifo
+    """, costo_ventas.itertuples(index=False, name=None))
+    return recalculados + len(estado)
+
+
+def rebuild_valuation(manager=None, productos=None):
+    # Recalcula la valuación desde kardex en su propia transacción
+    manager = manager or get_manager()
+    return manager.run_transaction(lambda conn: rebuild_product_valuation(conn, productos))
+
+
+def rebuild_pending_valuation(manager=None):
+    # Recalcula solo los productos que un DELETE o UPDATE de kardex dejó pendientes
+    manager = manager or get_manager()
+
+    def write(conn):
+        pendientes = [row[0] for row in conn.execute("SELECT id_producto FROM valuacion_pendiente")]
+        return rebuild_product_valuation(conn, pendientes)
+
+    return manager.run_transaction(write)
+
+
+def valuation_totals(cache):
+    # Stock y valor del inventario al costo promedio y FIFO, y productos pendientes de recalcular
+    return cache.read_sql("""
+        SELECT COALESCE(SUM(stock), 0) AS stock,
+               COALESCE(SUM(valor_promedio), 0) AS valor_promedio,
+               COALESCE(SUM(valor_fifo), 0) AS valor_fifo,
+               (SELECT COUNT(*) FROM valuacion_pendiente) AS pendientes
+        FROM valuacion_producto
+    """, tables=('valuacion_producto', 'valuacion_pendiente')).iloc[0]
+
+
+def cogs_by_month(cache, desde=None, hasta=None):
+    """Costo de ventas por mes junto al gasto real de gastos_reales.
+
+    Una fila por mes AAAA-MM de [desde, hasta] con costo de ventas o gasto:
+    unidades vendidas, costo de ventas al promedio y FIFO y gasto_real (de
+    resumen_mensual, que conserva los meses cerrados).
+    """
+    where, params = [], []
+    if desde:
+        where.append("mes_anio >= ?")
+        params.append(str(desde))
+    if hasta:
+        where.append("mes_anio <= ?")
+        params.append(str(hasta))
+    condition = f"WHERE {' AND '.join(where)}" if where else ""
+    return cache.read_sql(f"""
+        SELECT mes_anio,
+               SUM(unidades) AS unidades,
+               SUM(costo_promedio) AS costo_ventas_promedio,
+               SUM(costo_fifo) AS costo_ventas_fifo,
+               SUM(gasto_real) AS gasto_real
+        FROM (
+            SELECT mes_anio, unidades, costo_promedio, costo_fifo, 0 AS gasto_real
+            FROM costo_ventas_mensual {condition}
+            UNION ALL
+            SELECT mes_anio, 0, 0, 0, gasto_real
+            FROM resumen_mensual {condition}
+        )
+        GROUP BY mes_anio
+        ORDER BY mes_anio
+    """, params * 2, tables=('costo_ventas_mensual', 'resumen_mensual'))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Valuación del inventario al costo promedio y FIFO")
+    parser.add_argument("--db", default=DB_NAME)
+    sub = parser.add_subparsers(dest="comando", required=True)
+    reconstruir = sub.add_parser("reconstruir", help="Recalcula la valuación desde kardex")
+    reconstruir.add_argument("--pendientes", action="store_true", help="Solo los productos con DELETE o UPDATE en kardex")
+    resumen = sub.add_parser("resumen", help="Valor del inventario y costo de ventas por mes")
+    resumen.add_argument("--meses", type=int, default=12)
+    args = parser.parse_args(argv)
+
+    manager = get_manager(args.db)
+    init_db(manager)
+    if args.comando == "reconstruir":
+        productos = rebuild_pending_valuation(manager) if args.pendientes else rebuild_valuation(manager)
+        print(f"Valuación recalculada para {productos} productos.")
+    else:
+        cache = get_cache(manager)
+        totales = valuation_totals(cache)
+        print(f"Stock: {int(totales['stock'])} unidades  Valor promedio: ${totales['valor_promedio']:,.2f}  "
+              f"Valor FIFO: ${totales['valor_fifo']:,.2f}")
+        if totales['pendientes']:
+            print(f"{int(totales['pendientes'])} productos pendientes: ejecute 'reconstruir --pendientes'")
+        print(cogs_by_month(cache).tail(args.meses).to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,142 @@
+# Cola de escritura con commit agrupado (modo write-behind).
+# Un único hilo escritor es dueño de la conexión, toma movimientos y gastos de
+# todas las sesiones y los confirma en lotes: un solo commit (y un solo fsync)
+# por lote en lugar de uno por formulario.
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+from budget import insert_expense
+from db import is_busy_error
+from kardex import insert_movement
+
+WRITE_BATCH_SIZE = 200      # máximo de escrituras por commit
+WRITE_BATCH_DELAY = 0.0     # segundos extra de espera; 0 = lo que llegó durante el commit anterior
+
+_STOP = object()
+
+
+class WriteQueue:
+    """Hilo escritor que confirma las escrituras encoladas en lotes.
+
+    submit(fn) encola fn(conn) y devuelve un Future. Cada elemento corre en su
+    propio SAVEPOINT dentro de la transacción del lote: si falla (por ejemplo,
+    StockInsuficienteError), solo se deshace ese elemento y su Future recibe la
+    excepción; el resto del lote se confirma. Los Futures se resuelven después
+    del commit, así que un resultado exitoso ya es durable.
+    """
+
+    def __init__(self, manager, max_batch=WRITE_BATCH_SIZE, max_delay=WRITE_BATCH_DELAY):
+        self.manager = manager
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.failed = 0
+        self.last_batch = 0
+        self.max_batch_seen = 0
+        self._thread = threading.Thread(target=self._run, name="write-queue", daemon=True)
+        self._thread.start()
+
+    def submit(self, fn):
+        future = Future()
+        self._queue.put((fn, future))
+        return future
+
+    def submit_movement(self, id_producto, tipo_movimiento, cantidad, referencia, fecha=None, costo_unitario=None):
+        return self.submit(lambda conn: insert_movement(conn, id_producto, tipo_movimiento, cantidad, referencia, fecha, costo_unitario))
+
+    def submit_expense(self, mes_anio, categoria_gasto, fecha_gasto, monto_gasto, descripcion):
+        return self.submit(lambda conn: insert_expense(conn, mes_anio, categoria_gasto, fecha_gasto, monto_gasto, descripcion))
+
+    def _next_batch(self):
+        # Bloquea hasta el primer elemento y luego junta lo que llegue hasta
+        # completar el lote o agotar max_delay
+        first = self._queue.get()
+        if first is _STOP:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._queue.put(_STOP)
+                break
+            batch.append(item)
+        return batch
+
+    def _write_batch(self, batch):
+        results = []
+
+        def write(conn):
+            results.clear()
+            for fn, _ in batch:
+                conn.execute("SAVEPOINT item")
+                try:
+                    value = fn(conn)
+                except Exception as e:
+                    if isinstance(e, sqlite3.OperationalError) and is_busy_error(e):
+                        raise
+                    conn.execute("ROLLBACK TO item")
+                    conn.execute("RELEASE item")
+                    results.append((False, e))
+                else:
+                    conn.execute("RELEASE item")
+                    results.append((True, value))
+
+        try:
+            self.manager.run_transaction(write)
+        except Exception as e:
+            # El commit del lote falló: ningún elemento quedó escrito
+            for _, future in batch:
+                future.set_exception(e)
+            failed = len(batch)
+        else:
+            failed = 0
+            for (ok, value), (_, future) in zip(results, batch):
+                if ok:
+                    future.set_result(value)
+                else:
+                    future.set_exception(value)
+                    failed += 1
+
+        with self._lock:
+            self.batches += 1
+            self.items += len(batch)
+            self.failed += failed
+            self.last_batch = len(batch)
+            self.max_batch_seen = max(self.max_batch_seen, len(batch))
+
+    def _run(self):
+        # La conexión queda prestada al hilo escritor durante toda su vida
+        with self.manager.connection():
+            while True:
+                batch = self._next_batch()
+                if batch is None:
+                    return
+                self._write_batch(batch)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'en_cola': self._queue.qsize(),
+                'lotes': self.batches,
+                'escrituras': self.items,
+                'fallidas': self.failed,
+                'ultimo_lote': self.last_batch,
+                'lote_maximo': self.max_batch_seen,
+                'lote_promedio': self.items / self.batches if self.batches else 0.0,
+            }
+
+    def close(self, timeout=None):
+        # Procesa lo que ya estaba encolado y detiene el hilo
+        self._queue.put(_STOP)
+        self._thread.join(timeout)